@@ -18,6 +18,7 @@ logger = logging.getLogger(__name__)
 
 TRADING_DB = os.getenv("TRADING_DB", "database/upstox_v3_live_trading.db")
 USER_DB = os.getenv("USER_DB", "database/users.db")
+PIPELINE_METRICS_FILE = os.getenv("PIPELINE_METRICS_FILE", "logs/pipeline_metrics.json")
 IST = ZoneInfo("Asia/Kolkata")
 
 # Load configuration
@@ -429,6 +430,14 @@ def create_app():
             # Check if cleanup is needed (>80% usage)
             cleanup_needed = (memory.used / memory.total) > 0.8
 
+            # Ingest queue depth/lag exported by the pipeline's stats task
+            pipeline_metrics = None
+            try:
+                with open(PIPELINE_METRICS_FILE, 'r', encoding='utf-8') as f:
+                    pipeline_metrics = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                pass
+
             return jsonify({
                     "ok": True,
                     "pipeline_running": pipeline_running,
@@ -438,7 +447,8 @@ def create_app():
                         "total": memory_limit_gb,
                         "percentage": (memory.used / memory.total) * 100,
                         "cleanup_needed": cleanup_needed
-                    }
+                    },
+                    "pipeline_metrics": pipeline_metrics
                 })
         except Exception as e:
             return jsonify({"ok": False, "error": str(e)})
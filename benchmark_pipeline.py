@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Micro and end-to-end benchmarks for the pipeline1 hot path, with regression gates.
+
+Inputs are fixed: deterministic random-walk frames for the configured
+instruments (same generator as synthetic_feed_server.py), or the first frames
+of a recorded feed journal with --journal. Everything runs against a scratch
+database.
+
+    python benchmark_pipeline.py                       # run and check benchmark_thresholds.json
+    python benchmark_pipeline.py --update-thresholds   # re-baseline on this machine
+
+Exits with status 1 when any benchmark is slower than its threshold or any
+end-to-end frame raised.
+Logging is raised to WARNING while timing so console I/O doesn't dominate.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from datetime import datetime, timedelta
+from pathlib import Path
+
+THRESHOLDS_FILE = Path(__file__).resolve().parent / "benchmark_thresholds.json"
+SESSION_START = datetime(2025, 1, 6, 9, 15, 1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline1 hot path")
+    parser.add_argument("--frames", type=int, default=2000, help="Number of feed frames to benchmark with")
+    parser.add_argument("--journal", default=None, help="Use frames from a recorded feed journal instead")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions per benchmark (best is kept)")
+    parser.add_argument("--output", default="logs/benchmark_results.json", help="Where to write the results")
+    parser.add_argument("--thresholds", default=str(THRESHOLDS_FILE))
+    parser.add_argument("--update-thresholds", action="store_true",
+                        help="Write thresholds from this run (with --headroom) instead of checking")
+    parser.add_argument("--headroom", type=float, default=2.0,
+                        help="Slack applied to measured values when writing thresholds")
+    return parser.parse_args()
+
+
+def best_of(repeat, fn):
+    """Run fn() `repeat` times and return the fastest wall time in ns"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        fn()
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def micro(results, name, repeat, ops, fn):
+    elapsed_ns = best_of(repeat, fn)
+    results[name] = {'ops': ops, 'us_per_op': round(elapsed_ns / 1e3 / max(ops, 1), 3)}
+    print(f"  {name:<32} {results[name]['us_per_op']:>10.3f} us/op  ({ops} ops)")
+
+
+def synthetic_frames(pipeline1, count, seed=7):
+    from synthetic_feed_server import InstrumentWalk
+    pb = pipeline1.pb
+    rnd = random.Random(seed)
+    walks = [InstrumentWalk(info.key, rnd, 0.0004) for info in pipeline1.REGISTRY]
+    start_ms = int(SESSION_START.replace(tzinfo=pipeline1.IST).timestamp() * 1000)
+    frames = []
+    for i in range(count):
+        now_ms = start_ms + i * 250
+        response = pb.FeedResponse(type=pb.live_feed, currentTs=now_ms)
+        for walk in walks:
+            walk.fill_feed(response.feeds[walk.key], now_ms, walk.step(now_ms))
+        frames.append(response.SerializeToString())
+    return frames
+
+
+def journal_frames(path, count):
+    from feed_journal import FeedJournalReader
+    frames = []
+    for _, _, frame in FeedJournalReader(path).records():
+        frames.append(frame)
+        if len(frames) >= count:
+            break
+    return frames
+
+
+def registry_options(pipeline1):
+    return [
+        {'instrument_key': info.key, 'option_type': info.option_type, 'strike': info.strike_price, 'last_price': 100.0}
+        for info in pipeline1.REGISTRY if info.is_option
+    ]
+
+
+def run(args, pipeline1):
+    results = {}
+    repeat = args.repeat
+    frames = journal_frames(args.journal, args.frames) if args.journal else synthetic_frames(pipeline1, args.frames)
+    if not frames:
+        raise SystemExit("No frames to benchmark with")
+    decoded = [pipeline1.decode_v3_message(frame) for frame in frames]
+    registry = pipeline1.REGISTRY
+    print(f"Benchmarking with {len(frames)} frames, {len(registry)} instruments")
+
+    # Processors on a manager whose writer is stopped, so queued rows just accumulate
+    db = pipeline1.LockFreeDatabaseManager()
+    db.shutdown()
+
+    def clear_queues():
+        db.candle_queue.clear()
+        db.ha_queue.clear()
+        db.trend_queue.clear()
+        db.latest_candle_queue.clear()
+
+    def fresh_processors():
+        procs = {}
+        for info in registry:
+            procs[info.key] = pipeline1.LockFreeTickProcessor(info.key, info.config, db, procs)
+        trend_engine = pipeline1.TrendEngine(db, procs)
+        for proc in procs.values():
+            proc.trend_engine = trend_engine
+        return procs
+
+    processors = fresh_processors()
+    pipeline1.processors = processors
+
+    # --- decode / extract ---
+    micro(results, 'decode_v3_message', repeat, len(frames),
+          lambda: [pipeline1.decode_v3_message(frame) for frame in frames])
+    extract_frames = decoded[:200]
+    procs = list(processors.values())
+    micro(results, 'extract_tick_data_v3', repeat, len(extract_frames) * len(procs),
+          lambda: [proc.extract_tick_data_v3(frame) for frame in extract_frames for proc in procs])
+
+    # --- candle update (future processor exercises the delta path) ---
+    future_proc = processors.get(registry.future_key) or procs[0]
+    future_ticks = [t for t in (future_proc.extract_tick_data_v3(frame) for frame in decoded) if t]
+
+    def update_candles():
+        future_proc._initialize_candle(future_proc.get_candle_minute(future_ticks[0].ltt_ms), future_ticks[0])
+        future_proc.previous_ltp = future_ticks[0].ltp
+        future_proc.previous_tick_vtt = future_ticks[0].vtt
+        for tick in future_ticks:
+            future_proc._update_candle_ultra_fast(tick)
+    micro(results, '_update_candle_ultra_fast', repeat, len(future_ticks), update_candles)
+
+    # --- finalisation with HA / SAR / trend for every instrument ---
+    first_ticks = {tick.instrument_key: tick for tick in (
+        proc.extract_tick_data_v3(decoded[0]) for proc in procs) if tick}
+    finalize_minutes = 30
+
+    def finalize_candles():
+        minute = pipeline1.ist_minute_id(int(SESSION_START.replace(tzinfo=pipeline1.IST).timestamp() * 1000))
+        for _ in range(finalize_minutes):
+            for key, tick in first_ticks.items():
+                proc = processors[key]
+                proc._initialize_candle(minute, tick)
+                proc._finalize_current_candle()
+            minute += 1
+        clear_queues()
+    micro(results, 'finalize_candle_ha_sar', repeat, finalize_minutes * len(first_ticks), finalize_candles)
+
+    # --- cash flow ---
+    options = registry_options(pipeline1)
+    calculator = pipeline1.OptionsTickCashFlowCalculator(options)
+    option_ticks = [(tick.instrument_key, tick.ltp, tick.vtt, tick.ltt_ms)
+                    for frame in decoded[:500] for proc in procs if proc.info and proc.info.is_option
+                    for tick in [proc.extract_tick_data_v3(frame)] if tick]
+    micro(results, 'process_option_tick', repeat, len(option_ticks),
+          lambda: [calculator.process_option_tick(*args) for args in option_ticks])
+    # Same ticks grouped per frame through the array-backed calculator
+    columnar_calculator = pipeline1.ColumnarCashFlowCalculator(options)
+    option_batches = [list(zip(*batch)) for batch in (
+        [(tick.instrument_key, tick.ltp, tick.vtt, tick.ltt_ms)
+         for proc in procs if proc.info and proc.info.is_option
+         for tick in [proc.extract_tick_data_v3(frame)] if tick] for frame in decoded[:500]) if batch]
+    micro(results, 'process_option_batch_columnar', repeat, len(option_ticks),
+          lambda: [columnar_calculator.process_option_batch(*batch) for batch in option_batches])
+    strikes = sorted(option['strike'] for option in options) or [25000.0]
+    prices = [random.Random(i).uniform(strikes[0] - 100, strikes[-1] + 100) for i in range(2000)]
+    micro(results, 'get_itm_options', repeat, len(prices),
+          lambda: [calculator.get_itm_options(price) for price in prices])
+
+    # --- database batch writers (one row per instrument per batch) ---
+    db._open_writer_connection()
+    base_candle = pipeline1.LiveCandle(instrument_key='', timestamp=SESSION_START, open=100.0, high=101.0,
+                                       low=99.0, close=100.5, volume=1500, atp=100.2)
+    base_ha = pipeline1.HeikinAshiCandle(instrument_key='', timestamp=SESSION_START, ha_open=100.0, ha_high=101.0,
+                                         ha_low=99.0, ha_close=100.5, volume=1500, hlc3=100.2, sar_trend=1)
+    write_batches = 20
+    candle_batches = [[(replace(base_candle, instrument_key=info.key, timestamp=SESSION_START + timedelta(minutes=i)),
+                        '1min') for info in registry] for i in range(write_batches)]
+    ha_batches = [[(replace(base_ha, instrument_key=info.key, timestamp=SESSION_START + timedelta(minutes=i)), '1min')
+                   for info in registry] for i in range(write_batches)]
+    trend_batches = [[{'timestamp': SESSION_START + timedelta(minutes=i), 'candle_interval': '1min', 'trend_value': 1}
+                      for _ in registry] for i in range(write_batches)]
+    latest_batches = [[{
+        'instrument_key': info.key, 'instrument_name': info.display_name, 'instrument_type': info.type,
+        'timestamp': SESSION_START + timedelta(minutes=i), 'open': 100.0, 'high': 101.0, 'low': 99.0,
+        'close': 100.5, 'volume': 1500, 'atp': 100.2, 'candle_interval': '1min',
+        'last_updated': SESSION_START + timedelta(minutes=i)
+    } for info in registry] for i in range(write_batches)]
+    rows = write_batches * len(registry)
+    for name, writer, batches in (('_write_candle_batch', db._write_candle_batch, candle_batches),
+                                  ('_write_ha_batch', db._write_ha_batch, ha_batches),
+                                  ('_write_trend_batch', db._write_trend_batch, trend_batches),
+                                  ('_write_latest_candle_batch', db._write_latest_candle_batch, latest_batches)):
+        micro(results, name, max(1, repeat // 2), rows, lambda writer=writer, batches=batches: [writer(b) for b in batches])
+    # All four row types in one transaction per batch, as the writer thread commits them
+    group_batches = [[('candle', db._insert_candle_rows, (candles,)), ('ha', db._insert_ha_rows, (ha,)),
+                      ('trend', db._insert_trend_rows, (trend,)), ('latest', db._insert_latest_candle_rows, (latest,))]
+                     for candles, ha, trend, latest in zip(candle_batches, ha_batches, trend_batches, latest_batches)]
+    micro(results, '_write_group', max(1, repeat // 2), 4 * rows, lambda: [db._write_group(parts) for parts in group_batches])
+    # Same candle and HA batches into the consolidated bars / ha_bars tables (CANDLE_STORE = "bars")
+    pipeline1.candle_store.create_schema(db.cursor)
+    candle_store_mode, pipeline1.CANDLE_STORE = pipeline1.CANDLE_STORE, 'bars'
+    for name, writer, batches in (('_write_candle_batch_bars', db._write_candle_batch, candle_batches),
+                                  ('_write_ha_batch_bars', db._write_ha_batch, ha_batches)):
+        micro(results, name, max(1, repeat // 2), rows, lambda writer=writer, batches=batches: [writer(b) for b in batches])
+    pipeline1.CANDLE_STORE = candle_store_mode
+    # Drop the compatibility views again: the end-to-end runs below write daily tables under the same names
+    store_keys = {instrument_id: key for key, instrument_id in db._store_instrument_ids.items()}
+    for family, interval, instrument_id, trade_date in db._store_views:
+        view_name = db._get_table_name(store_keys[instrument_id], pipeline1.interval_table_prefix(family, interval),
+                                       trade_date)
+        db.cursor.execute(f"DROP VIEW IF EXISTS {view_name}")
+        db.cursor.execute("DELETE FROM table_registry WHERE table_name = ?", (view_name,))
+    db.db_conn.commit()
+    db.db_conn.close()
+
+    # --- end to end: decode + dispatch through every consumer with the live writer running ---
+    def end_to_end(engine):
+        pipeline1.CANDLE_ENGINE = engine
+        live_db = pipeline1.LockFreeDatabaseManager()
+        pipeline1.db_manager = live_db
+        dispatcher = pipeline1.build_tick_pipeline(live_db, options)
+        # Boundary closes follow the frames' own timestamps, as in a replay
+        clock = pipeline1.ReplayClock()
+        pipeline1.set_clock(clock)
+        errors = 0
+        first_error = None
+        # The previous run's pipeline is garbage by now; don't charge its collection to this one
+        gc.collect()
+        start = time.perf_counter()
+        for frame in frames:
+            try:
+                decoded = pipeline1.decode_v3_message(frame)
+                clock.set_epoch_ns(decoded.currentTs * 1_000_000)
+                dispatcher.dispatch(decoded)
+            except Exception as e:
+                # Same as process_frames: a failing frame doesn't stop the run, but it fails the benchmark
+                errors += 1
+                if first_error is None:
+                    first_error = f"{type(e).__name__}: {e}"
+        dispatcher.flush()
+        elapsed = time.perf_counter() - start
+        live_db.shutdown()
+        return {
+            'frames': len(frames),
+            'ticks': dispatcher.ticks,
+            'elapsed_s': round(elapsed, 3),
+            'ticks_per_sec': round(dispatcher.ticks / elapsed, 1),
+            'errors': errors,
+            'first_error': first_error
+        }
+
+    # The engines take turns, so both see the same machine load; the best run of each is kept, over twice the
+    # repetitions of a micro benchmark since the writer thread makes single runs noisy
+    engines = (('end_to_end', 'object'), ('end_to_end_columnar', 'columnar'))
+    for _ in range(2 * repeat):
+        for name, engine in engines:
+            result = end_to_end(engine)
+            if name not in results or result['ticks_per_sec'] > results[name]['ticks_per_sec']:
+                results[name] = result
+    for name, _ in engines:
+        result = results[name]
+        errors = result['errors']
+        print(f"  {name:<32} {result['ticks_per_sec']:>10.0f} ticks/s "
+              f"({result['ticks']} ticks in {result['elapsed_s']:.2f}s{f', {errors} frames failed' if errors else ''})")
+    return results
+
+
+def frame_errors(results):
+    """End-to-end runs where frames raised: their throughput doesn't count"""
+    return [f"{name}: {result['errors']} of {result['frames']} frames failed ({result['first_error']})"
+            for name, result in results.items() if result.get('errors')]
+
+
+def check_thresholds(results, thresholds):
+    failures = frame_errors(results)
+    for name, limit in thresholds.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        if 'max_us_per_op' in limit and result['us_per_op'] > limit['max_us_per_op']:
+            failures.append(f"{name}: {result['us_per_op']:.3f} us/op > {limit['max_us_per_op']:.3f}")
+        if 'min_ticks_per_sec' in limit and result['ticks_per_sec'] < limit['min_ticks_per_sec']:
+            failures.append(f"{name}: {result['ticks_per_sec']:.0f} ticks/s < {limit['min_ticks_per_sec']:.0f}")
+        # Throughput relative to another run of the same frames, e.g. one candle engine against the other
+        for other, min_ratio in limit.get('min_ratio_to', {}).items():
+            baseline = results.get(other)
+            if baseline and baseline['ticks_per_sec']:
+                ratio = result['ticks_per_sec'] / baseline['ticks_per_sec']
+                if ratio < min_ratio:
+                    failures.append(f"{name}: {ratio:.2f}x the throughput of {other} < {min_ratio:.2f}x")
+    return failures
+
+
+def thresholds_from(results, headroom, previous=None):
+    """Thresholds from this run; min_ratio_to gates of ``previous`` are kept as they are"""
+    previous = previous or {}
+    thresholds = {}
+    for name, result in results.items():
+        if 'us_per_op' in result:
+            thresholds[name] = {'max_us_per_op': round(result['us_per_op'] * headroom, 3)}
+        elif 'ticks_per_sec' in result:
+            thresholds[name] = {'min_ticks_per_sec': round(result['ticks_per_sec'] / headroom),
+                                'measured_ticks_per_sec': round(result['ticks_per_sec'])}
+            if 'min_ratio_to' in previous.get(name, {}):
+                thresholds[name]['min_ratio_to'] = previous[name]['min_ratio_to']
+    return thresholds
+
+
+def main():
+    args = parse_args()
+    scratch_dir = tempfile.mkdtemp(prefix="pipeline_bench_")
+    # pipeline1 reads TRADING_DB at import time
+    os.environ["TRADING_DB"] = os.path.join(scratch_dir, "bench.db")
+    import pipeline1
+    pipeline1.init_pipeline()
+    logging.getLogger().setLevel(logging.WARNING)
+    pipeline1.logger.setLevel(logging.WARNING)
+
+    results = run(args, pipeline1)
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'frames': args.frames,
+        'journal': args.journal,
+        'results': results
+    }
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results written to {args.output}")
+
+    if args.update_thresholds:
+        errors = frame_errors(results)
+        if errors:
+            print("Not updating thresholds, frames failed:")
+            for error in errors:
+                print(f"  {error}")
+            return 1
+        previous = {}
+        if os.path.exists(args.thresholds):
+            with open(args.thresholds, encoding="utf-8") as f:
+                previous = json.load(f)
+        Path(args.thresholds).write_text(json.dumps(thresholds_from(results, args.headroom, previous), indent=2) + "\n",
+                                         encoding="utf-8")
+        print(f"Thresholds updated in {args.thresholds}")
+        return 0
+    if not os.path.exists(args.thresholds):
+        print("No thresholds file - run with --update-thresholds to create one")
+        return 0
+    with open(args.thresholds, encoding="utf-8") as f:
+        failures = check_thresholds(results, json.load(f))
+    if failures:
+        print("REGRESSION:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("All benchmarks within thresholds")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
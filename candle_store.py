@@ -0,0 +1,133 @@
+"""
+Consolidated candle store: every instrument's bars of every interval in two tables.
+
+    bars         (instrument_id, interval, ts) -> OHLC, volume, ATP, delta and buy/sell volume
+    ha_bars      (instrument_id, interval, ts) -> Heikin Ashi OHLC, volume, hlc3, SAR trend, MACD
+    instruments  instrument_id <-> instrument_key, table suffix, type, option type and strike
+
+Both bar tables are WITHOUT ROWID with the key as primary key, so rows are stored
+in key order: one instrument's bars of one interval over any date range (a chart,
+a backtest) are a single index seek plus a sequential read. interval is in minutes.
+
+Views named like the old per-day tables (candles_future_20250219,
+heikin_ashi5_ce_22000_20250219, ...) select the matching slice, so queries
+written against those names keep working. They have no id/created_at columns.
+
+    create_schema(cursor)
+    instrument_id = ensure_instrument(cursor, 'NSE_FO|53001', 'future', 'FUTURE')
+    create_daily_view(cursor, 'candles5_future_20250219', 'candles5', instrument_id, date(2025, 2, 19))
+"""
+
+from datetime import date, timedelta
+from typing import Dict, Optional, Tuple
+
+BAR_COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'atp', 'delta', 'min_delta', 'max_delta',
+               'buy_volume', 'sell_volume', 'tick_count', 'vtt_open', 'vtt_close')
+HA_BAR_COLUMNS = ('ha_open', 'ha_high', 'ha_low', 'ha_close', 'volume', 'hlc3', 'sar_trend', 'macd', 'macd_signal')
+
+# Table family prefix of the old daily tables -> (bar table, its value columns)
+STORE_TABLES = {'candles': ('bars', BAR_COLUMNS), 'heikin_ashi': ('ha_bars', HA_BAR_COLUMNS)}
+
+
+def create_schema(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS instruments (
+            instrument_id INTEGER PRIMARY KEY,
+            instrument_key TEXT UNIQUE NOT NULL,
+            table_suffix TEXT NOT NULL,
+            instrument_type TEXT NOT NULL,
+            option_type TEXT,
+            strike_price REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bars (
+            instrument_id INTEGER NOT NULL REFERENCES instruments(instrument_id),
+            interval INTEGER NOT NULL,
+            ts TIMESTAMP NOT NULL,
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            volume INTEGER NOT NULL DEFAULT 0,
+            atp REAL NOT NULL,
+            delta INTEGER DEFAULT 0,
+            min_delta INTEGER DEFAULT 0,
+            max_delta INTEGER DEFAULT 0,
+            buy_volume INTEGER DEFAULT 0,
+            sell_volume INTEGER DEFAULT 0,
+            tick_count INTEGER DEFAULT 0,
+            vtt_open REAL DEFAULT 0,
+            vtt_close REAL DEFAULT 0,
+            PRIMARY KEY (instrument_id, interval, ts)
+        ) WITHOUT ROWID
+        ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ha_bars (
+            instrument_id INTEGER NOT NULL REFERENCES instruments(instrument_id),
+            interval INTEGER NOT NULL,
+            ts TIMESTAMP NOT NULL,
+            ha_open REAL NOT NULL,
+            ha_high REAL NOT NULL,
+            ha_low REAL NOT NULL,
+            ha_close REAL NOT NULL,
+            volume INTEGER NOT NULL DEFAULT 0,
+            hlc3 REAL NOT NULL,
+            sar_trend INTEGER,
+            macd REAL,
+            macd_signal REAL,
+            PRIMARY KEY (instrument_id, interval, ts)
+        ) WITHOUT ROWID
+        ''')
+
+
+def load_instrument_ids(cursor) -> Dict[str, int]:
+    cursor.execute("SELECT instrument_key, instrument_id FROM instruments")
+    return dict(cursor.fetchall())
+
+
+def ensure_instrument(cursor, instrument_key: str, table_suffix: str, instrument_type: str,
+                      option_type: Optional[str] = None, strike_price: Optional[float] = None) -> int:
+    """Id of an instrument, added on first use; ids are stable across days"""
+    cursor.execute('''
+        INSERT OR IGNORE INTO instruments (instrument_key, table_suffix, instrument_type, option_type, strike_price)
+        VALUES (?, ?, ?, ?, ?)
+        ''', (instrument_key, table_suffix, instrument_type, option_type, strike_price))
+    cursor.execute("SELECT instrument_id FROM instruments WHERE instrument_key = ?", (instrument_key,))
+    return cursor.fetchone()[0]
+
+
+def split_data_type(data_type: str) -> Tuple[str, int]:
+    """'candles5' -> ('candles', 5), 'heikin_ashi' -> ('heikin_ashi', 1)"""
+    for family in STORE_TABLES:
+        if data_type.startswith(family):
+            minutes = data_type[len(family):]
+            return family, int(minutes) if minutes else 1
+    raise ValueError(f"Unknown candle table family: {data_type}")
+
+
+def insert_sql(family: str) -> str:
+    table, columns = STORE_TABLES[family]
+    placeholders = ', '.join('?' * (len(columns) + 3))
+    return f"INSERT OR REPLACE INTO {table} (instrument_id, interval, ts, {', '.join(columns)}) VALUES ({placeholders})"
+
+
+def create_daily_view(cursor, view_name: str, data_type: str, instrument_id: int, trade_date: date,
+                      last_date: Optional[date] = None):
+    """View under an old daily table name over that instrument's bars of that interval from trade_date
+    through last_date (default: the same day).
+
+    A no-op when a table of that name still exists (it is migrated and replaced by migrate_to_bars.py).
+    """
+    family, minutes = split_data_type(data_type)
+    table, columns = STORE_TABLES[family]
+    # ts is ISO text ('2025-02-19T09:15:00+05:30'), so the days are a string range
+    day, next_day = trade_date.isoformat(), ((last_date or trade_date) + timedelta(days=1)).isoformat()
+    cursor.execute(f'''
+        CREATE VIEW IF NOT EXISTS {view_name} AS
+        SELECT i.instrument_key AS instrument_key, b.ts AS timestamp, {', '.join('b.' + column for column in columns)}
+        FROM {table} b JOIN instruments i ON i.instrument_id = b.instrument_id
+        WHERE b.instrument_id = {int(instrument_id)} AND b.interval = {int(minutes)}
+        AND b.ts >= '{day}' AND b.ts < '{next_day}'
+        ''')
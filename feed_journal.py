@@ -0,0 +1,256 @@
+"""
+Append-only binary journal for raw market data feed frames.
+
+Layout of a journal file (``<prefix>_<YYYYmmdd_HHMMSS>_<seq>.fjl``):
+
+    header  : b"FJL1" + codec byte (0 = raw, 1 = zstd)
+    block*  : <raw_len:uint32><stored_len:uint32><payload>
+    payload : record* (zstd-compressed as a whole when codec = 1)
+    record  : <mono_ns:int64><wall_ns:int64><length:uint32><frame bytes>
+
+Blocks are cut at every wall-clock minute boundary, and the sidecar
+``.idx`` file gets one <minute_ms:int64><offset:uint64> entry per minute,
+so a reader can jump to any minute without scanning the whole day.
+
+Frames are handed over with ``capture()`` which only appends to an
+in-memory buffer; compression and disk I/O happen on a background thread.
+"""
+
+import heapq
+import logging
+import struct
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("UpstoxTradingV3")
+
+FILE_MAGIC = b"FJL1"
+CODEC_RAW = 0
+CODEC_ZSTD = 1
+FILE_SUFFIX = ".fjl"
+INDEX_SUFFIX = ".idx"
+
+BLOCK_HEADER = struct.Struct("<II")
+RECORD_HEADER = struct.Struct("<qqI")
+INDEX_ENTRY = struct.Struct("<qQ")
+
+MINUTE_NS = 60_000_000_000
+
+
+class FeedJournalWriter:
+    """Background-thread journal writer; ``capture()`` never blocks the caller"""
+
+    def __init__(self, directory, prefix: str = "feed", compress: bool = True,
+                 rotate_mb: int = 256, max_block_kb: int = 256, flush_interval: float = 0.25,
+                 max_buffered_frames: int = 200000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        if compress and zstandard is None:
+            logger.warning("zstandard not installed - feed journal will be written uncompressed")
+            compress = False
+        self.codec = CODEC_ZSTD if compress else CODEC_RAW
+        self._compressor = zstandard.ZstdCompressor(level=3) if self.codec == CODEC_ZSTD else None
+        self.rotate_bytes = rotate_mb * 1024 * 1024
+        self.max_block_bytes = max_block_kb * 1024
+        self.flush_interval = flush_interval
+        self.max_buffered_frames = max_buffered_frames
+        self._buffer = deque()
+        self._wake = threading.Event()
+        self._running = True
+        self._file = None
+        self._index = None
+        self._file_seq = 0
+        self._file_bytes = 0
+        self._last_indexed_minute = None
+        # Stats
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.current_path: Optional[Path] = None
+        self._thread = threading.Thread(target=self._writer_loop, name=f"feed-journal-{prefix}", daemon=True)
+        self._thread.start()
+        logger.info(f"Feed journal capturing to {self.directory} (codec={'zstd' if self.codec else 'raw'})")
+
+    def capture(self, frame: bytes, recv_ns: int = None):
+        """Queue one raw frame with its monotonic receive time (hot path: append only)"""
+        if len(self._buffer) >= self.max_buffered_frames:
+            self.dropped += 1
+            return
+        self._buffer.append((recv_ns or time.monotonic_ns(), time.time_ns(), frame))
+        self.captured += 1
+
+    def close(self, timeout: float = 10.0):
+        self._running = False
+        self._wake.set()
+        self._thread.join(timeout=timeout)
+
+    def stats(self) -> dict:
+        return {
+            'captured': self.captured,
+            'written': self.written,
+            'dropped': self.dropped,
+            'buffered': len(self._buffer),
+            'bytes_written': self.bytes_written,
+            'file': str(self.current_path) if self.current_path else None
+        }
+
+    # --- writer thread ---
+    def _writer_loop(self):
+        try:
+            while self._running:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                self._drain()
+            self._drain()
+        except Exception as e:
+            logger.error(f"Feed journal writer stopped: {e}")
+        finally:
+            self._close_file()
+
+    def _drain(self):
+        buffer = self._buffer
+        if not buffer:
+            return
+        block = []
+        block_bytes = 0
+        block_minute = None
+        while buffer:
+            record = buffer.popleft()
+            minute = record[1] // MINUTE_NS
+            if block and (minute != block_minute or block_bytes >= self.max_block_bytes):
+                self._write_block(block, block_minute)
+                block = []
+                block_bytes = 0
+            block_minute = minute
+            block.append(record)
+            block_bytes += RECORD_HEADER.size + len(record[2])
+        if block:
+            self._write_block(block, block_minute)
+        if self._file:
+            self._file.flush()
+            self._index.flush()
+
+    def _write_block(self, records: List[Tuple[int, int, bytes]], minute: int):
+        if self._file is None or self._file_bytes >= self.rotate_bytes:
+            self._rotate()
+        payload = b"".join(RECORD_HEADER.pack(mono_ns, wall_ns, len(frame)) + frame
+                           for mono_ns, wall_ns, frame in records)
+        stored = self._compressor.compress(payload) if self._compressor else payload
+        offset = self._file_bytes
+        if minute != self._last_indexed_minute:
+            self._index.write(INDEX_ENTRY.pack(minute * MINUTE_NS // 1_000_000, offset))
+            self._last_indexed_minute = minute
+        self._file.write(BLOCK_HEADER.pack(len(payload), len(stored)))
+        self._file.write(stored)
+        written = BLOCK_HEADER.size + len(stored)
+        self._file_bytes += written
+        self.bytes_written += written
+        self.written += len(records)
+
+    def _rotate(self):
+        self._close_file()
+        self._file_seq += 1
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        self.current_path = self.directory / f"{self.prefix}_{stamp}_{self._file_seq:04d}{FILE_SUFFIX}"
+        self._file = open(self.current_path, "wb")
+        self._index = open(self.current_path.with_suffix(INDEX_SUFFIX), "wb")
+        self._file.write(FILE_MAGIC + bytes([self.codec]))
+        self._file_bytes = len(FILE_MAGIC) + 1
+        self._last_indexed_minute = None
+
+    def _close_file(self):
+        for handle in (self._file, self._index):
+            if handle:
+                try:
+                    handle.close()
+                except OSError:
+                    pass
+        self._file = None
+        self._index = None
+
+
+class FeedJournalReader:
+    """Reads journal files back in receive order, optionally starting at a given minute"""
+
+    def __init__(self, path):
+        path = Path(path)
+        if path.is_dir():
+            self.files = sorted(path.glob(f"*{FILE_SUFFIX}"))
+        else:
+            self.files = [path]
+        if not self.files:
+            raise FileNotFoundError(f"No feed journal files found at {path}")
+
+    @staticmethod
+    def read_index(journal_file: Path) -> List[Tuple[int, int]]:
+        index_path = Path(journal_file).with_suffix(INDEX_SUFFIX)
+        if not index_path.exists():
+            return []
+        data = index_path.read_bytes()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        return [INDEX_ENTRY.unpack_from(data, pos) for pos in range(0, usable, INDEX_ENTRY.size)]
+
+    def _streams(self) -> List[List[Path]]:
+        """Group files by prefix: each writer (e.g. one per feed shard) is one sequential stream"""
+        streams = {}
+        for journal_file in self.files:
+            prefix = journal_file.name.rsplit("_", 3)[0]
+            streams.setdefault(prefix, []).append(journal_file)
+        return list(streams.values())
+
+    def _iter_file(self, journal_file: Path, start_ms: Optional[int]) -> Iterator[Tuple[int, int, bytes]]:
+        offset = len(FILE_MAGIC) + 1
+        if start_ms is not None:
+            for minute_ms, block_offset in self.read_index(journal_file):
+                if minute_ms > start_ms:
+                    break
+                offset = block_offset
+        decompressor = None
+        with open(journal_file, "rb") as f:
+            header = f.read(len(FILE_MAGIC) + 1)
+            if len(header) < len(FILE_MAGIC) + 1 or header[:len(FILE_MAGIC)] != FILE_MAGIC:
+                raise ValueError(f"{journal_file} is not a feed journal")
+            if header[-1] == CODEC_ZSTD:
+                if zstandard is None:
+                    raise RuntimeError(f"{journal_file} is zstd-compressed but zstandard is not installed")
+                decompressor = zstandard.ZstdDecompressor()
+            f.seek(offset)
+            while True:
+                block_header = f.read(BLOCK_HEADER.size)
+                if len(block_header) < BLOCK_HEADER.size:
+                    return
+                raw_len, stored_len = BLOCK_HEADER.unpack(block_header)
+                stored = f.read(stored_len)
+                if len(stored) < stored_len:
+                    return  # Truncated tail from an unclean shutdown
+                payload = decompressor.decompress(stored, max_output_size=raw_len) if decompressor else stored
+                pos = 0
+                while pos < len(payload):
+                    mono_ns, wall_ns, length = RECORD_HEADER.unpack_from(payload, pos)
+                    pos += RECORD_HEADER.size
+                    if start_ms is None or wall_ns // 1_000_000 >= start_ms:
+                        yield mono_ns, wall_ns, payload[pos:pos + length]
+                    pos += length
+
+    def _iter_stream(self, files: List[Path], start_ms: Optional[int]) -> Iterator[Tuple[int, int, bytes]]:
+        for journal_file in files:
+            yield from self._iter_file(journal_file, start_ms)
+
+    def records(self, start_ms: int = None, end_ms: int = None) -> Iterator[Tuple[int, int, bytes]]:
+        """Yield (mono_ns, wall_ns, frame) across all streams, merged by receive time"""
+        streams = [self._iter_stream(files, start_ms) for files in self._streams()]
+        merged = streams[0] if len(streams) == 1 else heapq.merge(*streams, key=lambda record: record[0])
+        for record in merged:
+            if end_ms is not None and record[1] // 1_000_000 >= end_ms:
+                return
+            yield record
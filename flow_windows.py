@@ -0,0 +1,290 @@
+"""
+Rolling cash flow windows over the selected options.
+
+Signed cash flow (the same amounts OptionsTickCashFlowCalculator adds to its
+running cash) is bucketed per second and per minute in ring buffers, one
+column per option, so it can be split by CE/PE side and by strike. Every
+rolling window keeps a running sum that a closing bucket is added to and the
+bucket leaving the window is subtracted from, plus monotonic deques of the
+bucket totals for its min/max: a bucket roll is O(1) per window (and one
+vector add over the options) and reading a window is O(1).
+
+A window of N buckets covers the open bucket and the N-1 closed buckets
+before it. Flow is stamped with the latest trade time seen, so flow of a tick
+stamped before the open bucket counts toward the open bucket.
+
+    windows = CashFlowWindows(calculator.options, minute_windows=[5, 15, 30], second_windows=[10, 30, 60])
+    windows.add(ltt_ms, slot, flow)
+    windows.snapshot(now_ms)['minutes']['windows'][15]['total']
+"""
+
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SIDE_CE, SIDE_PE, SIDE_OTHER = 0, 1, 2
+# Columns of a bucket's totals
+TOTAL, CE, PE = 0, 1, 2
+SERIES = ('total', 'ce', 'pe')
+
+
+class RollingFlow:
+    """Cash flow in buckets of ``bucket_ms`` with rolling windows of ``windows`` buckets.
+
+    Closed buckets are handed to ``parent`` (a coarser RollingFlow), which is how
+    the minute buckets are built from the second buckets.
+    """
+
+    def __init__(self, sides: np.ndarray, strike_ids: np.ndarray, strikes: List[float], bucket_ms: int,
+                 windows, parent: Optional['RollingFlow'] = None):
+        self.sides = sides
+        self.side_of = sides.tolist()
+        self.strike_ids = strike_ids
+        self.strikes = strikes
+        self.bucket_ms = bucket_ms
+        self.windows = sorted({int(size) for size in windows if int(size) > 0}) or [1]
+        self.capacity = max(self.windows)
+        self.parent = parent
+        size = len(sides)
+        self.ring = np.zeros((self.capacity, size))
+        self.ring_totals = np.zeros((self.capacity, 3))
+        self.open_bucket: Optional[int] = None
+        self.open_flow = np.zeros(size)
+        self.open_totals = [0.0, 0.0, 0.0]
+        # (slot, flow) of single ticks not folded into open_flow yet
+        self.pending: list = []
+        self._reset_windows()
+
+    def _reset_windows(self):
+        size = len(self.sides)
+        self.closed_sums = {window: np.zeros(size) for window in self.windows}
+        self.closed_totals = {window: np.zeros(3) for window in self.windows}
+        # window -> per series, deques of (bucket, total) with increasing / decreasing totals
+        self.lows = {window: [deque() for _ in SERIES] for window in self.windows}
+        self.highs = {window: [deque() for _ in SERIES] for window in self.windows}
+
+    def add(self, ts_ms: int, slot: int, flow: float):
+        """One option's flow; O(1)"""
+        bucket = ts_ms // self.bucket_ms
+        if self.open_bucket is None or bucket > self.open_bucket:
+            self.advance_bucket(bucket)
+        self.pending.append((slot, flow))
+        totals = self.open_totals
+        totals[TOTAL] += flow
+        side = self.side_of[slot]
+        if side != SIDE_OTHER:
+            totals[CE + side] += flow
+
+    def _fold_pending(self):
+        slots, flows = zip(*self.pending)
+        self.open_flow += np.bincount(slots, weights=flows, minlength=len(self.sides))
+        self.pending = []
+
+    def add_many(self, ts_ms: int, slots: np.ndarray, flows: np.ndarray):
+        """Flow of several distinct options stamped with the same time"""
+        bucket = ts_ms // self.bucket_ms
+        if self.open_bucket is None or bucket > self.open_bucket:
+            self.advance_bucket(bucket)
+        self.open_flow[slots] += flows
+        by_side = np.bincount(self.sides[slots], weights=flows, minlength=3)
+        totals = self.open_totals
+        totals[TOTAL] += float(flows.sum())
+        totals[CE] += float(by_side[SIDE_CE])
+        totals[PE] += float(by_side[SIDE_PE])
+
+    def add_row(self, ts_ms: int, row: np.ndarray, row_totals):
+        """A closed bucket of a finer RollingFlow"""
+        bucket = ts_ms // self.bucket_ms
+        if self.open_bucket is None or bucket > self.open_bucket:
+            self.advance_bucket(bucket)
+        self.open_flow += row
+        totals = self.open_totals
+        for column in range(3):
+            totals[column] += row_totals[column]
+
+    def advance(self, ts_ms: int):
+        """Close the buckets that ended by ``ts_ms`` (the windows slide even without flow)"""
+        bucket = ts_ms // self.bucket_ms
+        if self.open_bucket is not None and bucket > self.open_bucket:
+            self.advance_bucket(bucket)
+
+    def advance_bucket(self, bucket: int):
+        if self.open_bucket is None:
+            self.open_bucket = bucket
+            return
+        if bucket - self.open_bucket > self.capacity:
+            # Silent for longer than the widest window: nothing in the ring is needed any more
+            self._close()
+            if self.parent is not None:
+                self.parent.advance(bucket * self.bucket_ms)
+            self.ring[:] = 0.0
+            self.ring_totals[:] = 0.0
+            self._reset_windows()
+            # The silent buckets inside each window count as zero flow for min/max; the newest
+            # one stands for all of them, it is the last to leave the window
+            for window in self.windows:
+                if window == 1:
+                    continue
+                for lows, highs in zip(self.lows[window], self.highs[window]):
+                    lows.append((bucket - 1, 0.0))
+                    highs.append((bucket - 1, 0.0))
+            self.open_bucket = bucket
+            return
+        while self.open_bucket < bucket:
+            self._close()
+
+    def _close(self):
+        if self.pending:
+            self._fold_pending()
+        bucket = self.open_bucket
+        position = bucket % self.capacity
+        row = self.open_flow
+        totals = self.open_totals
+        self.ring[position] = row
+        self.ring_totals[position] = totals
+        for window in self.windows:
+            if window == 1:
+                continue
+            # After the roll the window covers buckets bucket-window+2 .. bucket+1
+            leaving = bucket - window + 1
+            closed_sum = self.closed_sums[window]
+            closed_sum += row
+            closed_totals = self.closed_totals[window]
+            closed_totals += totals
+            # Still in the ring: only buckets up to bucket-capacity have been overwritten
+            closed_sum -= self.ring[leaving % self.capacity]
+            closed_totals -= self.ring_totals[leaving % self.capacity]
+            for series, value in enumerate(totals):
+                lows = self.lows[window][series]
+                while lows and lows[-1][1] >= value:
+                    lows.pop()
+                lows.append((bucket, value))
+                while lows[0][0] <= leaving:
+                    lows.popleft()
+                highs = self.highs[window][series]
+                while highs and highs[-1][1] <= value:
+                    highs.pop()
+                highs.append((bucket, value))
+                while highs[0][0] <= leaving:
+                    highs.popleft()
+        if self.parent is not None:
+            self.parent.add_row(bucket * self.bucket_ms, row, totals)
+        self.open_bucket = bucket + 1
+        self.open_flow = np.zeros(len(self.sides))
+        self.open_totals = [0.0, 0.0, 0.0]
+
+    def window(self, size: int, by_strike: bool = False, unclosed: Optional[tuple] = None) -> dict:
+        """Sums and bucket min/max of one window; ``unclosed`` is (row, totals) of a finer open bucket"""
+        if self.pending:
+            self._fold_pending()
+        open_totals = list(self.open_totals)
+        if unclosed is not None:
+            for column in range(3):
+                open_totals[column] += unclosed[1][column]
+        closed_totals = self.closed_totals[size]
+        result = {}
+        low_values = {}
+        high_values = {}
+        for series, name in enumerate(SERIES):
+            result[name] = float(closed_totals[series]) + open_totals[series]
+            lows = self.lows[size][series]
+            highs = self.highs[size][series]
+            low_values[name] = min(lows[0][1], open_totals[series]) if lows else open_totals[series]
+            high_values[name] = max(highs[0][1], open_totals[series]) if highs else open_totals[series]
+        result['min'] = low_values
+        result['max'] = high_values
+        if by_strike:
+            flow = self.closed_sums[size] + self.open_flow
+            if unclosed is not None:
+                flow = flow + unclosed[0]
+            per_strike = np.bincount(self.strike_ids, weights=flow, minlength=len(self.strikes))
+            result['by_strike'] = dict(zip(self.strikes, per_strike.tolist()))
+        return result
+
+    def state(self) -> dict:
+        if self.pending:
+            self._fold_pending()
+        return {
+            'ring': self.ring.copy(), 'ring_totals': self.ring_totals.copy(), 'open_bucket': self.open_bucket,
+            'open_flow': self.open_flow.copy(), 'open_totals': list(self.open_totals),
+            'closed_sums': {window: values.copy() for window, values in self.closed_sums.items()},
+            'closed_totals': {window: values.copy() for window, values in self.closed_totals.items()},
+            'lows': {window: [list(values) for values in series] for window, series in self.lows.items()},
+            'highs': {window: [list(values) for values in series] for window, series in self.highs.items()}
+        }
+
+    def restore(self, state: dict):
+        self.ring = state['ring']
+        self.ring_totals = state['ring_totals']
+        self.open_bucket = state['open_bucket']
+        self.open_flow = state['open_flow']
+        self.open_totals = state['open_totals']
+        self.pending = []
+        self.closed_sums = state['closed_sums']
+        self.closed_totals = state['closed_totals']
+        self.lows = {window: [deque(values) for values in series] for window, series in state['lows'].items()}
+        self.highs = {window: [deque(values) for values in series] for window, series in state['highs'].items()}
+
+
+class CashFlowWindows:
+    """Per-second and per-minute rolling cash flow of a set of options.
+
+    ``options`` maps instrument key -> row with 'option_type' and 'strike' (the
+    calculator's ``options``); window sizes are in seconds and minutes.
+    """
+
+    def __init__(self, options: Dict[str, dict], minute_windows=(5, 15, 30), second_windows=(10, 30, 60)):
+        self.keys = list(options)
+        self.slots = {key: slot for slot, key in enumerate(self.keys)}
+        rows = list(options.values())
+        sides = np.array([SIDE_CE if row['option_type'] == 'CE' else SIDE_PE if row['option_type'] == 'PE'
+                          else SIDE_OTHER for row in rows], dtype=np.int64)
+        strikes = sorted({row['strike'] for row in rows})
+        strike_index = {strike: index for index, strike in enumerate(strikes)}
+        strike_ids = np.array([strike_index[row['strike']] for row in rows], dtype=np.int64)
+        self.minutes = RollingFlow(sides, strike_ids, strikes, 60_000, minute_windows)
+        self.seconds = RollingFlow(sides, strike_ids, strikes, 1_000, second_windows, parent=self.minutes)
+
+    def add(self, ts_ms: int, slot: int, flow: float):
+        self.seconds.add(ts_ms, slot, flow)
+
+    def add_many(self, ts_ms: int, slots: np.ndarray, flows: np.ndarray):
+        self.seconds.add_many(ts_ms, slots, flows)
+
+    def advance(self, ts_ms: int):
+        self.seconds.advance(ts_ms)
+        self.minutes.advance(ts_ms)
+
+    def snapshot(self, now_ms: Optional[int] = None, by_strike: bool = False) -> dict:
+        """Every window of both resolutions; with ``now_ms`` the windows first slide up to that time"""
+        if now_ms is not None:
+            self.advance(now_ms)
+        seconds, minutes = self.seconds, self.minutes
+        unclosed = None
+        if seconds.open_bucket is not None:
+            # The open second is not in the minute buckets yet
+            open_ms = seconds.open_bucket * seconds.bucket_ms
+            if minutes.open_bucket is None:
+                minutes.advance_bucket(open_ms // minutes.bucket_ms)
+            minutes.advance(open_ms)
+            if seconds.pending:
+                seconds._fold_pending()
+            unclosed = (seconds.open_flow, seconds.open_totals)
+        return {
+            'seconds': {'bucket': seconds.open_bucket,
+                        'windows': {size: seconds.window(size, by_strike) for size in seconds.windows}},
+            'minutes': {'bucket': minutes.open_bucket,
+                        'windows': {size: minutes.window(size, by_strike, unclosed) for size in minutes.windows}}
+        }
+
+    def state(self) -> dict:
+        return {'keys': list(self.keys), 'seconds': self.seconds.state(), 'minutes': self.minutes.state()}
+
+    def restore(self, state: dict) -> bool:
+        """Restore a state saved for the same options in the same order; False (and no change) otherwise"""
+        if state['keys'] != self.keys:
+            return False
+        self.seconds.restore(state['seconds'])
+        self.minutes.restore(state['minutes'])
+        return True
@@ -0,0 +1,367 @@
+"""
+Streaming technical indicators for closed bars.
+
+Each indicator updates in O(1) per bar, exposes its whole state as a plain
+dict (``state()`` / ``from_state()``) so it can be checkpointed, and can be
+warmed up from NumPy arrays of past bars with ``warm_up()``. The exponential
+averages behind MACD, RSI and ATR are warmed up a block of bars at a time
+with matrix products instead of a Python loop per bar.
+
+    macd = MACD(12, 26, 9)
+    macd.warm_up(past_closes)
+    line, signal, histogram = macd.update(close)
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+_BLOCK = 64
+
+
+def ema_series(values, alpha: float, seed: Optional[float] = None) -> np.ndarray:
+    """Exponential moving average of every element of ``values``.
+
+    ``seed`` is the average before the first value; without one the first
+    value seeds it. Within a block of bars
+    ema[t] = sum_i alpha * (1 - alpha)**(t - i) * x[i] + (1 - alpha)**(t + 1) * ema[-1],
+    so a block is one lower-triangular matrix product. Every weight is <= 1,
+    which keeps the product numerically stable.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.empty_like(values)
+    if not len(values):
+        return out
+    decay = 1.0 - alpha
+    begin = 0
+    previous = seed
+    if previous is None:
+        previous = out[0] = values[0]
+        begin = 1
+    lags = np.arange(_BLOCK)
+    exponent = lags[:, None] - lags[None, :]
+    weights = np.where(exponent >= 0, alpha * decay ** np.maximum(exponent, 0), 0.0)
+    carry = decay ** (lags + 1)
+    for start in range(begin, len(values), _BLOCK):
+        block = values[start:start + _BLOCK]
+        size = len(block)
+        out[start:start + size] = weights[:size, :size] @ block + carry[:size] * previous
+        previous = out[start + size - 1]
+    return out
+
+
+class EMA:
+    """Exponential moving average, seeded with the first value"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.value: Optional[float] = None
+        self.count = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.period
+
+    def update(self, value: float) -> float:
+        self.value = value if self.value is None else self.value + self.alpha * (value - self.value)
+        self.count += 1
+        return self.value
+
+    def warm_up(self, values) -> Optional[float]:
+        values = np.asarray(values, dtype=np.float64)
+        if len(values):
+            self.value = float(ema_series(values, self.alpha, self.value)[-1])
+            self.count += len(values)
+        return self.value
+
+    def state(self) -> dict:
+        return {'period': self.period, 'value': self.value, 'count': self.count}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'EMA':
+        ema = cls(state['period'])
+        ema.value = state['value']
+        ema.count = state['count']
+        return ema
+
+
+class MACD:
+    """MACD line (fast EMA - slow EMA), its signal EMA and the histogram"""
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    @property
+    def ready(self) -> bool:
+        return self.slow.ready and self.signal.ready
+
+    def update(self, close: float) -> Tuple[float, float, float]:
+        line = self.fast.update(close) - self.slow.update(close)
+        signal = self.signal.update(line)
+        return line, signal, line - signal
+
+    def warm_up(self, closes):
+        closes = np.asarray(closes, dtype=np.float64)
+        if not len(closes):
+            return
+        fast = ema_series(closes, self.fast.alpha, self.fast.value)
+        slow = ema_series(closes, self.slow.alpha, self.slow.value)
+        lines = fast - slow
+        signal = ema_series(lines, self.signal.alpha, self.signal.value)
+        for ema, series in ((self.fast, fast), (self.slow, slow), (self.signal, signal)):
+            ema.value = float(series[-1])
+            ema.count += len(closes)
+
+    def state(self) -> dict:
+        return {'fast': self.fast.state(), 'slow': self.slow.state(), 'signal': self.signal.state()}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'MACD':
+        macd = cls()
+        macd.fast = EMA.from_state(state['fast'])
+        macd.slow = EMA.from_state(state['slow'])
+        macd.signal = EMA.from_state(state['signal'])
+        return macd
+
+
+class RSI:
+    """Wilder's RSI; gains and losses are smoothed with alpha = 1/period, seeded by the first change"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.alpha = 1.0 / period
+        self.previous_close: Optional[float] = None
+        self.avg_gain: Optional[float] = None
+        self.avg_loss: Optional[float] = None
+        self.count = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.period
+
+    @property
+    def value(self) -> Optional[float]:
+        if self.avg_gain is None:
+            return None
+        if self.avg_loss == 0:
+            return 100.0 if self.avg_gain > 0 else 50.0
+        return 100.0 - 100.0 / (1.0 + self.avg_gain / self.avg_loss)
+
+    def update(self, close: float) -> Optional[float]:
+        if self.previous_close is not None:
+            change = close - self.previous_close
+            gain = change if change > 0 else 0.0
+            loss = -change if change < 0 else 0.0
+            if self.avg_gain is None:
+                self.avg_gain, self.avg_loss = gain, loss
+            else:
+                self.avg_gain += self.alpha * (gain - self.avg_gain)
+                self.avg_loss += self.alpha * (loss - self.avg_loss)
+            self.count += 1
+        self.previous_close = close
+        return self.value
+
+    def warm_up(self, closes) -> Optional[float]:
+        closes = np.asarray(closes, dtype=np.float64)
+        if not len(closes):
+            return self.value
+        if self.previous_close is not None:
+            closes = np.concatenate(([self.previous_close], closes))
+        changes = np.diff(closes)
+        if len(changes):
+            self.avg_gain = float(ema_series(np.maximum(changes, 0.0), self.alpha, self.avg_gain)[-1])
+            self.avg_loss = float(ema_series(np.maximum(-changes, 0.0), self.alpha, self.avg_loss)[-1])
+            self.count += len(changes)
+        self.previous_close = float(closes[-1])
+        return self.value
+
+    def state(self) -> dict:
+        return {'period': self.period, 'previous_close': self.previous_close,
+                'avg_gain': self.avg_gain, 'avg_loss': self.avg_loss, 'count': self.count}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'RSI':
+        rsi = cls(state['period'])
+        rsi.previous_close = state['previous_close']
+        rsi.avg_gain = state['avg_gain']
+        rsi.avg_loss = state['avg_loss']
+        rsi.count = state['count']
+        return rsi
+
+
+class ATR:
+    """Wilder's average true range, seeded with the first bar's range"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.alpha = 1.0 / period
+        self.previous_close: Optional[float] = None
+        self.value: Optional[float] = None
+        self.count = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.period
+
+    def update(self, high: float, low: float, close: float) -> float:
+        true_range = high - low
+        if self.previous_close is not None:
+            true_range = max(true_range, abs(high - self.previous_close), abs(low - self.previous_close))
+        self.value = true_range if self.value is None else self.value + self.alpha * (true_range - self.value)
+        self.previous_close = close
+        self.count += 1
+        return self.value
+
+    def true_ranges(self, high, low, close) -> np.ndarray:
+        high, low, close = (np.asarray(column, dtype=np.float64) for column in (high, low, close))
+        ranges = high - low
+        previous = np.concatenate(([np.nan if self.previous_close is None else self.previous_close], close[:-1]))
+        gaps = np.fmax(np.abs(high - previous), np.abs(low - previous))  # NaN only for a first-ever bar
+        return np.fmax(ranges, gaps)
+
+    def warm_up(self, high, low, close) -> Optional[float]:
+        close = np.asarray(close, dtype=np.float64)
+        if not len(close):
+            return self.value
+        self.value = float(ema_series(self.true_ranges(high, low, close), self.alpha, self.value)[-1])
+        self.previous_close = float(close[-1])
+        self.count += len(close)
+        return self.value
+
+    def state(self) -> dict:
+        return {'period': self.period, 'previous_close': self.previous_close, 'value': self.value, 'count': self.count}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'ATR':
+        atr = cls(state['period'])
+        atr.previous_close = state['previous_close']
+        atr.value = state['value']
+        atr.count = state['count']
+        return atr
+
+
+class SuperTrend:
+    """SuperTrend on ATR bands around the bar midpoint; direction is 1 (up) or -1 (down)"""
+
+    def __init__(self, period: int = 10, multiplier: float = 3.0):
+        self.multiplier = multiplier
+        self.atr = ATR(period)
+        self.upper: Optional[float] = None
+        self.lower: Optional[float] = None
+        self.direction = 1
+        self.previous_close: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.atr.ready
+
+    @property
+    def value(self) -> Optional[float]:
+        return self.lower if self.direction == 1 else self.upper
+
+    def update(self, high: float, low: float, close: float) -> Tuple[float, int]:
+        return self._step(high, low, close, self.atr.update(high, low, close))
+
+    def _step(self, high: float, low: float, close: float, atr: float) -> Tuple[float, int]:
+        middle = (high + low) / 2.0
+        upper = middle + self.multiplier * atr
+        lower = middle - self.multiplier * atr
+        previous_upper, previous_lower, previous_close = self.upper, self.lower, self.previous_close
+        if previous_upper is not None:
+            # Bands only tighten while price stays inside them
+            if previous_close < previous_upper:
+                upper = min(upper, previous_upper)
+            if previous_close > previous_lower:
+                lower = max(lower, previous_lower)
+            if self.direction == -1 and close > previous_upper:
+                self.direction = 1
+            elif self.direction == 1 and close < previous_lower:
+                self.direction = -1
+        self.upper, self.lower, self.previous_close = upper, lower, close
+        return self.value, self.direction
+
+    def warm_up(self, high, low, close):
+        """The ATR is warmed up vectorised; the band ratchet depends on the previous bar, so it is stepped"""
+        high, low, close = (np.asarray(column, dtype=np.float64) for column in (high, low, close))
+        if not len(close):
+            return
+        atr = ema_series(self.atr.true_ranges(high, low, close), self.atr.alpha, self.atr.value)
+        self.atr.value = float(atr[-1])
+        self.atr.previous_close = float(close[-1])
+        self.atr.count += len(close)
+        for bar_high, bar_low, bar_close, bar_atr in zip(high.tolist(), low.tolist(), close.tolist(), atr.tolist()):
+            self._step(bar_high, bar_low, bar_close, bar_atr)
+
+    def state(self) -> dict:
+        return {'multiplier': self.multiplier, 'atr': self.atr.state(), 'upper': self.upper, 'lower': self.lower,
+                'direction': self.direction, 'previous_close': self.previous_close}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'SuperTrend':
+        supertrend = cls(multiplier=state['multiplier'])
+        supertrend.atr = ATR.from_state(state['atr'])
+        supertrend.upper = state['upper']
+        supertrend.lower = state['lower']
+        supertrend.direction = state['direction']
+        supertrend.previous_close = state['previous_close']
+        return supertrend
+
+
+class IndicatorSet:
+    """The indicators of one instrument on one timeframe, configured from the INDICATORS config dict:
+
+        {"MACD": [12, 26, 9], "RSI": 14, "ATR": 14, "SUPERTREND": [10, 3]}
+    """
+
+    def __init__(self, config: dict = None):
+        config = config or {}
+        fast, slow, signal = config.get('MACD', [12, 26, 9])
+        period, multiplier = config.get('SUPERTREND', [10, 3])
+        self.macd = MACD(fast, slow, signal)
+        self.rsi = RSI(config.get('RSI', 14))
+        self.atr = ATR(config.get('ATR', 14))
+        self.supertrend = SuperTrend(period, multiplier)
+        self.values: dict = {}
+
+    def update(self, high: float, low: float, close: float) -> dict:
+        """Feed one closed bar; returns (and keeps in ``values``) the latest reading of every indicator"""
+        macd, macd_signal, macd_histogram = self.macd.update(close)
+        supertrend, direction = self.supertrend.update(high, low, close)
+        self.values = {
+            'macd': macd, 'macd_signal': macd_signal, 'macd_histogram': macd_histogram,
+            'rsi': self.rsi.update(close), 'atr': self.atr.update(high, low, close),
+            'supertrend': supertrend, 'supertrend_direction': direction
+        }
+        return self.values
+
+    def warm_up(self, high, low, close):
+        """Catch up on past bars (oldest first) given as arrays"""
+        self.macd.warm_up(close)
+        self.rsi.warm_up(close)
+        self.atr.warm_up(high, low, close)
+        self.supertrend.warm_up(high, low, close)
+        if self.macd.signal.value is not None:
+            line = self.macd.fast.value - self.macd.slow.value
+            self.values = {
+                'macd': line, 'macd_signal': self.macd.signal.value,
+                'macd_histogram': line - self.macd.signal.value,
+                'rsi': self.rsi.value, 'atr': self.atr.value,
+                'supertrend': self.supertrend.value, 'supertrend_direction': self.supertrend.direction
+            }
+
+    def state(self) -> dict:
+        return {'macd': self.macd.state(), 'rsi': self.rsi.state(), 'atr': self.atr.state(),
+                'supertrend': self.supertrend.state(), 'values': dict(self.values)}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'IndicatorSet':
+        indicators = cls()
+        indicators.macd = MACD.from_state(state['macd'])
+        indicators.rsi = RSI.from_state(state['rsi'])
+        indicators.atr = ATR.from_state(state['atr'])
+        indicators.supertrend = SuperTrend.from_state(state['supertrend'])
+        indicators.values = dict(state.get('values', {}))
+        return indicators
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Import the per-day candle tables (candles_<suffix>_<yyyymmdd>, candles5_..., heikin_ashi_...,
+heikin_ashi5_..., ...) into the consolidated bars / ha_bars tables of candle_store.py.
+
+Rows already in bars are replaced by the imported ones, so the import can be re-run.
+With --replace each imported table is dropped and a view of the same name is created
+over its slice of bars, so queries against the old names keep working. Run it with
+the pipeline stopped, then set "CANDLE_STORE": "bars" in the config.
+
+    python migrate_to_bars.py                      # import, keep the daily tables
+    python migrate_to_bars.py --replace            # import and swap the tables for views
+    python migrate_to_bars.py --db database/replay.db --dry-run
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import date, datetime
+
+import candle_store
+
+DAILY_TABLE = re.compile(r'^((?:candles|heikin_ashi)\d*)_(.+)_(\d{8})$')
+OPTION_SUFFIX = re.compile(r'^(ce|pe)_([\d.]+)$')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import the per-day candle tables into the bars store")
+    parser.add_argument("--db", default=os.getenv('TRADING_DB', 'database/upstox_v3_live_trading.db'),
+                        help="Trading database (default: TRADING_DB or database/upstox_v3_live_trading.db)")
+    parser.add_argument("--replace", action="store_true",
+                        help="Drop each imported table and create a compatibility view under its name")
+    parser.add_argument("--dry-run", action="store_true", help="List the tables that would be imported")
+    return parser.parse_args()
+
+
+def instrument_fields(table_suffix):
+    """(instrument_type, option_type, strike_price) from a table suffix"""
+    if table_suffix == 'nifty_index':
+        return 'INDEX', None, None
+    if table_suffix == 'future':
+        return 'FUTURE', None, None
+    match = OPTION_SUFFIX.match(table_suffix)
+    if match:
+        return 'OPTION', match.group(1).upper(), float(match.group(2))
+    return 'UNKNOWN', None, None
+
+
+def daily_tables(cursor):
+    """(table_name, data_type, table_suffix, trade_date) of every per-day candle table"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")
+    tables = []
+    for (name,) in cursor.fetchall():
+        match = DAILY_TABLE.match(name)
+        if match:
+            data_type, table_suffix, day = match.groups()
+            tables.append((name, data_type, table_suffix, datetime.strptime(day, "%Y%m%d").date()))
+    return tables
+
+
+def import_table(cursor, name, data_type, table_suffix, trade_date, replace):
+    cursor.execute(f"SELECT DISTINCT instrument_key FROM {name}")
+    keys = [row[0] for row in cursor.fetchall()]
+    if not keys:
+        cursor.execute("SELECT instrument_key FROM table_registry WHERE table_name = ?", (name,))
+        keys = [row[0] for row in cursor.fetchall()]
+    if len(keys) != 1:
+        raise ValueError(f"expected one instrument, found {len(keys)}")
+    instrument_id = candle_store.ensure_instrument(cursor, keys[0], table_suffix, *instrument_fields(table_suffix))
+    family, minutes = candle_store.split_data_type(data_type)
+    table, columns = candle_store.STORE_TABLES[family]
+    cursor.execute(f'''
+        INSERT OR REPLACE INTO {table} (instrument_id, interval, ts, {', '.join(columns)})
+        SELECT ?, ?, timestamp, {', '.join(columns)} FROM {name}
+        ''', (instrument_id, minutes))
+    rows = cursor.rowcount
+    if replace:
+        # The pipeline named tables by the day they were written, which is not always the bars' day (replays)
+        cursor.execute(f"SELECT MIN(substr(timestamp, 1, 10)), MAX(substr(timestamp, 1, 10)) FROM {name}")
+        first_day, last_day = cursor.fetchone()
+        if first_day is not None:
+            trade_date, last_date = date.fromisoformat(first_day), date.fromisoformat(last_day)
+        else:
+            last_date = trade_date
+        cursor.execute(f"DROP TABLE {name}")
+        candle_store.create_daily_view(cursor, name, data_type, instrument_id, trade_date, last_date)
+    return rows
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.db):
+        print(f"Database not found: {args.db}")
+        return 1
+    conn = sqlite3.connect(args.db, timeout=30.0, isolation_level=None)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA busy_timeout = 10000")
+    tables = daily_tables(cursor)
+    print(f"{len(tables)} daily candle tables in {args.db}")
+    if args.dry_run:
+        for name, data_type, table_suffix, trade_date in tables:
+            print(f"  {name:<45} {data_type:<14} {table_suffix:<14} {trade_date}")
+        return 0
+
+    candle_store.create_schema(cursor)
+    started = time.perf_counter()
+    imported = failed = total_rows = 0
+    for name, data_type, table_suffix, trade_date in tables:
+        try:
+            # One transaction per table: a failure leaves that table as it was
+            cursor.execute("BEGIN IMMEDIATE")
+            rows = import_table(cursor, name, data_type, table_suffix, trade_date, args.replace)
+            cursor.execute("COMMIT")
+        except Exception as e:
+            cursor.execute("ROLLBACK")
+            failed += 1
+            print(f"  {name}: not imported ({e})")
+            continue
+        imported += 1
+        total_rows += rows
+    elapsed = time.perf_counter() - started
+    print(f"Imported {total_rows} rows from {imported} tables in {elapsed:.1f}s"
+          f"{' (replaced by views)' if args.replace else ''}, {failed} failed")
+    conn.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
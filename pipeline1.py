@@ -1,21 +1,28 @@
 import asyncio
+import bisect
+import copy
 import json
-import ssl
+import pickle
 import os
 import websockets
-import requests
 import csv
-from google.protobuf.json_format import MessageToDict
 import logging
 from datetime import datetime, timezone, timedelta, date, time as dt_time
 import sys
 import signal
+import heapq
+import operator
 from collections import deque
 import sqlite3
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import Optional, List, Tuple, Dict, Any
 import threading
+import multiprocessing
+from queue import Empty, Full, Queue
+from logging.handlers import QueueHandler, QueueListener
+import atexit
 from pathlib import Path
 try:
     from dotenv import load_dotenv
@@ -24,40 +31,128 @@ except ImportError:
     pass
 
 from zoneinfo import ZoneInfo  # For IST
+import numpy as np
 
 # === LOGGING SETUP (MOVED UP FOR EARLY IMPORT USAGE) ===
 BASE_DIR = Path(__file__).resolve().parent
 LOG_DIR = BASE_DIR / "logs"
 LOG_FILE = LOG_DIR / "upstox_v3_trading.log"
 
-def setup_logging():
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s"
+LOG_QUEUE_SIZE = 20000
+_IMMUTABLE_LOG_ARGS = (str, int, float, bool, type(None), datetime, date, dt_time)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread; never blocks the caller, drops (and counts) when full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s",
-        handlers=[
-            logging.FileHandler(LOG_FILE, encoding="utf-8"),
-            logging.StreamHandler(sys.stdout),
-        ],
-    )
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Formatting is left to the listener thread. Only snapshot what could
+        # change before it gets there: mutable %-args and live tracebacks.
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(arg, _IMMUTABLE_LOG_ARGS) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class CallSiteRateLimiter(logging.Filter):
+    """Per call site (file:line) token bucket plus optional 1-in-N sampling.
+
+    Keeps a hot loop from flooding the log: once a site runs out of tokens its
+    records are dropped, and the next record that gets through carries the
+    number suppressed in between. Only DEBUG and INFO are limited, so a burst of
+    warnings or errors is always logged in full.
+    """
+
+    def __init__(self, rate_per_sec: float = 10.0, burst: int = 200, site_limits: dict = None):
+        super().__init__()
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self.site_limits = site_limits or {}  # funcName -> {'RATE', 'BURST', 'SAMPLE_EVERY'}
+        self.sites = {}  # (pathname, lineno) -> [tokens, last_refill, suppressed, seen, rate, burst, sample_every]
+        self.suppressed_total = 0
+
+    def filter(self, record) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        state = self.sites.get(site)
+        if state is None:
+            limits = self.site_limits.get(record.funcName, {})
+            rate = float(limits.get('RATE', self.rate_per_sec))
+            burst = float(limits.get('BURST', self.burst))
+            state = self.sites[site] = [burst, now, 0, 0, rate, burst, int(limits.get('SAMPLE_EVERY', 1))]
+        state[3] += 1
+        if state[6] > 1 and state[3] % state[6]:
+            state[2] += 1
+            self.suppressed_total += 1
+            return False
+        tokens = min(state[5], state[0] + (now - state[1]) * state[4])
+        state[1] = now
+        if tokens < 1.0:
+            state[0] = tokens
+            state[2] += 1
+            self.suppressed_total += 1
+            return False
+        state[0] = tokens - 1.0
+        if state[2]:
+            record.msg = f"{record.msg} [+{state[2]} suppressed]"
+            state[2] = 0
+        return True
 
-    for handler in logging.getLogger().handlers:
-        if isinstance(handler, logging.StreamHandler):
-            handler.setStream(sys.stdout)
+def setup_logging():
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
+    stream_handler = logging.StreamHandler(sys.stdout)
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    # Callers only enqueue; file and stdout I/O happen on the listener thread
+    queue_handler = NonBlockingQueueHandler(Queue(maxsize=LOG_QUEUE_SIZE))
+    listener = QueueListener(queue_handler.queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(logging.INFO)
 
     logger = logging.getLogger("UpstoxTradingV3")
-    logger.info(f"Logging initialized at {LOG_FILE}")
-    return logger
+    logger.info("Logging initialized at %s", LOG_FILE)
+    return logger, queue_handler
 
-logger = setup_logging()
+# Handlers are installed by init_logging(), so importing the module (e.g. in a spawned worker) opens no log file
+logger = logging.getLogger("UpstoxTradingV3")
+LOG_QUEUE_HANDLER = None
+LOG_RATE_LIMITER = CallSiteRateLimiter()
+logger.addFilter(LOG_RATE_LIMITER)
 
 # Import the V3 protobuf
 import MarketDataFeedV3_pb2 as pb
+from feed_journal import FeedJournalWriter
+from v3_feed import (UPSTOX_V3_AUTH_URL, authorize_feed, connect_feed, create_v3_subscription_message, decode_frame,
+                     extract_feed_record, run_feed_shard)
+from indicators import IndicatorSet
+from flow_windows import CashFlowWindows
+import candle_store
 
 # Constants and Configurations
 CONFIG_PATH = 'config/config.json'
-UPSTOX_V3_AUTH_URL = "https://api.upstox.com/v3/feed/market-data-feed/authorize"
+PIPELINE_METRICS_FILE = LOG_DIR / "pipeline_metrics.json"
 TRADING_DB = os.getenv('TRADING_DB', 'database/upstox_v3_live_trading.db')
 
 def load_config():
@@ -67,8 +162,112 @@ def load_config():
     except FileNotFoundError:
         return {}
 
-config = load_config()
-ACCESS_TOKEN = config.get('ACCESS_TOKEN', '')
+def interval_label(minutes: int) -> str:
+    return f"{minutes}min"
+
+def interval_table_prefix(base: str, interval: str) -> str:
+    """Table family of an interval: candles, candles5, candles15, ..."""
+    minutes = int(interval[:-3])
+    return f"{base}{minutes if minutes > 1 else ''}"
+
+def load_timeframes(configured) -> List[int]:
+    timeframes = {1}
+    for minutes in configured:
+        minutes = int(minutes)
+        if minutes < 1 or 1440 % minutes:
+            logger.warning(f"Ignoring timeframe {minutes}min - it must divide the 1440-minute day")
+            continue
+        timeframes.add(minutes)
+    return sorted(timeframes)
+
+def configure(settings: dict):
+    """Set the configuration constants below from a config dict (see init_pipeline)"""
+    global config, ACCESS_TOKEN, FEED_AUTH_URL, FEED_SIMULATION, LOG_CONFIG, FEED_DECODE_MODE, CANDLE_ENGINE
+    global CASH_FLOW_ENGINE, CASH_FLOW_WINDOWS, CASH_FLOW_WINDOWS_ENABLED, CASH_FLOW_WINDOW_MINUTES
+    global CASH_FLOW_WINDOW_SECONDS, TIMEFRAMES, INDICATOR_CONFIG, TIMEFRAME_PARENTS, CANDLE_CLOSE
+    global CANDLE_CLOSE_ENABLED, CANDLE_CLOSE_GRACE_MS, CANDLE_REORDER_MS, CANDLE_LATE_TICKS, CANDLE_AMEND_MINUTES
+    global INGEST_CONFIG, INGEST_QUEUE_SIZE
+    global INGEST_OVERFLOW_POLICY, INGEST_BATCH_SIZE, INGEST_WORKERS, FEED_SHARDS, FEED_CAPTURE
+    global FEED_CAPTURE_ENABLED, FEED_CAPTURE_DIR, FEED_CAPTURE_COMPRESS, FEED_CAPTURE_ROTATE_MB, CANDLE_STORE
+    global DB_WRITER, DB_WRITER_MAX_BATCH_LATENCY_MS, CHECKPOINT, CHECKPOINT_ENABLED, CHECKPOINT_FILE
+    global CHECKPOINT_INTERVAL_S
+    config = settings
+    ACCESS_TOKEN = settings.get('ACCESS_TOKEN', '')
+    # Authorize endpoint override, e.g. synthetic_feed_server.py for load tests
+    FEED_AUTH_URL = settings.get('FEED_AUTH_URL', UPSTOX_V3_AUTH_URL)
+    # Simulation runs skip the daily token check and the market-hours gates
+    FEED_SIMULATION = bool(settings.get('FEED_SIMULATION', False))
+    # Log level and hot-path rate limits (per call site), e.g.
+    # {"LEVEL": "INFO", "RATE_PER_SEC": 10, "BURST": 200, "SITE_LIMITS": {"_process_heikin_ashi": {"SAMPLE_EVERY": 5}}}
+    LOG_CONFIG = settings.get('LOG_CONFIG', {})
+    logging.getLogger().setLevel(LOG_CONFIG.get('LEVEL', 'INFO'))
+    LOG_RATE_LIMITER.rate_per_sec = float(LOG_CONFIG.get('RATE_PER_SEC', 10))
+    LOG_RATE_LIMITER.burst = int(LOG_CONFIG.get('BURST', 200))
+    LOG_RATE_LIMITER.site_limits = LOG_CONFIG.get('SITE_LIMITS', {})
+    # Feed decode mode: "typed" reads fields straight off the protobuf objects,
+    # "dict" keeps the old MessageToDict path for comparison
+    FEED_DECODE_MODE = settings.get('FEED_DECODE_MODE', 'typed')
+    # Candle engine: "object" updates one LockFreeTickProcessor per tick, "columnar" keeps
+    # every instrument's 1min candle in NumPy columns and applies frames in batches
+    CANDLE_ENGINE = settings.get('CANDLE_ENGINE', 'object')
+    # Cash flow engine: "object" keeps last ltp/vtt in dicts and handles one option tick at a time,
+    # "columnar" maps options to array slots and applies a frame's option ticks in one vectorised step
+    CASH_FLOW_ENGINE = settings.get('CASH_FLOW_ENGINE', 'object')
+    # Rolling cash flow windows (flow_windows.py), sizes in minutes and seconds
+    CASH_FLOW_WINDOWS = settings.get('CASH_FLOW_WINDOWS', {})
+    CASH_FLOW_WINDOWS_ENABLED = bool(CASH_FLOW_WINDOWS.get('ENABLED', True))
+    CASH_FLOW_WINDOW_MINUTES = CASH_FLOW_WINDOWS.get('MINUTES', [5, 15, 30])
+    CASH_FLOW_WINDOW_SECONDS = CASH_FLOW_WINDOWS.get('SECONDS', [10, 30, 60])
+    # Candle timeframe ladder in minutes, e.g. [1, 3, 5, 15, 30, 60]. 1min bars come from ticks;
+    # each higher timeframe is rolled up from closed bars of the largest lower timeframe dividing it
+    TIMEFRAMES = load_timeframes(settings.get('TIMEFRAMES', [1, 5]))
+    # Streaming indicators on the Heikin Ashi bars of instruments with process_indicators, e.g.
+    # {"MACD": [12, 26, 9], "RSI": 14, "ATR": 14, "SUPERTREND": [10, 3]} (see indicators.py)
+    INDICATOR_CONFIG = settings.get('INDICATORS', {})
+    TIMEFRAME_PARENTS = {minutes: max(lower for lower in TIMEFRAMES if lower < minutes and minutes % lower == 0)
+                         for minutes in TIMEFRAMES if minutes > 1}
+    # Close every open bar GRACE_MS after its minute boundary even when the instrument has no
+    # further tick; ticks that arrive for a bar already closed after that go to LATE_TICKS below
+    CANDLE_CLOSE = settings.get('CANDLE_CLOSE', {})
+    CANDLE_CLOSE_ENABLED = bool(CANDLE_CLOSE.get('ENABLED', True))
+    CANDLE_CLOSE_GRACE_MS = int(CANDLE_CLOSE.get('GRACE_MS', 2000))
+    # Ticks are held for REORDER_MS of feed time and applied in (ltt, vtt) order, so jitter within the
+    # window never reaches the bars; keep it well below GRACE_MS
+    CANDLE_REORDER_MS = int(CANDLE_CLOSE.get('REORDER_MS', 250))
+    # Ticks arriving after the window: "amend" re-sequences them into the bars of the last AMEND_MINUTES
+    # closed minutes (or the open one) and re-finalizes every row derived from those bars, "count" only counts them
+    CANDLE_LATE_TICKS = CANDLE_CLOSE.get('LATE_TICKS', 'amend')
+    CANDLE_AMEND_MINUTES = int(CANDLE_CLOSE.get('AMEND_MINUTES', 2))
+    # Ingest queue between the WebSocket reader and tick processing
+    INGEST_CONFIG = settings.get('INGEST_CONFIG', {})
+    INGEST_QUEUE_SIZE = int(INGEST_CONFIG.get('QUEUE_SIZE', 10000))
+    INGEST_OVERFLOW_POLICY = INGEST_CONFIG.get('OVERFLOW_POLICY', 'block')  # block | drop_oldest | drop_newest
+    INGEST_BATCH_SIZE = int(INGEST_CONFIG.get('BATCH_SIZE', 64))
+    INGEST_WORKERS = max(1, int(INGEST_CONFIG.get('WORKERS', 1)))
+    # Number of WebSocket connections (one worker process each) the instrument universe is split across
+    FEED_SHARDS = max(1, int(settings.get('FEED_SHARDS', 1)))
+    # Optional raw frame capture to an append-only journal (see feed_journal.py)
+    FEED_CAPTURE = settings.get('FEED_CAPTURE', {})
+    FEED_CAPTURE_ENABLED = bool(FEED_CAPTURE.get('ENABLED', False))
+    FEED_CAPTURE_DIR = BASE_DIR / FEED_CAPTURE.get('DIR', 'feed_journal')
+    FEED_CAPTURE_COMPRESS = bool(FEED_CAPTURE.get('COMPRESS', True))
+    FEED_CAPTURE_ROTATE_MB = int(FEED_CAPTURE.get('ROTATE_MB', 256))
+    # Candle storage: "daily" creates candles/heikin_ashi tables per instrument, interval and day;
+    # "bars" writes them all to the bars/ha_bars tables keyed by (instrument_id, interval, ts) and
+    # creates views under the daily table names (see candle_store.py, migrate_to_bars.py)
+    CANDLE_STORE = settings.get('CANDLE_STORE', 'daily')
+    # Database writer thread: woken when a row is queued, it waits up to MAX_BATCH_LATENCY_MS for more
+    # and then writes everything queued (candles, HA, trend, latest candles, cash flow, signals) in one transaction
+    DB_WRITER = settings.get('DB_WRITER', {})
+    DB_WRITER_MAX_BATCH_LATENCY_MS = float(DB_WRITER.get('MAX_BATCH_LATENCY_MS', 50))
+    # Periodic snapshot of processor/calculator/tracker state so a restart resumes the session
+    CHECKPOINT = settings.get('CHECKPOINT', {})
+    CHECKPOINT_ENABLED = bool(CHECKPOINT.get('ENABLED', True))
+    CHECKPOINT_FILE = BASE_DIR / CHECKPOINT.get('PATH', 'state/pipeline_checkpoint.pkl')
+    CHECKPOINT_INTERVAL_S = float(CHECKPOINT.get('INTERVAL_S', 5))
+
+# Defaults until init_pipeline() reads the config file
+configure({})
 
 # === AUTO OPTION SELECTION ===
 def auto_select_options(csv_path):
@@ -248,10 +447,113 @@ def load_dynamic_instruments():
     logger.info(f"Loaded {len(instruments)} total instruments: Index=1, Future=1, Options={len(selected_options)}")
     return instruments
 
-# Instruments setup (Dynamic from CSV)
-INSTRUMENTS = load_dynamic_instruments()
+# === INSTRUMENT REGISTRY ===
+@dataclass(frozen=True)
+class InstrumentInfo:
+    id: int
+    name: str
+    key: str
+    type: str
+    table_suffix: str
+    symbol: str
+    display_name: str
+    is_index: bool
+    is_future: bool
+    is_option: bool
+    option_type: Optional[str]
+    strike_price: Optional[float]
+    config: dict
+
+class InstrumentRegistry:
+    """O(1) instrument lookups by key or dense integer id, built once from the instrument config"""
+
+    def __init__(self, instruments: Dict[str, dict]):
+        self._by_key: Dict[str, InstrumentInfo] = {}
+        self._by_name: Dict[str, InstrumentInfo] = {}
+        self._by_id: List[InstrumentInfo] = []
+        for name, cfg in instruments.items():
+            key = cfg["key"]
+            if key in self._by_key:
+                logger.warning(f"Duplicate instrument key {key} for {name} - keeping {self._by_key[key].name}")
+                continue
+            instrument_type = cfg["type"]
+            symbol = key.split('|')[1] if '|' in key else key
+            display_name = symbol
+            if instrument_type == "OPTION":
+                display_name = f"{symbol} {cfg.get('option_type', '')} {cfg.get('strike_price', 0)}"
+            info = InstrumentInfo(
+                id=len(self._by_id),
+                name=name,
+                key=key,
+                type=instrument_type,
+                table_suffix=cfg.get("table_suffix", "unknown"),
+                symbol=symbol,
+                display_name=display_name,
+                is_index=instrument_type == "INDEX",
+                is_future=instrument_type == "FUTURE",
+                is_option=instrument_type == "OPTION",
+                option_type=cfg.get("option_type"),
+                strike_price=cfg.get("strike_price"),
+                config=cfg
+            )
+            self._by_key[key] = info
+            self._by_name[name] = info
+            self._by_id.append(info)
+        self.index_key = self._by_name["NIFTY_INDEX"].key if "NIFTY_INDEX" in self._by_name else None
+        self.future_key = self._by_name["NIFTY_FUTURE"].key if "NIFTY_FUTURE" in self._by_name else None
+        self.option_keys = frozenset(info.key for info in self._by_id if info.is_option)
+
+    def get(self, instrument_key: str) -> Optional[InstrumentInfo]:
+        return self._by_key.get(instrument_key)
+
+    def __getitem__(self, instrument_key: str) -> InstrumentInfo:
+        return self._by_key[instrument_key]
+
+    def by_id(self, instrument_id: int) -> InstrumentInfo:
+        return self._by_id[instrument_id]
 
-INSTRUMENT_KEYS = [cfg["key"] for cfg in INSTRUMENTS.values()]
+    def by_name(self, name: str) -> Optional[InstrumentInfo]:
+        return self._by_name.get(name)
+
+    def id_of(self, instrument_key: str) -> int:
+        info = self._by_key.get(instrument_key)
+        return info.id if info else -1
+
+    def keys(self) -> List[str]:
+        return [info.key for info in self._by_id]
+
+    def __contains__(self, instrument_key: str) -> bool:
+        return instrument_key in self._by_key
+
+    def __iter__(self):
+        return iter(self._by_id)
+
+    def __len__(self):
+        return len(self._by_id)
+
+# Instruments setup (Dynamic from CSV), loaded by init_pipeline()
+INSTRUMENTS: Dict[str, dict] = {}
+REGISTRY = InstrumentRegistry(INSTRUMENTS)
+INSTRUMENT_KEYS: List[str] = []
+
+def load_instruments(instruments: Dict[str, dict]):
+    """Set the instrument universe (INSTRUMENTS, REGISTRY, INSTRUMENT_KEYS)"""
+    global INSTRUMENTS, REGISTRY, INSTRUMENT_KEYS
+    INSTRUMENTS = instruments
+    REGISTRY = InstrumentRegistry(instruments)
+    INSTRUMENT_KEYS = REGISTRY.keys()
+
+def init_pipeline():
+    """Set up logging, read the config and load the instruments: everything the module used to do on import.
+
+    Called by the entry points (main, replay_feed.py, benchmark_pipeline.py) so importing the
+    module, as spawned feed shard workers do, has no side effects.
+    """
+    global logger, LOG_QUEUE_HANDLER
+    if LOG_QUEUE_HANDLER is None:
+        logger, LOG_QUEUE_HANDLER = setup_logging()
+    configure(load_config())
+    load_instruments(load_dynamic_instruments())
 
 # Technical Indicator Settings
 SAR_START = 0.4
@@ -265,13 +567,84 @@ MARKET_END_TIME = dt_time(15, 30)  # 3:30 PM IST
 TRADING_START_TIME = dt_time(10, 0)  # 10:00 AM IST - Buy recommendations start
 NO_NEW_TRADES_TIME = dt_time(15, 0)  # 3:00 PM IST - No new trade recommendations
 
+# Integer time buckets for the tick path. IST has no DST, so IST wall time is
+# epoch + 5:30 and a "minute id" is the IST minute count since the epoch.
+IST_OFFSET_MS = 330 * 60_000
+MINUTE_MS = 60_000
+DAY_MS = 1440 * MINUTE_MS
+MARKET_START_MS_OF_DAY = (MARKET_START_TIME.hour * 60 + MARKET_START_TIME.minute) * MINUTE_MS
+MARKET_END_MS_OF_DAY = (MARKET_END_TIME.hour * 60 + MARKET_END_TIME.minute) * MINUTE_MS
+
+def ist_ms_of_day(epoch_ms: int) -> int:
+    return (epoch_ms + IST_OFFSET_MS) % DAY_MS
+
+def ist_minute_id(epoch_ms: int) -> int:
+    return (epoch_ms + IST_OFFSET_MS) // MINUTE_MS
+
+def candle_minute_id(epoch_ms: int) -> int:
+    """Minute a tick belongs to; a tick stamped exactly hh:mm:00 still closes the previous minute"""
+    return (epoch_ms + IST_OFFSET_MS - 1000) // MINUTE_MS
+
+def candle_minute_start_ms(minute_id: int) -> int:
+    """Earliest trade time (epoch ms) that candle_minute_id() puts in ``minute_id``"""
+    return minute_id * MINUTE_MS - IST_OFFSET_MS + 1000
+
+@lru_cache(maxsize=2048)
+def minute_datetime(minute_id: int) -> datetime:
+    """IST datetime of a minute id, only needed when a candle is finalised or persisted"""
+    return datetime.fromtimestamp((minute_id * MINUTE_MS - IST_OFFSET_MS) / 1000, IST)
+
+# === CLOCK ===
+class WallClock:
+    def now(self) -> datetime:
+        return datetime.now(IST)
+
+    def epoch_ms(self) -> int:
+        return time.time_ns() // 1_000_000
+
+class ReplayClock:
+    """Clock driven by recorded frame times so replays are deterministic"""
+
+    def __init__(self, start: datetime = None):
+        self._now = start or datetime.now(IST)
+        self._epoch_ms = int(self._now.timestamp() * 1000)
+
+    def set_epoch_ns(self, epoch_ns: int):
+        self._epoch_ms = epoch_ns // 1_000_000
+        self._now = datetime.fromtimestamp(epoch_ns / 1e9, IST)
+
+    def now(self) -> datetime:
+        return self._now
+
+    def epoch_ms(self) -> int:
+        return self._epoch_ms
+
+CLOCK = WallClock()
+
+def set_clock(clock):
+    global CLOCK
+    CLOCK = clock
+
+def now_ist() -> datetime:
+    """Current IST time from the active clock (wall clock live, recorded time in replay)"""
+    return CLOCK.now()
+
+def now_epoch_ms() -> int:
+    return CLOCK.epoch_ms()
+
+def request_shutdown():
+    """Stop the live run (market close); a no-op when there is no live run"""
+    if shutdown_event is not None:
+        shutdown_event.set()
+
 # Global variables
-shutdown_event = None
+shutdown_event = None  # asyncio.Event of the live run; None in replays and benchmarks
 db_manager = None
 processors = {}
 cash_flow_calculator = None  # Global cash flow calculator for 60 options
 buy_signal_generator = None  # Global buy signal generator
 option_tracker = None  # Global option tracker for specific P&L logic
+feed_journal = None  # Raw frame capture, only set when FEED_CAPTURE is enabled
 
 # === SQLite datetime adapters ===
 def adapt_datetime_iso(val):
@@ -284,11 +657,11 @@ sqlite3.register_adapter(datetime, adapt_datetime_iso)
 sqlite3.register_converter("timestamp", convert_datetime)
 
 # === DATA STRUCTURES ===
-@dataclass
+@dataclass(slots=True)
 class LiveTick:
     instrument_key: str
     instrument_type: str
-    timestamp: datetime
+    ltt_ms: int  # exchange time, epoch milliseconds
     ltp: float
     atp: Optional[float] = None
     vtt: Optional[float] = None
@@ -306,7 +679,11 @@ class LiveTick:
     rho: Optional[float] = None
     iv: Optional[float] = None
 
-@dataclass
+    @property
+    def timestamp(self) -> datetime:
+        return ist_from_epoch_ms(self.ltt_ms)
+
+@dataclass(slots=True)
 class LiveCandle:
     instrument_key: str
     timestamp: datetime
@@ -325,7 +702,7 @@ class LiveCandle:
     vtt_open: float = 0.0
     vtt_close: float = 0.0
 
-@dataclass
+@dataclass(slots=True)
 class HeikinAshiCandle:
     instrument_key: str
     timestamp: datetime
@@ -339,6 +716,44 @@ class HeikinAshiCandle:
     macd: Optional[float] = None
     macd_signal: Optional[float] = None
 
+class TickPool:
+    """Free list of LiveTick objects recycled across frames instead of allocating one per tick.
+
+    Only the fields the feed extraction fills are reset on reuse; the rest
+    (bid/ask/greeks) are never written on the live path and stay None.
+    Ticks must not be kept once released - consumers copy the scalars they need.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self._free: List[LiveTick] = []
+        self.max_size = max_size
+        self.allocated = 0
+
+    def acquire(self, instrument_key: str, instrument_type: str, ltt_ms: int, ltp: float,
+                atp: Optional[float] = None, vtt: Optional[float] = None, volume: Optional[int] = None,
+                prev_close: Optional[float] = None) -> LiveTick:
+        if self._free:
+            tick = self._free.pop()
+            tick.instrument_key = instrument_key
+            tick.instrument_type = instrument_type
+            tick.ltt_ms = ltt_ms
+            tick.ltp = ltp
+            tick.atp = atp
+            tick.vtt = vtt
+            tick.volume = volume
+            tick.prev_close = prev_close
+            return tick
+        self.allocated += 1
+        return LiveTick(instrument_key=instrument_key, instrument_type=instrument_type, ltt_ms=ltt_ms,
+                        ltp=ltp, atp=atp, vtt=vtt, volume=volume, prev_close=prev_close)
+
+    def release(self, ticks: List[LiveTick]):
+        free = self._free
+        if len(free) < self.max_size:
+            free.extend(ticks)
+
+TICK_POOL = TickPool()
+
 # === ENHANCED LOCK-FREE DATABASE MANAGER WITH TREND TABLE ===
 class LockFreeDatabaseManager:
     def __init__(self):
@@ -349,7 +764,21 @@ class LockFreeDatabaseManager:
         self.ha_queue = deque()
         self.trend_queue = deque()  # NEW: Trend data queue
         self.latest_candle_queue = deque()  # NEW: Latest candles queue
+        # Cash flow rows, new buy signals and closed positions; written by the same thread as the candles
+        self.cash_flow_queue = deque()
+        self.signal_queue = deque()
+        self.tracking_queue = deque()
         self._queue_lock = threading.Lock()
+        # The writer sleeps on _work_ready until a row is queued, then takes every queue whole
+        self._work_ready = threading.Condition(self._queue_lock)
+        self._has_work = False
+        self.max_batch_latency_s = DB_WRITER_MAX_BATCH_LATENCY_MS / 1000.0
+        self.group_commits = 0
+        # CANDLE_STORE = "bars": instrument key -> instrument_id, and the daily views created so far
+        self._store_instrument_ids = {}
+        self._store_views = set()
+        # buy_signals ids are allocated here so a signal has its id before the row is written
+        self._next_signal_id = None
         # Single database connection for exclusive access
         self.db_conn = None
         self.cursor = None
@@ -494,7 +923,14 @@ class LockFreeDatabaseManager:
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_cash_flow_timestamp ON options_cash_flow(timestamp)')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_latest_candles_instrument ON latest_candles(instrument_key)')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_latest_candles_updated ON latest_candles(updated_at)')
+                if CANDLE_STORE == 'bars':
+                    candle_store.create_schema(cursor)
                 conn.commit()
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM buy_signals")
+                last_signal_id = cursor.fetchone()[0]
+                cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'buy_signals'")
+                last_signal_id = max(last_signal_id, cursor.fetchone()[0])
+                self._next_signal_id = last_signal_id + 1
                 conn.close()
                 logger.info("Database initialized with all required tables")
                 break
@@ -510,59 +946,55 @@ class LockFreeDatabaseManager:
                 logger.critical(f"Failed to initialize database: {e}")
                 raise
 
+    def _open_writer_connection(self):
+        self.db_conn = sqlite3.connect(
+            self.live_db_path,
+            timeout=60.0,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False
+        )
+        self.db_conn.execute("PRAGMA journal_mode = WAL")
+        self.db_conn.execute("PRAGMA synchronous = NORMAL")
+        self.db_conn.execute("PRAGMA locking_mode = NORMAL")
+        self.db_conn.execute("PRAGMA cache_size = 10000")
+        self.db_conn.execute("PRAGMA temp_store = MEMORY")
+        self.db_conn.execute("PRAGMA busy_timeout = 10000")  # Increased for better handling
+        self.cursor = self.db_conn.cursor()
+        if CANDLE_STORE == 'bars':
+            self._store_instrument_ids = candle_store.load_instrument_ids(self.cursor)
+
     def _single_thread_db_writer(self):
         try:
-            self.db_conn = sqlite3.connect(
-                self.live_db_path,
-                timeout=60.0,
-                detect_types=sqlite3.PARSE_DECLTYPES,
-                check_same_thread=False
-            )
-            self.db_conn.execute("PRAGMA journal_mode = WAL")
-            self.db_conn.execute("PRAGMA synchronous = NORMAL")
-            self.db_conn.execute("PRAGMA locking_mode = NORMAL")
-            self.db_conn.execute("PRAGMA cache_size = 10000")
-            self.db_conn.execute("PRAGMA temp_store = MEMORY")
-            self.db_conn.execute("PRAGMA busy_timeout = 10000")  # Increased for better handling
-            self.cursor = self.db_conn.cursor()
+            self._open_writer_connection()
             logger.info("Single-threaded database writer started")
-            while self.running:
+            while True:
+                with self._work_ready:
+                    while not self._has_work and self.running:
+                        self._work_ready.wait()
+                    if not self._has_work:
+                        break  # Shut down with nothing left to write
+                if self.running and self.max_batch_latency_s > 0:
+                    # Rows queued within the latency budget join this transaction
+                    time.sleep(self.max_batch_latency_s)
+                with self._queue_lock:
+                    candle_batch, self.candle_queue = self.candle_queue, deque()
+                    ha_batch, self.ha_queue = self.ha_queue, deque()
+                    trend_batch, self.trend_queue = self.trend_queue, deque()
+                    latest_candle_batch, self.latest_candle_queue = self.latest_candle_queue, deque()
+                    cash_flow_batch, self.cash_flow_queue = self.cash_flow_queue, deque()
+                    signal_batch, self.signal_queue = self.signal_queue, deque()
+                    tracking_batch, self.tracking_queue = self.tracking_queue, deque()
+                    self._has_work = False
                 try:
-                    processed_items = 0
-                    candle_batch = []
-                    with self._queue_lock:
-                        for _ in range(min(1000, len(self.candle_queue))):
-                            if self.candle_queue:
-                                candle_batch.append(self.candle_queue.popleft())
-                    if candle_batch:
-                        self._write_candle_batch(candle_batch)
-                        processed_items += len(candle_batch)
-                    ha_batch = []
-                    with self._queue_lock:
-                        for _ in range(min(1000, len(self.ha_queue))):
-                            if self.ha_queue:
-                                ha_batch.append(self.ha_queue.popleft())
-                    if ha_batch:
-                        self._write_ha_batch(ha_batch)
-                        processed_items += len(ha_batch)
-                    trend_batch = []
-                    with self._queue_lock:
-                        for _ in range(min(1000, len(self.trend_queue))):
-                            if self.trend_queue:
-                                trend_batch.append(self.trend_queue.popleft())
-                    if trend_batch:
-                        self._write_trend_batch(trend_batch)
-                        processed_items += len(trend_batch)
-                    latest_candle_batch = []
-                    with self._queue_lock:
-                        for _ in range(min(1000, len(self.latest_candle_queue))):
-                            if self.latest_candle_queue:
-                                latest_candle_batch.append(self.latest_candle_queue.popleft())
-                    if latest_candle_batch:
-                        self._write_latest_candle_batch(latest_candle_batch)
-                        processed_items += len(latest_candle_batch)
-                    if processed_items == 0:
-                        time.sleep(0.001)
+                    # Signals before tracking: a closed position updates the signal row it refers to
+                    self._write_group([
+                        ('candle', self._insert_candle_rows, (candle_batch,)),
+                        ('Heikin Ashi', self._insert_ha_rows, (ha_batch,)),
+                        ('trend', self._insert_trend_rows, (trend_batch,)),
+                        ('latest candle', self._insert_latest_candle_rows, (latest_candle_batch,)),
+                        ('cash flow/signal/tracking', self._insert_trading_rows,
+                         (cash_flow_batch, signal_batch, tracking_batch))
+                    ])
                 except Exception as e:
                     logger.error(f"Error in database writer: {e}")
                     time.sleep(0.01)
@@ -575,190 +1007,285 @@ class LockFreeDatabaseManager:
                 except:
                     pass
 
-    def _write_candle_batch(self, batch):
-        if not batch:
+    def _write_group(self, parts):
+        """Write every queue's rows in one transaction (one commit per wakeup).
+
+        ``parts`` are (label, insert, batches). If the transaction fails, each part is
+        retried in its own so one bad row doesn't lose the other queues' rows.
+        """
+        parts = [part for part in parts if any(part[2])]
+        if not parts:
             return
         try:
-            table_batches = {}
-            for candle, interval in batch:
-                data_type = f"candles{'5' if interval == '5min' else ''}"
-                table_name = self._get_table_name(candle.instrument_key, data_type)
-                if table_name not in table_batches:
-                    table_batches[table_name] = []
-                table_batches[table_name].append((candle, interval))
             self.cursor.execute("BEGIN IMMEDIATE")
-            for table_name, candles in table_batches.items():
-                self._create_candle_table_sync(table_name, candles[0][0].instrument_key, candles[0][1])
-                insert_data = []
-                for candle, _ in candles:
-                    insert_data.append((
-                        candle.instrument_key, candle.timestamp, candle.open, candle.high,
-                        candle.low, candle.close, candle.volume, candle.atp,
-                        candle.delta, candle.min_delta, candle.max_delta,
-                        candle.buy_volume, candle.sell_volume, candle.tick_count,
-                        candle.vtt_open, candle.vtt_close
-                    ))
-                self.cursor.executemany(
-                    f'''
-                    INSERT OR REPLACE INTO {table_name}
-                    (instrument_key, timestamp, open, high, low, close, volume, atp,
-                    delta, min_delta, max_delta, buy_volume, sell_volume, tick_count, vtt_open, vtt_close)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''',
-                    insert_data
-                )
+            for _, insert, batches in parts:
+                insert(*batches)
             self.db_conn.commit()
+            self.group_commits += 1
         except Exception as e:
-            logger.error(f"Error writing candle batch: {e}")
-            try:
-                self.db_conn.rollback()
-            except:
-                pass
+            self._rollback()
+            if len(parts) == 1:
+                logger.error(f"Error writing {parts[0][0]} batch: {e}")
+                return
+            logger.warning(f"Group commit of {len(parts)} queues failed ({e}), writing them one by one")
+            for label, insert, batches in parts:
+                self._write_in_transaction(label, insert, *batches)
 
-    def _write_ha_batch(self, batch):
-        if not batch:
-            return
+    def _write_in_transaction(self, label, insert, *batches):
         try:
-            table_batches = {}
-            for ha_candle, interval in batch:
-                data_type = f"heikin_ashi{'5' if interval == '5min' else ''}"
-                table_name = self._get_table_name(ha_candle.instrument_key, data_type)
-                if table_name not in table_batches:
-                    table_batches[table_name] = []
-                table_batches[table_name].append((ha_candle, interval))
             self.cursor.execute("BEGIN IMMEDIATE")
-            for table_name, ha_candles in table_batches.items():
-                self._create_heikin_ashi_table_sync(table_name, ha_candles[0][0].instrument_key, ha_candles[0][1])
-                insert_data = []
-                for ha_candle, _ in ha_candles:
-                    insert_data.append((
-                        ha_candle.instrument_key, ha_candle.timestamp,
-                        ha_candle.ha_open, ha_candle.ha_high, ha_candle.ha_low, ha_candle.ha_close,
-                        ha_candle.volume, ha_candle.hlc3,
-                        ha_candle.sar_trend, ha_candle.macd, ha_candle.macd_signal
-                    ))
-                self.cursor.executemany(f'''
-                    INSERT OR REPLACE INTO {table_name}
-                    (instrument_key, timestamp, ha_open, ha_high, ha_low, ha_close,
-                    volume, hlc3, sar_trend, macd, macd_signal)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', insert_data)
+            insert(*batches)
             self.db_conn.commit()
         except Exception as e:
-            logger.error(f"Error writing HA batch: {e}")
+            logger.error(f"Error writing {label} batch: {e}")
+            self._rollback()
+
+    def _rollback(self):
+        try:
+            self.db_conn.rollback()
+        except:
+            pass
+        if CANDLE_STORE == 'bars':
+            # Instruments and views added in the rolled back transaction are gone again
+            self._store_views.clear()
             try:
-                self.db_conn.rollback()
-            except:
-                pass
+                self._store_instrument_ids = candle_store.load_instrument_ids(self.cursor)
+            except Exception:
+                self._store_instrument_ids = {}
+
+    def _write_candle_batch(self, batch):
+        self._write_in_transaction('candle', self._insert_candle_rows, batch)
+
+    def _write_ha_batch(self, batch):
+        self._write_in_transaction('Heikin Ashi', self._insert_ha_rows, batch)
 
     def _write_trend_batch(self, batch):
+        self._write_in_transaction('trend', self._insert_trend_rows, batch)
+
+    def _write_latest_candle_batch(self, batch):
+        self._write_in_transaction('latest candle', self._insert_latest_candle_rows, batch)
+
+    def _insert_candle_rows(self, batch):
         if not batch:
             return
-        try:
-            self.cursor.execute("BEGIN IMMEDIATE")
+        if CANDLE_STORE == 'bars':
+            self._insert_store_rows('candles', batch)
+            return
+        table_batches = {}
+        for candle, interval in batch:
+            data_type = interval_table_prefix("candles", interval)
+            table_name = self._get_table_name(candle.instrument_key, data_type)
+            if table_name not in table_batches:
+                table_batches[table_name] = []
+            table_batches[table_name].append((candle, interval))
+        for table_name, candles in table_batches.items():
+            self._create_candle_table_sync(table_name, candles[0][0].instrument_key, candles[0][1])
             insert_data = []
-            for trend_data in batch:
+            for candle, _ in candles:
                 insert_data.append((
-                    trend_data['timestamp'],
-                    trend_data['candle_interval'],
-                    trend_data['trend_value'],
-                    trend_data.get('buy_recommendation'),
-                    trend_data.get('entry_price'),
-                    trend_data.get('target'),
-                    trend_data.get('sl'),
-                    trend_data.get('profit_loss')
+                    candle.instrument_key, candle.timestamp, candle.open, candle.high,
+                    candle.low, candle.close, candle.volume, candle.atp,
+                    candle.delta, candle.min_delta, candle.max_delta,
+                    candle.buy_volume, candle.sell_volume, candle.tick_count,
+                    candle.vtt_open, candle.vtt_close
                 ))
-            self.cursor.executemany('''
-                INSERT INTO trend
-                (timestamp, candle_interval, trend_value, buy_recommendation, entry_price, target, sl, profit_loss)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', insert_data)
-            self.db_conn.commit()
-        except Exception as e:
-            logger.error(f"Error writing trend batch: {e}")
-            try:
-                self.db_conn.rollback()
-            except:
-                pass
+            self.cursor.executemany(
+                f'''
+                INSERT OR REPLACE INTO {table_name}
+                (instrument_key, timestamp, open, high, low, close, volume, atp,
+                delta, min_delta, max_delta, buy_volume, sell_volume, tick_count, vtt_open, vtt_close)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''',
+                insert_data
+            )
 
-    def _write_latest_candle_batch(self, batch):
+    def _insert_ha_rows(self, batch):
         if not batch:
             return
-        try:
-            self.cursor.execute("BEGIN IMMEDIATE")
+        if CANDLE_STORE == 'bars':
+            self._insert_store_rows('heikin_ashi', batch)
+            return
+        table_batches = {}
+        for ha_candle, interval in batch:
+            data_type = interval_table_prefix("heikin_ashi", interval)
+            table_name = self._get_table_name(ha_candle.instrument_key, data_type)
+            if table_name not in table_batches:
+                table_batches[table_name] = []
+            table_batches[table_name].append((ha_candle, interval))
+        for table_name, ha_candles in table_batches.items():
+            self._create_heikin_ashi_table_sync(table_name, ha_candles[0][0].instrument_key, ha_candles[0][1])
             insert_data = []
-            for candle_data in batch:
+            for ha_candle, _ in ha_candles:
                 insert_data.append((
-                    candle_data['instrument_key'],
-                    candle_data['instrument_name'],
-                    candle_data['instrument_type'],
-                    candle_data.get('strike_price'),
-                    candle_data.get('option_type'),
-                    candle_data['timestamp'],
-                    candle_data['open'],
-                    candle_data['high'],
-                    candle_data['low'],
-                    candle_data['close'],
-                    candle_data['volume'],
-                    candle_data['atp'],
-                    candle_data.get('vwap', 0),
-                    candle_data.get('price_change', 0),
-                    candle_data.get('price_change_pct', 0),
-                    candle_data.get('delta', 0),
-                    candle_data.get('delta_pct', 0),
-                    candle_data.get('min_delta', 0),
-                    candle_data.get('max_delta', 0),
-                    candle_data.get('buy_volume', 0),
-                    candle_data.get('sell_volume', 0),
-                    candle_data.get('tick_count', 0),
-                    candle_data.get('vtt_open', 0),
-                    candle_data.get('vtt_close', 0),
-                    candle_data['candle_interval'],
-                    candle_data.get('trend_value', 0),
-                    candle_data.get('buy_recommendation'),
-                    candle_data.get('entry_price'),
-                    candle_data.get('target'),
-                    candle_data.get('sl'),
-                    candle_data.get('profit_loss'),
-                    candle_data.get('prev_close', 0),
-                    candle_data.get('intraday_high', 0),
-                    candle_data.get('intraday_low', 0),
-                    candle_data.get('last_updated')
+                    ha_candle.instrument_key, ha_candle.timestamp,
+                    ha_candle.ha_open, ha_candle.ha_high, ha_candle.ha_low, ha_candle.ha_close,
+                    ha_candle.volume, ha_candle.hlc3,
+                    ha_candle.sar_trend, ha_candle.macd, ha_candle.macd_signal
                 ))
-            self.cursor.executemany('''
-                INSERT OR REPLACE INTO latest_candles
-                (instrument_key, instrument_name, instrument_type, strike_price, option_type,
-                timestamp, open, high, low, close, volume, atp, vwap, price_change, price_change_pct,
-                delta, delta_pct, min_delta, max_delta, buy_volume, sell_volume, tick_count,
-                vtt_open, vtt_close, candle_interval, trend_value, buy_recommendation,
-                entry_price, target, sl, profit_loss, prev_close, intraday_high, intraday_low, last_updated)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            self.cursor.executemany(f'''
+                INSERT OR REPLACE INTO {table_name}
+                (instrument_key, timestamp, ha_open, ha_high, ha_low, ha_close,
+                volume, hlc3, sar_trend, macd, macd_signal)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', insert_data)
-            self.db_conn.commit()
-        except Exception as e:
-            logger.error(f"Error writing latest candle batch: {e}")
-            try:
-                self.db_conn.rollback()
-            except:
-                pass
+
+    def _insert_trend_rows(self, batch):
+        if not batch:
+            return
+        insert_data = []
+        amended = []
+        for trend_data in batch:
+            row = (
+                trend_data['timestamp'],
+                trend_data['candle_interval'],
+                trend_data['trend_value'],
+                trend_data.get('buy_recommendation'),
+                trend_data.get('entry_price'),
+                trend_data.get('target'),
+                trend_data.get('sl'),
+                trend_data.get('profit_loss')
+            )
+            (amended if trend_data.get('amend') else insert_data).append(row)
+        self.cursor.executemany('''
+            INSERT INTO trend
+            (timestamp, candle_interval, trend_value, buy_recommendation, entry_price, target, sl, profit_loss)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', insert_data)
+        # A bar amended by a late tick rewrites the trend row of its first evaluation
+        for row in amended:
+            self.cursor.execute('''
+                UPDATE trend SET trend_value = ?, buy_recommendation = ?, entry_price = ?, target = ?, sl = ?
+                WHERE timestamp = ? AND candle_interval = ?
+                ''', row[2:7] + row[:2])
+            if self.cursor.rowcount == 0:
+                self.cursor.execute('''
+                    INSERT INTO trend
+                    (timestamp, candle_interval, trend_value, buy_recommendation, entry_price, target, sl, profit_loss)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', row)
+
+    def _insert_trading_rows(self, cash_flow_batch, signal_batch, tracking_batch):
+        if cash_flow_batch:
+            self.cursor.executemany('''
+                INSERT INTO options_cash_flow (timestamp, interval_type, cash, min_cash, max_cash, total_options)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''', cash_flow_batch)
+        if signal_batch:
+            self.cursor.executemany('''
+                INSERT INTO buy_signals (id, timestamp, signal_type, option_key, strike, entry_price, target, sl, status, cash_flow)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', signal_batch)
+        if tracking_batch:
+            self.cursor.executemany('''
+                INSERT INTO option_tracking (signal_id, timestamp, current_price, pnl, status)
+                VALUES (?, ?, ?, ?, ?)
+                ''', [tracking for tracking, _ in tracking_batch])
+            self.cursor.executemany('''
+                UPDATE buy_signals SET status = ?, entry_price = ?, target = ?, sl = ? WHERE id = ?
+                ''', [signal_update for _, signal_update in tracking_batch])
+
+    def _insert_latest_candle_rows(self, batch):
+        if not batch:
+            return
+        insert_data = []
+        for candle_data in batch:
+            insert_data.append((
+                candle_data['instrument_key'],
+                candle_data['instrument_name'],
+                candle_data['instrument_type'],
+                candle_data.get('strike_price'),
+                candle_data.get('option_type'),
+                candle_data['timestamp'],
+                candle_data['open'],
+                candle_data['high'],
+                candle_data['low'],
+                candle_data['close'],
+                candle_data['volume'],
+                candle_data['atp'],
+                candle_data.get('vwap', 0),
+                candle_data.get('price_change', 0),
+                candle_data.get('price_change_pct', 0),
+                candle_data.get('delta', 0),
+                candle_data.get('delta_pct', 0),
+                candle_data.get('min_delta', 0),
+                candle_data.get('max_delta', 0),
+                candle_data.get('buy_volume', 0),
+                candle_data.get('sell_volume', 0),
+                candle_data.get('tick_count', 0),
+                candle_data.get('vtt_open', 0),
+                candle_data.get('vtt_close', 0),
+                candle_data['candle_interval'],
+                candle_data.get('trend_value', 0),
+                candle_data.get('buy_recommendation'),
+                candle_data.get('entry_price'),
+                candle_data.get('target'),
+                candle_data.get('sl'),
+                candle_data.get('profit_loss'),
+                candle_data.get('prev_close', 0),
+                candle_data.get('intraday_high', 0),
+                candle_data.get('intraday_low', 0),
+                candle_data.get('last_updated')
+            ))
+        self.cursor.executemany('''
+            INSERT OR REPLACE INTO latest_candles
+            (instrument_key, instrument_name, instrument_type, strike_price, option_type,
+            timestamp, open, high, low, close, volume, atp, vwap, price_change, price_change_pct,
+            delta, delta_pct, min_delta, max_delta, buy_volume, sell_volume, tick_count,
+            vtt_open, vtt_close, candle_interval, trend_value, buy_recommendation,
+            entry_price, target, sl, profit_loss, prev_close, intraday_high, intraday_low, last_updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', insert_data)
+
+    def _insert_store_rows(self, family: str, batch):
+        """(candle, interval) pairs of one family ('candles' or 'heikin_ashi') into bars / ha_bars"""
+        values = operator.attrgetter(*candle_store.STORE_TABLES[family][1])
+        insert_data = []
+        for candle, interval in batch:
+            instrument_id = self._store_instrument_id(candle.instrument_key)
+            trade_date = candle.timestamp.date()
+            if (family, interval, instrument_id, trade_date) not in self._store_views:
+                self._create_store_view(family, interval, candle.instrument_key, instrument_id, trade_date)
+            insert_data.append((instrument_id, int(interval[:-3]), candle.timestamp) + values(candle))
+        self.cursor.executemany(candle_store.insert_sql(family), insert_data)
+
+    def _store_instrument_id(self, instrument_key: str) -> int:
+        instrument_id = self._store_instrument_ids.get(instrument_key)
+        if instrument_id is None:
+            info = REGISTRY.get(instrument_key)
+            if info is not None:
+                instrument_id = candle_store.ensure_instrument(self.cursor, instrument_key, info.table_suffix, info.type,
+                                                               info.option_type, info.strike_price)
+            else:
+                instrument_id = candle_store.ensure_instrument(self.cursor, instrument_key, "unknown", "UNKNOWN")
+            self._store_instrument_ids[instrument_key] = instrument_id
+        return instrument_id
+
+    def _create_store_view(self, family: str, interval: str, instrument_key: str, instrument_id: int, trade_date: date):
+        """View under the daily table name, registered in table_registry like the daily tables"""
+        data_type = interval_table_prefix(family, interval)
+        view_name = self._get_table_name(instrument_key, data_type, trade_date)
+        candle_store.create_daily_view(self.cursor, view_name, data_type, instrument_id, trade_date)
+        self.cursor.execute('''
+            INSERT OR IGNORE INTO table_registry
+            (table_name, instrument_key, data_type, trade_date)
+            VALUES (?, ?, ?, ?)
+            ''', (view_name, instrument_key, data_type, trade_date))
+        self._store_views.add((family, interval, instrument_id, trade_date))
 
     def _get_table_name(self, instrument_key: str, data_type: str, trade_date: date = None) -> str:
         if trade_date is None:
-            trade_date = datetime.now(IST).date()  # Fixed: Use IST for date
-        instrument_suffix = "unknown"
-        for name, config in INSTRUMENTS.items():
-            if config["key"] == instrument_key:
-                instrument_suffix = config["table_suffix"]
-                break
+            trade_date = now_ist().date()  # Fixed: Use IST for date
+        info = REGISTRY.get(instrument_key)
+        instrument_suffix = info.table_suffix if info else "unknown"
         date_str = trade_date.strftime("%Y%m%d")
         return f"{data_type}_{instrument_suffix}_{date_str}"
 
     def _create_candle_table_sync(self, table_name: str, instrument_key: str, interval: str = "1min"):
         try:
-            instrument_config = next((config for config in INSTRUMENTS.values() if config["key"] == instrument_key), None)
-            is_index = instrument_config and instrument_config["type"] == "INDEX"
+            info = REGISTRY.get(instrument_key)
+            is_index = info is not None and info.is_index
             volume_default = " DEFAULT 0" if is_index else ""
-            data_type = f"candles{'5' if interval == '5min' else ''}"
+            data_type = interval_table_prefix("candles", interval)
             self.cursor.execute(f'''
                 CREATE TABLE IF NOT EXISTS {table_name} (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -787,16 +1314,16 @@ class LockFreeDatabaseManager:
                 INSERT OR IGNORE INTO table_registry
                 (table_name, instrument_key, data_type, trade_date)
                 VALUES (?, ?, ?, ?)
-                ''', (table_name, instrument_key, data_type, datetime.now(IST).date()))
+                ''', (table_name, instrument_key, data_type, now_ist().date()))
         except Exception as e:
             logger.error(f"Error creating candle table: {e}")
 
     def _create_heikin_ashi_table_sync(self, table_name: str, instrument_key: str, interval: str = "1min"):
         try:
-            instrument_config = next((config for config in INSTRUMENTS.values() if config["key"] == instrument_key), None)
-            is_index = instrument_config and instrument_config["type"] == "INDEX"
+            info = REGISTRY.get(instrument_key)
+            is_index = info is not None and info.is_index
             volume_default = " DEFAULT 0" if is_index else ""
-            data_type = f"heikin_ashi{'5' if interval == '5min' else ''}"
+            data_type = interval_table_prefix("heikin_ashi", interval)
             self.cursor.execute(f'''
                 CREATE TABLE IF NOT EXISTS {table_name} (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -820,14 +1347,21 @@ class LockFreeDatabaseManager:
                 INSERT OR IGNORE INTO table_registry
                 (table_name, instrument_key, data_type, trade_date)
                 VALUES (?, ?, ?, ?)
-                ''', (table_name, instrument_key, data_type, datetime.now(IST).date()))
+                ''', (table_name, instrument_key, data_type, now_ist().date()))
         except Exception as e:
             logger.error(f"Error creating Heikin Ashi table: {e}")
 
+    def _wake_writer(self):
+        """Called with _queue_lock held after queueing a row"""
+        if not self._has_work:
+            self._has_work = True
+            self._work_ready.notify()
+
     def save_candle_instant(self, candle: LiveCandle, interval: str = "1min"):
         try:
             with self._queue_lock:
                 self.candle_queue.append((candle, interval))
+                self._wake_writer()
         except Exception:
             pass
 
@@ -835,6 +1369,24 @@ class LockFreeDatabaseManager:
         try:
             with self._queue_lock:
                 self.ha_queue.append((ha_candle, interval))
+                self._wake_writer()
+        except Exception:
+            pass
+
+    def save_candles_instant(self, candles: List[LiveCandle], interval: str = "1min"):
+        """save_candle_instant for the bars closing together, under one lock"""
+        try:
+            with self._queue_lock:
+                self.candle_queue.extend([(candle, interval) for candle in candles])
+                self._wake_writer()
+        except Exception:
+            pass
+
+    def save_ha_candles_instant(self, ha_candles: List[HeikinAshiCandle], interval: str = "1min"):
+        try:
+            with self._queue_lock:
+                self.ha_queue.extend([(ha_candle, interval) for ha_candle in ha_candles])
+                self._wake_writer()
         except Exception:
             pass
 
@@ -842,6 +1394,7 @@ class LockFreeDatabaseManager:
         try:
             with self._queue_lock:
                 self.trend_queue.append(trend_data)
+                self._wake_writer()
         except Exception:
             pass
 
@@ -849,15 +1402,57 @@ class LockFreeDatabaseManager:
         try:
             with self._queue_lock:
                 self.latest_candle_queue.append(candle_data)
+                self._wake_writer()
         except Exception:
             pass
 
+    def save_cash_flow_instant(self, row: tuple):
+        """(timestamp, interval_type, cash, min_cash, max_cash, total_options) for options_cash_flow"""
+        with self._queue_lock:
+            self.cash_flow_queue.append(row)
+            self._wake_writer()
+
+    def save_signal_instant(self, signal_data: dict) -> int:
+        """Queue a buy_signals row and return the id it will be written with"""
+        with self._queue_lock:
+            signal_id = self._next_signal_id
+            self._next_signal_id += 1
+            self.signal_queue.append((signal_id, signal_data['timestamp'], signal_data['signal_type'],
+                                      signal_data['option_key'], signal_data['strike'], 0, 0, 0,
+                                      signal_data['status'], signal_data['cash_flow']))
+            self._wake_writer()
+        return signal_id
+
+    def next_signal_id(self) -> int:
+        with self._queue_lock:
+            return self._next_signal_id
+
+    def reserve_signal_ids(self, next_id: int):
+        """Never hand out a buy_signals id below ``next_id``: ids restored from a checkpoint may not be written yet"""
+        with self._queue_lock:
+            if next_id > self._next_signal_id:
+                self._next_signal_id = next_id
+
+    def save_tracking_instant(self, tracking_data: dict, position: dict):
+        """Queue a closed position: its option_tracking row and the final values of its buy_signals row"""
+        tracking = (tracking_data['signal_id'], tracking_data['timestamp'], tracking_data['current_price'],
+                    tracking_data['pnl'], tracking_data['status'])
+        signal_update = (tracking_data['status'], position['entry_price'], position['target'], position['trailing_sl'],
+                         position['signal_id'])
+        with self._queue_lock:
+            self.tracking_queue.append((tracking, signal_update))
+            self._wake_writer()
+
     def get_queue_sizes(self):
         with self._queue_lock:
-            return len(self.candle_queue), len(self.ha_queue), len(self.trend_queue), len(self.latest_candle_queue)
+            return (len(self.candle_queue), len(self.ha_queue), len(self.trend_queue), len(self.latest_candle_queue),
+                    len(self.cash_flow_queue) + len(self.signal_queue) + len(self.tracking_queue))
 
     def shutdown(self):
-        self.running = False
+        """Stop the writer once everything already queued is written"""
+        with self._queue_lock:
+            self.running = False
+            self._work_ready.notify()
         if self.db_thread.is_alive():
             self.db_thread.join(timeout=5)
 
@@ -905,124 +1500,295 @@ class FastSAR:
         except Exception:
             return self.sar or 0.0, self.trend
 
+    def state(self) -> dict:
+        return {'sar': self.sar, 'ep': self.ep, 'af': self.af, 'trend': self.trend}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'FastSAR':
+        sar = cls()
+        sar.sar, sar.ep, sar.af, sar.trend = state['sar'], state['ep'], state['af'], state['trend']
+        return sar
+
 
 
 # === V3 API FUNCTIONS ===
 def get_market_data_feed_authorize_v3():
-    try:
-        headers = {'Accept': 'application/json', 'Authorization': f'Bearer {ACCESS_TOKEN}'}
-        response = requests.get(UPSTOX_V3_AUTH_URL, headers=headers, timeout=10.0)
-        if response.status_code == 200:
-            logger.info("Retrieved V3 WebSocket URL successfully")
-            return response.json()
-        else:
-            logger.error(f"Failed to get V3 WebSocket URL: {response.status_code}")
-            return None
-    except Exception as e:
-        logger.error(f"Error getting V3 WebSocket URL: {e}")
-        return None
+    return authorize_feed(ACCESS_TOKEN, FEED_AUTH_URL)
+
+def decode_v3_message(data, mode: str = None):
+    """Decode a raw feed frame (see v3_feed.decode_frame), by default in FEED_DECODE_MODE"""
+    return decode_frame(data, mode or FEED_DECODE_MODE)
+
+def get_frame_feeds(decoded_data):
+    """Return the instrument_key -> feed mapping of a decoded frame (typed or dict)"""
+    if isinstance(decoded_data, pb.FeedResponse):
+        return decoded_data.feeds
+    if isinstance(decoded_data, dict):
+        return decoded_data.get('feeds') or {}
+    return {}
+
+def ist_from_epoch_ms(timestamp_ms: int) -> datetime:
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).astimezone(IST)
+
+def tick_from_record(record: tuple, instrument_type: str) -> LiveTick:
+    instrument_key, ltt_ms, ltp, atp, vtt, volume, prev_close = record
+    return TICK_POOL.acquire(instrument_key, instrument_type, ltt_ms, ltp, atp, vtt, volume, prev_close)
+
+def record_from_tick(tick: LiveTick) -> tuple:
+    return (tick.instrument_key, tick.ltt_ms, tick.ltp, tick.atp, tick.vtt, tick.volume, tick.prev_close)
+
+def tick_order(record: tuple) -> tuple:
+    """Sort key of a tick record within its instrument: trade time, then vtt (cumulative, so it breaks ties)"""
+    return (record[1], -1.0 if record[4] is None else record[4])
+
+def extract_feed_tick(instrument_key: str, instrument_type: str, feed) -> Optional[LiveTick]:
+    """Build a LiveTick straight from a typed ``pb.Feed``"""
+    record = extract_feed_record(instrument_key, feed)
+    return tick_from_record(record, instrument_type) if record else None
+
+# === TIMEFRAME LADDER ===
+@dataclass(slots=True)
+class ClosedBar:
+    """A closed bar kept so a late tick can amend it"""
+    start: int  # minute id
+    candle: LiveCandle
+    parts: list = field(default_factory=list)  # closed bars of the parent timeframe it was rolled up from
+    before: Optional[tuple] = None  # HA/SAR/indicator state before the bar (TimeframeState.snapshot)
+    ha: Optional[HeikinAshiCandle] = None
+
+def amend_candle(candle: LiveCandle, rebuilt: LiveCandle):
+    """Copy a rebuilt bar into the one already handed out (parent parts, pending rows keep referring to it)"""
+    for name in LiveCandle.__slots__:
+        setattr(candle, name, getattr(rebuilt, name))
+
+class TimeframeState:
+    """One instrument's bar, Heikin Ashi/SAR/indicator and trade state for one timeframe of the ladder.
+
+    1min bars come from ticks (the processor's current_candle); each higher
+    timeframe keeps an open bar that closed bars of its parent timeframe are
+    rolled into, O(1) per bar. The last few closed bars stay in ``history``
+    (with the bars they were built from) for LockFreeTickProcessor.amend_tick.
+    """
+
+    def __init__(self, minutes: int, process_indicators: bool):
+        self.minutes = minutes
+        self.interval = interval_label(minutes)
+        self.children: List['TimeframeState'] = []
+        # Open bar (higher timeframes only)
+        self.candle: Optional[LiveCandle] = None
+        self.start: Optional[int] = None  # minute id the open bar starts at
+        self.bars = 0
+        self.parts: List[LiveCandle] = []
+        self.atp_sum = 0.0
+        self.atp_volume = 0
+        # Closed bars covering the last CANDLE_AMEND_MINUTES minutes, oldest first
+        self.history: List[ClosedBar] = []
+        self.history_size = CANDLE_AMEND_MINUTES // minutes + 2 if CANDLE_LATE_TICKS == 'amend' else 0
+        # Indicators and trade state
+        self.previous_ha: Optional[HeikinAshiCandle] = None
+        self.sar = FastSAR() if process_indicators else None
+        self.indicators = IndicatorSet(INDICATOR_CONFIG) if process_indicators else None
+        self.active_trade = None
+        self.completed = 0
+
+    def open(self, instrument_key: str, start: int, ltp: float, atp: float):
+        self.start = start
+        self.bars = 0
+        self.parts = []
+        self.atp_sum = 0.0
+        self.atp_volume = 0
+        self.candle = LiveCandle(
+            instrument_key=instrument_key,
+            timestamp=minute_datetime(start),
+            open=ltp, high=ltp, low=ltp, close=ltp,
+            volume=0, atp=atp
+        )
 
-def create_v3_subscription_message(instrument_keys: List[str], mode: str = "full"):
-    try:
-        data = {
-            "guid": "upstox-v3-lockfree-system",
-            "method": "sub",
-            "data": {"mode": mode, "instrumentKeys": instrument_keys}
+    def add_bar(self, bar: LiveCandle):
+        candle = self.candle
+        self.bars += 1
+        self.parts.append(bar)
+        if self.bars == 1:
+            candle.open = bar.open
+            candle.min_delta = bar.min_delta
+            candle.max_delta = bar.max_delta
+            candle.vtt_open = bar.vtt_open
+        candle.close = bar.close
+        if bar.high > candle.high:
+            candle.high = bar.high
+        if bar.low < candle.low:
+            candle.low = bar.low
+        candle.volume += bar.volume
+        candle.delta += bar.delta
+        if bar.min_delta < candle.min_delta:
+            candle.min_delta = bar.min_delta
+        if bar.max_delta > candle.max_delta:
+            candle.max_delta = bar.max_delta
+        candle.buy_volume += bar.buy_volume
+        candle.sell_volume += bar.sell_volume
+        candle.tick_count += bar.tick_count
+        candle.vtt_close = bar.vtt_close
+        if bar.volume > 0:
+            self.atp_sum += bar.atp * bar.volume
+            self.atp_volume += bar.volume
+
+    def close_bar(self) -> LiveCandle:
+        candle = self.candle
+        candle.atp = self.atp_sum / self.atp_volume if self.atp_volume > 0 else candle.close
+        return candle
+
+    def reset(self):
+        self.candle = None
+        self.start = None
+        self.bars = 0
+        self.parts = []
+
+    def aggregate(self, instrument_key: str, start: int, parts: List[LiveCandle]) -> LiveCandle:
+        """A bar of this timeframe built again from its parts, as open()/add_bar()/close_bar() built it"""
+        scratch = TimeframeState(self.minutes, False)
+        scratch.open(instrument_key, start, parts[0].open, parts[0].atp)
+        for bar in parts:
+            scratch.add_bar(bar)
+        return scratch.close_bar()
+
+    def rebuild_open_bar(self):
+        """Re-add the open bar's parts after one of them was amended or inserted"""
+        parts = self.parts
+        atp = self.candle.atp
+        self.open(self.candle.instrument_key, self.start, parts[0].open, atp)
+        for bar in parts:
+            self.add_bar(bar)
+
+    def keep(self, start: int, candle: LiveCandle) -> Optional[ClosedBar]:
+        """File a bar that just closed (with the parts it was rolled up from) in history"""
+        if not self.history_size:
+            return None
+        entry = ClosedBar(start, candle, self.parts)
+        history = self.history
+        history.append(entry)
+        if len(history) > self.history_size:
+            del history[0]
+        return entry
+
+    def insert(self, entry: ClosedBar):
+        """File a bar that only exists since an amendment, in start order"""
+        bisect.insort(self.history, entry, key=operator.attrgetter('start'))
+        del self.history[:-self.history_size]
+
+    def closed_bar(self, start: int) -> Optional[ClosedBar]:
+        return next((entry for entry in self.history if entry.start == start), None)
+
+    def snapshot(self) -> tuple:
+        """HA/SAR/indicator state, to redo the HA chain from a bar later"""
+        return (self.previous_ha, self.sar.state() if self.sar else None,
+                self.indicators.state() if self.indicators else None)
+
+    def rewind(self, snapshot: tuple):
+        self.previous_ha, sar, indicators = snapshot
+        if sar is not None:
+            self.sar = FastSAR.from_state(sar)
+        if indicators is not None:
+            self.indicators = IndicatorSet.from_state(indicators)
+
+    def checkpoint(self) -> dict:
+        return {
+            'candle': copy.copy(self.candle), 'start': self.start, 'bars': self.bars,
+            'atp_sum': self.atp_sum, 'atp_volume': self.atp_volume,
+            'previous_ha': copy.copy(self.previous_ha),
+            'sar': self.sar.state() if self.sar else None,
+            'indicators': self.indicators.state() if self.indicators else None,
+            'active_trade': copy.deepcopy(self.active_trade), 'completed': self.completed
         }
-        return json.dumps(data).encode('utf-8')
-    except Exception as e:
-        logger.error(f"Error creating V3 subscription message: {e}")
-        return b""
 
-def decode_v3_message(data):
-    try:
-        if isinstance(data, bytes):
-            try:
-                response = pb.FeedResponse()
-                response.ParseFromString(data)
-                return MessageToDict(response)
-            except Exception as e:
-                logger.debug(f"Protobuf decode failed: {e}")
-                try:
-                    return json.loads(data.decode('utf-8'))
-                except Exception as e:
-                    logger.debug(f"JSON decode failed: {e}")
-                    pass
-        else:
-            try:
-                return json.loads(data)
-            except Exception as e:
-                logger.debug(f"JSON decode failed: {e}")
-                pass
-        return None
-    except Exception as e:
-        logger.error(f"Error decoding message: {e}")
-        return None
+    def restore(self, state: dict):
+        self.candle = state['candle']
+        self.start = state['start']
+        self.bars = state['bars']
+        self.atp_sum = state['atp_sum']
+        self.atp_volume = state['atp_volume']
+        self.previous_ha = state['previous_ha']
+        if self.sar is not None and state['sar'] is not None:
+            self.sar = FastSAR.from_state(state['sar'])
+        if self.indicators is not None and state['indicators'] is not None:
+            self.indicators = IndicatorSet.from_state(state['indicators'])
+        self.active_trade = state['active_trade']
+        self.completed = state['completed']
 
 # === ENHANCED LOCK-FREE TICK PROCESSOR WITH TREND & TRADE MANAGEMENT ===
 class LockFreeTickProcessor:
+    # Plain values saved by checkpoint() as they are; candles and timeframes are copied
+    _CHECKPOINT_FIELDS = ('current_minute', 'previous_ltp', 'previous_tick_vtt', 'previous_ltt', 'previous_vtt',
+                          'amend_floor', 'processed_ticks', 'late_ticks', 'amended_ticks', 'duplicate_ticks')
+
     def __init__(self, instrument_key: str, config: dict, db_manager: LockFreeDatabaseManager, all_processors: dict):
         self.instrument_key = instrument_key
         self.config = config
         self.db_manager = db_manager
         self.all_processors = all_processors
         self.instrument_type = config["type"]
+        self.info = REGISTRY.get(instrument_key)
+        self.symbol = self.info.symbol if self.info else instrument_key
         # State variables
         self.current_candle: Optional[LiveCandle] = None
-        self.current_minute: Optional[datetime] = None
-        self.previous_tick: Optional[LiveTick] = None
+        self.current_minute: Optional[int] = None  # minute id, see candle_minute_id()
+        # Last tick's price/vtt/ltt (ticks are pooled, so never keep the tick itself)
+        self.previous_ltp: Optional[float] = None
+        self.previous_tick_vtt: Optional[float] = None
+        self.previous_ltt = 0
         self.previous_vtt: float = 0.0
-        # 5-min state
-        self.current_5min_candle: Optional[LiveCandle] = None
-        self.current_5min_start: Optional[datetime] = None
-        self.min_candles_in_5min = 0
-        # Optimized aggregation data
-        self.agg = {
-            'high': float('-inf'), 'low': float('inf'), 'volume': 0,
-            'delta': 0, 'min_delta': 0, 'max_delta': 0,
-            'atp_sum': 0.0, 'atp_volume': 0
-        }
-        # Heikin Ashi state
-        self.previous_ha_candle: Optional[HeikinAshiCandle] = None
-        self.previous_ha_candle_5min: Optional[HeikinAshiCandle] = None
-        # Fast indicators
-        if self.config.get("process_indicators", False):
-            self.sar_calc = FastSAR()
-            self.sar_calc_5min = FastSAR()
-        # Trend and trade state (per timeframe)
-        self.previous_trend_1min = 0
-        self.present_trend_1min = 0
-        self.previous_trend_5min = 0
-        self.present_trend_5min = 0
-        self.active_trade_1min = None
-        self.active_trade_5min = None
+        # Tick records applied over the last CANDLE_AMEND_MINUTES closed minutes and the open one, in
+        # tick_order (appended by TickDispatcher), so a late tick can be re-sequenced into them
+        self.recent_ticks: List[tuple] = []
+        self.amend_floor: Optional[int] = None  # oldest minute id a late tick may amend, None = since the first tick
+        # Set when a ColumnarCandleEngine owns the open 1min candle
+        self.engine = None
+        # Set when bars are closed on minute boundaries (CandleCloseScheduler)
+        self.close_scheduler = None
+        # Shared TrendEngine: the NIFTY trend is computed once per bar, not once per instrument
+        self.trend_engine = None
+        # Timeframe ladder (HA/SAR, trend and trade state per timeframe), keyed by interval label
+        process_indicators = self.config.get("process_indicators", False)
+        self.timeframes: Dict[str, TimeframeState] = {}
+        for minutes in TIMEFRAMES:
+            state = TimeframeState(minutes, process_indicators)
+            self.timeframes[state.interval] = state
+            if minutes in TIMEFRAME_PARENTS:
+                self.timeframes[interval_label(TIMEFRAME_PARENTS[minutes])].children.append(state)
+        self.base = self.timeframes["1min"]
+        self.higher = [state for state in self.timeframes.values() if state.minutes > 1]
+        self.has_active_trade = False
         # Stats
         self.processed_ticks = 0
-        self.completed_candles = 0
-        self.completed_5min_candles = 0
+        self.late_ticks = 0
+        self.amended_ticks = 0
+        self.duplicate_ticks = 0
         logger.info(f"Enhanced processor initialized for {instrument_key}")
 
-    def decode_timestamp(self, timestamp_str: str) -> Optional[datetime]:
+    def decode_ltt(self, timestamp_str: str) -> Optional[int]:
         try:
-            timestamp_ms = int(timestamp_str)
-            dt_utc = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
-            return dt_utc.astimezone(IST)
+            return int(timestamp_str)
         except Exception:
             return None
 
     def extract_tick_data_v3(self, feed_data) -> Optional[LiveTick]:
+        feeds = get_frame_feeds(feed_data)
+        if self.instrument_key not in feeds:
+            return None
+        return self.extract_instrument_feed(feeds[self.instrument_key])
+
+    def extract_instrument_feed(self, instrument_feed) -> Optional[LiveTick]:
+        """Build a tick from this instrument's entry in a frame's feed map"""
         try:
-            if 'feeds' not in feed_data or self.instrument_key not in feed_data['feeds']:
-                return None
-            instrument_feed = feed_data['feeds'][self.instrument_key]
+            if isinstance(instrument_feed, pb.Feed):
+                return extract_feed_tick(self.instrument_key, self.instrument_type, instrument_feed)
             # Handle full feed
             if 'fullFeed' in instrument_feed:
                 full_feed = instrument_feed['fullFeed']
                 if 'marketFF' in full_feed:
                     market_ff = full_feed['marketFF']
                     ltpc = market_ff.get('ltpc', {})
-                    timestamp = self.decode_timestamp(ltpc.get('ltt'))
-                    if not timestamp:
+                    ltt_ms = self.decode_ltt(ltpc.get('ltt'))
+                    if not ltt_ms:
                         return None
                     ltp = float(ltpc.get('ltp', 0))
                     atp = float(market_ff.get('atp', ltp))
@@ -1036,7 +1802,7 @@ class LockFreeTickProcessor:
                     return LiveTick(
                         instrument_key=self.instrument_key,
                         instrument_type=self.instrument_type,
-                        timestamp=timestamp,
+                        ltt_ms=ltt_ms,
                         ltp=ltp,
                         atp=atp,
                         vtt=float(vtt) if vtt is not None else None,
@@ -1046,14 +1812,14 @@ class LockFreeTickProcessor:
                 elif 'indexFF' in full_feed:
                     index_ff = full_feed['indexFF']
                     ltpc = index_ff.get('ltpc', {})
-                    timestamp = self.decode_timestamp(ltpc.get('ltt'))
-                    if not timestamp:
+                    ltt_ms = self.decode_ltt(ltpc.get('ltt'))
+                    if not ltt_ms:
                         return None
                     ltp = float(ltpc.get('ltp', 0))
                     return LiveTick(
                         instrument_key=self.instrument_key,
                         instrument_type=self.instrument_type,
-                        timestamp=timestamp,
+                        ltt_ms=ltt_ms,
                         ltp=ltp,
                         atp=ltp,
                         prev_close=float(ltpc.get('cp', 0))
@@ -1061,14 +1827,14 @@ class LockFreeTickProcessor:
             # Handle LTPC only
             elif 'ltpc' in instrument_feed:
                 ltpc = instrument_feed['ltpc']
-                timestamp = self.decode_timestamp(ltpc.get('ltt'))
-                if not timestamp:
+                ltt_ms = self.decode_ltt(ltpc.get('ltt'))
+                if not ltt_ms:
                     return None
                 ltp = float(ltpc.get('ltp', 0))
                 return LiveTick(
                     instrument_key=self.instrument_key,
                     instrument_type=self.instrument_type,
-                    timestamp=timestamp,
+                    ltt_ms=ltt_ms,
                     ltp=ltp,
                     atp=ltp,
                     prev_close=float(ltpc.get('cp', 0))
@@ -1078,66 +1844,262 @@ class LockFreeTickProcessor:
             logger.error(f"Error extracting tick data: {e}")
             return None
 
-    def get_candle_minute(self, timestamp: datetime) -> datetime:
-        adjusted_time = timestamp - timedelta(seconds=1)
-        return adjusted_time.replace(second=0, microsecond=0)
+    def current_close(self) -> Optional[float]:
+        """Close of the open 1min candle, whichever engine holds it"""
+        if self.current_candle:
+            return self.current_candle.close
+        if self.engine is not None:
+            return self.engine.current_close(self.info.id)
+        return None
 
-    def get_5min_bucket(self, timestamp: datetime) -> datetime:
-        bucket_minute = (timestamp.minute // 5) * 5
-        return timestamp.replace(minute=bucket_minute, second=0, microsecond=0)
+    def checkpoint(self) -> dict:
+        """Open candle, last-tick and per-timeframe state, copied so it can be written off the event loop"""
+        state = {name: getattr(self, name) for name in self._CHECKPOINT_FIELDS}
+        state['current_candle'] = copy.copy(self.current_candle)
+        state['recent_ticks'] = list(self.recent_ticks)
+        state['timeframes'] = {interval: timeframe.checkpoint() for interval, timeframe in self.timeframes.items()}
+        # A closed bar sits in its timeframe's history and in its parent's parts: copied in one go to stay shared
+        state['closed_bars'] = copy.deepcopy({interval: (timeframe.parts, timeframe.history)
+                                              for interval, timeframe in self.timeframes.items()})
+        return state
+
+    def restore(self, state: dict):
+        for name in self._CHECKPOINT_FIELDS:
+            setattr(self, name, state[name])
+        self.current_candle = state['current_candle']
+        self.recent_ticks = state['recent_ticks']
+        for interval, timeframe in state['timeframes'].items():
+            if interval in self.timeframes:
+                self.timeframes[interval].restore(timeframe)
+        for interval, (parts, history) in state['closed_bars'].items():
+            if interval in self.timeframes:
+                self.timeframes[interval].parts = parts
+                self.timeframes[interval].history = history
+        self.has_active_trade = any(timeframe.active_trade for timeframe in self.timeframes.values())
+
+    def get_candle_minute(self, ltt_ms: int) -> int:
+        return candle_minute_id(ltt_ms)
 
     def process_tick(self, feed_data):
+        tick = self.extract_tick_data_v3(feed_data)
+        if tick:
+            self.process_live_tick(tick)
+
+    def process_live_tick(self, tick: LiveTick):
         try:
-            tick = self.extract_tick_data_v3(feed_data)
-            if not tick:
-                return
-            current_time = tick.timestamp.time()
-            logger.info(f"Processing tick at IST {current_time.strftime('%H:%M:%S')} for {self.instrument_key}")
-            if current_time >= MARKET_END_TIME:
+            ltt_ms = tick.ltt_ms
+            # Simulated feeds stamp ticks with the current time, so they may run past 15:30
+            if not FEED_SIMULATION and (ltt_ms + IST_OFFSET_MS) % DAY_MS >= MARKET_END_MS_OF_DAY:
                 logger.info(f"🏁 Market hours ended at 3:30 PM IST - Finalizing last candles")
                 if self.current_candle:
                     self._finalize_current_candle()
-                if self.current_5min_candle:
-                    self._finalize_5min_candle()
-                global shutdown_event
-                shutdown_event.set()
+                self.finalize_higher_bars()
+                request_shutdown()
                 return
-            candle_minute = self.get_candle_minute(tick.timestamp)
-            if self.current_minute and self.current_minute != candle_minute:
-                self._finalize_current_candle()
-            if self.current_minute != candle_minute:
+            candle_minute = (ltt_ms + IST_OFFSET_MS - 1000) // MINUTE_MS
+            current_minute = self.current_minute
+            if current_minute != candle_minute:
+                if current_minute is not None and candle_minute < current_minute:
+                    self.amend_tick(record_from_tick(tick))
+                    return
+                if self.current_candle:
+                    self._finalize_current_candle()
                 self._initialize_candle(candle_minute, tick)
+            elif self.current_candle is None:
+                # The minute was already closed on its boundary
+                self.amend_tick(record_from_tick(tick))
+                return
+            elif ltt_ms < self.previous_ltt or (ltt_ms == self.previous_ltt and tick.vtt is not None and
+                                                self.previous_tick_vtt is not None and tick.vtt < self.previous_tick_vtt):
+                # Only when ticks bypass TickDispatcher's reorder window
+                self.amend_tick(record_from_tick(tick))
+                return
             self._update_candle_ultra_fast(tick)
             self._manage_active_trades_tick(tick)
             self.processed_ticks += 1
-            self.previous_tick = tick
+            self.previous_ltp = tick.ltp
+            self.previous_tick_vtt = tick.vtt
+            self.previous_ltt = ltt_ms
         except Exception as e:
             logger.error(f"Error processing tick: {e}")
 
+    def amend_tick(self, record: tuple):
+        """Re-sequence a tick that sorts before ticks already applied (tick_order) into its bar.
+
+        The tick joins recent_ticks and every bar from its minute on is rebuilt from them in
+        order, so OHLC, volume and delta come out as if it had arrived in time. Closed bars
+        among them are re-finalized with every row derived from them; ticks from before
+        recent_ticks (CANDLE_AMEND_MINUTES back) are only counted as late.
+        """
+        try:
+            recent = self.recent_ticks
+            minute = candle_minute_id(record[1])
+            floor = self.amend_floor
+            if floor is None and recent:
+                floor = candle_minute_id(recent[0][1])
+            if CANDLE_LATE_TICKS != 'amend' or floor is None or minute < floor:
+                self.late_ticks += 1
+                return
+            order = tick_order(record)
+            index = bisect.bisect_left(recent, order, key=tick_order)
+            while index < len(recent) and tick_order(recent[index]) == order:
+                if recent[index] == record:
+                    self.duplicate_ticks += 1
+                    return
+                index += 1
+            recent.insert(index, record)
+            self.amended_ticks += 1
+            first = bisect.bisect_left(recent, candle_minute_start_ms(minute), key=operator.itemgetter(1))
+            bars, last = self._replay_ticks(recent[first - 1] if first else None, recent[first:])
+            open_bar = bars.pop()[1] if bars[-1][0] == self._open_minute() else None
+            self._resume(open_bar, last)
+            if bars:
+                self._amend_closed_bars(bars)
+        except Exception as e:
+            logger.error(f"Error amending late tick: {e}")
+
+    def _replay_ticks(self, seed: Optional[tuple], records: list) -> Tuple[list, tuple]:
+        """1min bars rebuilt from ``records`` the way process_live_tick builds them; ``seed`` is the tick before
+        (None for the first tick of the session).
+
+        Returns [(minute id, bar)] and the last tick's (ltp, vtt, previous_vtt, ltt_ms).
+        """
+        saved = (self.current_candle, self.previous_ltp, self.previous_tick_vtt, self.previous_vtt)
+        self.previous_ltp, self.previous_tick_vtt = (seed[2], seed[4]) if seed is not None else (None, None)
+        bars = []
+        ticks = []
+        minute = None
+        try:
+            for record in records:
+                tick = tick_from_record(record, self.instrument_type)
+                ticks.append(tick)
+                tick_minute = candle_minute_id(tick.ltt_ms)
+                if tick_minute != minute:
+                    minute = tick_minute
+                    self.current_candle = self._new_candle(minute, tick)
+                    self.previous_vtt = self.current_candle.vtt_open
+                    bars.append((minute, self.current_candle))
+                self._update_candle_ultra_fast(tick)
+                self.previous_ltp = tick.ltp
+                self.previous_tick_vtt = tick.vtt
+            return bars, (self.previous_ltp, self.previous_tick_vtt, self.previous_vtt, records[-1][1])
+        finally:
+            TICK_POOL.release(ticks)
+            self.current_candle, self.previous_ltp, self.previous_tick_vtt, self.previous_vtt = saved
+
+    def _open_minute(self) -> Optional[int]:
+        """Minute id of the open 1min bar, whichever engine holds it"""
+        if self.engine is not None:
+            return self.engine.open_minute(self.info.id)
+        return self.current_minute if self.current_candle is not None else None
+
+    def _resume(self, candle: Optional[LiveCandle], last: tuple):
+        """Carry on from a replay: its rebuilt open bar (if the minute is still open) and last tick"""
+        if self.engine is not None:
+            self.engine.resume(self.info.id, candle, last)
+            return
+        if candle is not None:
+            self.current_candle = candle
+        self.previous_ltp, self.previous_tick_vtt, self.previous_vtt, self.previous_ltt = last
+
+    def _amend_closed_bars(self, bars: list):
+        """Put rebuilt 1min bars in place of the closed ones and re-finalize from the first of them"""
+        state = self.base
+        changed = []
+        for minute, candle in bars:
+            entry = state.closed_bar(minute)
+            if entry is not None:
+                amend_candle(entry.candle, candle)
+            elif state.history and minute > state.history[0].start:
+                # A minute whose only ticks came late gets its bar now
+                entry = ClosedBar(minute, candle)
+                state.insert(entry)
+                state.completed += 1
+            else:
+                continue
+            changed.append(entry)
+        if changed:
+            self._refinalize(state, changed)
+
+    def _refinalize(self, state: TimeframeState, changed: List[ClosedBar]):
+        """Re-save amended closed bars of ``state``, redo its HA/SAR chain and trend from the first of
+        them on and rebuild the higher-timeframe bars they are part of"""
+        history = state.history
+        changed = [entry for entry in history if any(entry is bar for bar in changed)]
+        if not changed:
+            return
+        first = next(i for i, entry in enumerate(history) if entry is changed[0])
+        heikin_ashi = self.config.get("process_heikin_ashi", False)
+        if heikin_ashi:
+            # A bar that only exists since the amendment starts from the state the next bar started from
+            before = next((entry.before for entry in history[first:] if entry.before is not None), None)
+            if before is not None:
+                state.rewind(before)
+        latest = history[-1]
+        for entry in history[first:]:
+            if any(entry is bar for bar in changed):
+                self._process_regular_candle(state.interval, entry.candle)
+            elif not heikin_ashi:
+                continue
+            if heikin_ashi:
+                entry.before = state.snapshot()
+                self._process_heikin_ashi(state.interval, entry.candle)
+                entry.ha = state.previous_ha
+            if self.trend_engine is not None:
+                self.trend_engine.bar_amended(self, state, entry, entry is latest)
+            elif entry is latest:
+                self._update_latest_candle(entry.candle, state.interval, {})
+        if heikin_ashi and state is self.base and self.engine is not None:
+            self.engine.load_heikin_ashi(self.info.id)
+        for child in state.children:
+            self._amend_parent(child, changed)
+
+    def _amend_parent(self, state: TimeframeState, bars: List[ClosedBar]):
+        """Rebuild the ``state`` bars that amended or new bars of its parent timeframe belong to"""
+        changed = []
+        for bar in bars:
+            start = bar.start - bar.start % state.minutes
+            if state.candle is not None and state.start == start:
+                entry = None
+                parts = state.parts
+            else:
+                entry = state.closed_bar(start)
+                if entry is None:
+                    if state.history and start < state.history[0].start:
+                        continue
+                    # Its only sub-bar came from late ticks
+                    entry = ClosedBar(start, None)
+                parts = entry.parts
+            if not any(part is bar.candle for part in parts):
+                bisect.insort(parts, bar.candle, key=operator.attrgetter('timestamp'))
+            if entry is None:
+                state.rebuild_open_bar()
+                continue
+            rebuilt = state.aggregate(self.instrument_key, start, parts)
+            if entry.candle is None:
+                entry.candle = rebuilt
+                state.insert(entry)
+                state.completed += 1
+            else:
+                amend_candle(entry.candle, rebuilt)
+            if not any(entry is other for other in changed):
+                changed.append(entry)
+        if changed:
+            self._refinalize(state, changed)
+
     def _manage_active_trades_tick(self, tick: LiveTick):
+        if not self.has_active_trade:
+            return
         current_time = tick.timestamp.time()
-        if self.active_trade_1min:
-            result = self._check_trade_exit(self.active_trade_1min, tick.ltp, current_time)
-            if result:
-                self.active_trade_1min = None
-                trend_data = {
-                    'timestamp': tick.timestamp,
-                    'candle_interval': '1min',
-                    'trend_value': 0,
-                    'buy_recommendation': result['type'],
-                    'entry_price': result['entry_price'],
-                    'target': result['target'],
-                    'sl': result['sl'],
-                    'profit_loss': result['profit_loss']
-                }
-                self.db_manager.save_trend_instant(trend_data)
-        if self.active_trade_5min:
-            result = self._check_trade_exit(self.active_trade_5min, tick.ltp, current_time)
+        for state in self.timeframes.values():
+            if not state.active_trade:
+                continue
+            result = self._check_trade_exit(state.active_trade, tick.ltp, current_time)
             if result:
-                self.active_trade_5min = None
+                state.active_trade = None
                 trend_data = {
                     'timestamp': tick.timestamp,
-                    'candle_interval': '5min',
+                    'candle_interval': state.interval,
                     'trend_value': 0,
                     'buy_recommendation': result['type'],
                     'entry_price': result['entry_price'],
@@ -1146,6 +2108,7 @@ class LockFreeTickProcessor:
                     'profit_loss': result['profit_loss']
                 }
                 self.db_manager.save_trend_instant(trend_data)
+        self.has_active_trade = any(state.active_trade for state in self.timeframes.values())
 
     def _check_trade_exit(self, trade, current_price, current_time):
         if trade['status'] != 'active':
@@ -1172,43 +2135,43 @@ class LockFreeTickProcessor:
             return trade
         return None
 
-    def _initialize_candle(self, minute: datetime, tick: LiveTick):
+    def _initialize_candle(self, minute: int, tick: LiveTick):
         self.current_minute = minute
+        self.current_candle = self._new_candle(minute, tick)
+        self.previous_vtt = self.current_candle.vtt_open
+        if self.close_scheduler is not None:
+            self.close_scheduler.schedule(self, None, minute)
+        self._open_higher_bars(minute, tick.ltp, tick.atp or tick.ltp)
+
+    def _open_higher_bars(self, minute: int, ltp: float, atp: float):
+        """Open the higher-timeframe bars a new 1min bar falls into"""
+        for state in self.higher:
+            start = minute - minute % state.minutes
+            if state.start != start:
+                if state.candle:
+                    # Its closing sub-bar never came (no ticks in that minute), so close it now
+                    self._finalize_bar(state)
+                state.open(self.instrument_key, start, ltp, atp)
+                if self.close_scheduler is not None:
+                    self.close_scheduler.schedule(self, state, start)
+
+    def _new_candle(self, minute: int, tick: LiveTick) -> LiveCandle:
         vtt_open = tick.vtt if tick.vtt is not None else 0.0
         volume = 0 if self.instrument_type == "INDEX" else 0
-        self.current_candle = LiveCandle(
+        return LiveCandle(
             instrument_key=self.instrument_key,
-            timestamp=minute,
+            timestamp=minute_datetime(minute),
             open=tick.ltp, high=tick.ltp, low=tick.ltp, close=tick.ltp,
             volume=volume, atp=tick.atp or tick.ltp,
             vtt_open=vtt_open, vtt_close=vtt_open
         )
-        self.previous_vtt = vtt_open
-        _5min_start = self.get_5min_bucket(minute)
-        if self.current_5min_start != _5min_start:
-            self._initialize_5min_candle(_5min_start, tick)
-
-    def _initialize_5min_candle(self, _5min_start: datetime, tick: LiveTick):
-        self.current_5min_start = _5min_start
-        self.min_candles_in_5min = 0
-        self.agg = {
-            'high': tick.ltp, 'low': tick.ltp, 'volume': 0,
-            'delta': 0, 'min_delta': 0, 'max_delta': 0,
-            'atp_sum': 0.0, 'atp_volume': 0
-        }
-        self.current_5min_candle = LiveCandle(
-            instrument_key=self.instrument_key,
-            timestamp=_5min_start,
-            open=tick.ltp, high=tick.ltp, low=tick.ltp, close=tick.ltp,
-            volume=0, atp=tick.atp or tick.ltp
-        )
 
     def _update_candle_ultra_fast(self, tick: LiveTick):
         if not self.current_candle:
             return
-        if (self.previous_tick and
-            tick.ltp == self.previous_tick.ltp and
-            tick.vtt == self.previous_tick.vtt):
+        if (self.previous_ltp is not None and
+            tick.ltp == self.previous_ltp and
+            tick.vtt == self.previous_tick_vtt):
             return
         self.current_candle.close = tick.ltp
         if tick.ltp > self.current_candle.high:
@@ -1225,13 +2188,13 @@ class LockFreeTickProcessor:
             calculated_volume = int(self.current_candle.vtt_close - self.current_candle.vtt_open)
             self.current_candle.volume = max(0, calculated_volume)
         if (self.config.get("process_delta", False) and self.instrument_type == "FUTURE" and
-            self.previous_tick and self.previous_vtt > 0 and self.previous_tick.ltp is not None):
+            self.previous_ltp is not None and self.previous_vtt > 0):
             vtt_change = tick.vtt - self.previous_vtt
             if vtt_change > 0:
-                if tick.ltp > self.previous_tick.ltp:
+                if tick.ltp > self.previous_ltp:
                     self.current_candle.buy_volume += int(vtt_change)
                     self.current_candle.delta += int(vtt_change)
-                elif tick.ltp < self.previous_tick.ltp:
+                elif tick.ltp < self.previous_ltp:
                     self.current_candle.sell_volume += int(vtt_change)
                     self.current_candle.delta -= int(vtt_change)
                 else:
@@ -1243,12 +2206,12 @@ class LockFreeTickProcessor:
                 if self.current_candle.delta > self.current_candle.max_delta:
                     self.current_candle.max_delta = self.current_candle.delta
         elif (self.config.get("process_delta", False) and
-              self.previous_tick and self.previous_vtt > 0 and self.previous_tick.ltp is not None):
+              self.previous_ltp is not None and self.previous_vtt > 0):
             vtt_change = tick.vtt - self.previous_vtt
             if vtt_change > 0:
-                if tick.ltp > self.previous_tick.ltp:
+                if tick.ltp > self.previous_ltp:
                     self.current_candle.buy_volume += int(vtt_change)
-                elif tick.ltp < self.previous_tick.ltp:
+                elif tick.ltp < self.previous_ltp:
                     self.current_candle.sell_volume += int(vtt_change)
                 new_delta = self.current_candle.buy_volume - self.current_candle.sell_volume
                 self.current_candle.delta = new_delta
@@ -1262,74 +2225,81 @@ class LockFreeTickProcessor:
         if not self.current_candle:
             return
         try:
-            self._process_regular_candle("1min")
-            if self.config.get("process_heikin_ashi", False):
-                self._process_heikin_ashi("1min")
-            self._process_trend_and_recommendation("1min")
-            if self.current_5min_candle:
-                self._aggregate_to_5min()
-                if self.current_minute and (self.current_minute.minute + 1) % 5 == 0:
-                    self._finalize_5min_candle()
-            self.completed_candles += 1
+            self._process_closed_bar(self.base, self.current_minute, self.current_candle)
+            self._close_base_bar(self.current_minute, self.current_candle)
         except Exception as e:
             logger.error(f"Error finalizing candle: {e}")
         finally:
             self.current_candle = None
 
-    def _aggregate_to_5min(self):
-        candle = self.current_candle
-        self.min_candles_in_5min += 1
-        if self.min_candles_in_5min == 1:
-            self.current_5min_candle.open = candle.open
-            self.agg['min_delta'] = candle.min_delta
-            self.agg['max_delta'] = candle.max_delta
-        self.current_5min_candle.close = candle.close
-        self.agg['high'] = max(self.agg['high'], candle.high)
-        self.agg['low'] = min(self.agg['low'], candle.low)
-        self.agg['volume'] += candle.volume
-        self.agg['delta'] += candle.delta
-        self.agg['min_delta'] = min(self.agg['min_delta'], candle.min_delta)
-        self.agg['max_delta'] = max(self.agg['max_delta'], candle.max_delta)
-        if candle.volume > 0:
-            self.agg['atp_sum'] += candle.atp * candle.volume
-            self.agg['atp_volume'] += candle.volume
-
-    def _finalize_5min_candle(self):
-        if not self.current_5min_candle:
+    def _close_base_bar(self, minute: Optional[int], candle: LiveCandle):
+        """A closed 1min bar past its candle and HA rows: trend, latest_candles row and roll-up"""
+        self._process_trend_and_recommendation(self.base, minute, candle)
+        if minute is not None:
+            self._roll_up(self.base, candle, minute)
+            self._trim_recent_ticks(minute)
+        self.base.completed += 1
+
+    def _roll_up(self, state: TimeframeState, bar: LiveCandle, start: int):
+        """Add a closed bar to the timeframes built from it and close those it completes"""
+        end = start + state.minutes
+        for child in state.children:
+            if child.candle is None:
+                continue
+            child.add_bar(bar)
+            if end % child.minutes == 0:
+                self._finalize_bar(child)
+
+    def _finalize_bar(self, state: TimeframeState):
+        if not state.candle:
             return
         try:
-            self.current_5min_candle.high = self.agg['high']
-            self.current_5min_candle.low = self.agg['low']
-            self.current_5min_candle.volume = self.agg['volume']
-            self.current_5min_candle.delta = self.agg['delta']
-            self.current_5min_candle.min_delta = self.agg['min_delta']
-            self.current_5min_candle.max_delta = self.agg['max_delta']
-            if self.agg['atp_volume'] > 0:
-                self.current_5min_candle.atp = self.agg['atp_sum'] / self.agg['atp_volume']
-            else:
-                self.current_5min_candle.atp = self.current_5min_candle.close
-            self._process_regular_candle("5min", self.current_5min_candle)
-            if self.config.get("process_heikin_ashi", False):
-                self._process_heikin_ashi("5min", self.current_5min_candle)
-            self._process_trend_and_recommendation("5min", self.current_5min_candle)
-            self.completed_5min_candles += 1
+            candle = state.close_bar()
+            self._process_closed_bar(state, state.start, candle)
+            self._process_trend_and_recommendation(state, state.start, candle)
+            self._roll_up(state, candle, state.start)
+            state.completed += 1
         except Exception as e:
-            logger.error(f"Error finalizing 5min candle: {e}")
+            logger.error(f"Error finalizing {state.interval} candle: {e}")
         finally:
-            self.current_5min_candle = None
-            self.current_5min_start = None
-            self.min_candles_in_5min = 0
+            state.reset()
+
+    def _process_closed_bar(self, state: TimeframeState, start: int, candle: LiveCandle):
+        """Candle and HA rows of a bar that just closed; it is kept with the HA/SAR state before it for amend_tick"""
+        self._process_regular_candle(state.interval, candle)
+        entry = state.keep(start, candle)
+        if self.config.get("process_heikin_ashi", False):
+            if entry is not None:
+                entry.before = state.snapshot()
+            self._process_heikin_ashi(state.interval, candle)
+            if entry is not None:
+                entry.ha = state.previous_ha
+
+    def _trim_recent_ticks(self, closed_minute: int):
+        """Drop retained ticks of minutes a late tick can no longer amend, but the last one before them,
+        which seeds the replay"""
+        self.amend_floor = closed_minute - CANDLE_AMEND_MINUTES + 1
+        recent = self.recent_ticks
+        cut = bisect.bisect_left(recent, candle_minute_start_ms(self.amend_floor), key=operator.itemgetter(1))
+        if cut > 1:
+            del recent[:cut - 1]
+
+    def finalize_higher_bars(self):
+        """Close every open higher-timeframe bar early (market close or end of a replay)"""
+        for state in self.higher:
+            self._finalize_bar(state)
 
     def _process_regular_candle(self, interval: str, candle: LiveCandle = None):
         candle_to_process = candle if candle else self.current_candle
         if not candle_to_process:
             return
         self.db_manager.save_candle_instant(candle_to_process, interval)
-        symbol = self.instrument_key.split('|')[1] if '|' in self.instrument_key else self.instrument_key
-        logger.info(f"V3 {interval.upper()} CANDLE [{symbol}] {candle_to_process.timestamp.strftime('%H:%M')} | "
-                    f"OHLC: {candle_to_process.open:.2f}/{candle_to_process.high:.2f}/"
-                    f"{candle_to_process.low:.2f}/{candle_to_process.close:.2f} | "
-                    f"Vol: {candle_to_process.volume} | DELTA: {candle_to_process.delta}")
+        self._log_candle(interval, candle_to_process)
+
+    def _log_candle(self, interval: str, candle: LiveCandle):
+        logger.info("V3 %s CANDLE [%s] %s | OHLC: %.2f/%.2f/%.2f/%.2f | Vol: %s | DELTA: %s",
+                    interval.upper(), self.symbol, candle.timestamp,
+                    candle.open, candle.high, candle.low, candle.close, candle.volume, candle.delta)
 
     def _process_heikin_ashi(self, interval: str, candle: LiveCandle = None):
         candle_to_process = candle if candle else self.current_candle
@@ -1338,31 +2308,26 @@ class LockFreeTickProcessor:
         ha_candle = self._calculate_heikin_ashi_fast(candle_to_process, interval)
         if not ha_candle:
             return
-        if interval == "1min":
-            if self.sar_calc:
-                _, sar_trend = self.sar_calc.update(ha_candle.ha_high, ha_candle.ha_low, ha_candle.ha_close)
-                ha_candle.sar_trend = sar_trend
-                ha_candle.macd = None
-                ha_candle.macd_signal = None
-        else:
-            if self.sar_calc_5min:
-                _, sar_trend = self.sar_calc_5min.update(ha_candle.ha_high, ha_candle.ha_low, ha_candle.ha_close)
-                ha_candle.sar_trend = sar_trend
-                ha_candle.macd = None
-                ha_candle.macd_signal = None
+        state = self.timeframes[interval]
+        if state.sar:
+            _, sar_trend = state.sar.update(ha_candle.ha_high, ha_candle.ha_low, ha_candle.ha_close)
+            ha_candle.sar_trend = sar_trend
+        if state.indicators:
+            values = state.indicators.update(ha_candle.ha_high, ha_candle.ha_low, ha_candle.ha_close)
+            ha_candle.macd = values['macd']
+            ha_candle.macd_signal = values['macd_signal']
         self.db_manager.save_ha_candle_instant(ha_candle, interval)
-        symbol = self.instrument_key.split('|')[1] if '|' in self.instrument_key else self.instrument_key
-        logger.info(f"V3 {interval.upper()} HA+INDICATORS [{symbol}] {ha_candle.timestamp.strftime('%H:%M')} | "
-                    f"HA Close: {ha_candle.ha_close:.2f} | HLC3: {ha_candle.hlc3:.2f} | "
-                    f"SAR: {'UP' if ha_candle.sar_trend == 1 else 'DOWN'}")
-        if interval == "1min":
-            self.previous_ha_candle = ha_candle
-        else:
-            self.previous_ha_candle_5min = ha_candle
+        self._log_heikin_ashi(interval, ha_candle)
+        state.previous_ha = ha_candle
+
+    def _log_heikin_ashi(self, interval: str, ha_candle: HeikinAshiCandle):
+        logger.info("V3 %s HA+INDICATORS [%s] %s | HA Close: %.2f | HLC3: %.2f | SAR: %s",
+                    interval.upper(), self.symbol, ha_candle.timestamp, ha_candle.ha_close, ha_candle.hlc3,
+                    'UP' if ha_candle.sar_trend == 1 else 'DOWN')
 
     def _calculate_heikin_ashi_fast(self, candle: LiveCandle, interval: str) -> Optional[HeikinAshiCandle]:
         try:
-            prev_ha = self.previous_ha_candle if interval == "1min" else self.previous_ha_candle_5min
+            prev_ha = self.timeframes[interval].previous_ha
             ha_close = (candle.open + candle.high + candle.low + candle.close) * 0.25
             if prev_ha is None:
                 ha_open = (candle.open + candle.close) * 0.5
@@ -1381,164 +2346,85 @@ class LockFreeTickProcessor:
             logger.error(f"Error calculating Heikin Ashi: {e}")
             return None
 
-    def _process_trend_and_recommendation(self, interval: str, candle: LiveCandle = None):
-        candle_to_process = candle if candle else self.current_candle
-        if not candle_to_process:
-            return
-        nifty_index_proc = self.all_processors.get(INSTRUMENTS["NIFTY_INDEX"]["key"])
-        nifty_future_proc = self.all_processors.get(INSTRUMENTS["NIFTY_FUTURE"]["key"])
-        if not nifty_index_proc or not nifty_future_proc:
-            return
-        if interval == "1min":
-            index_ha = nifty_index_proc.previous_ha_candle
-            future_ha = nifty_future_proc.previous_ha_candle
-            future_delta = nifty_future_proc.current_candle.delta if nifty_future_proc.current_candle else 0
-            # Use cash flow calculator to get CE/PE metrics instead of individual processors
-            ce_delta = pe_delta = 0  # Not needed for trend calculation with cash flow
+    def _process_trend_and_recommendation(self, state: TimeframeState, start: int, candle: LiveCandle):
+        """Hand a closed bar to the trend engine; its latest_candles row is written with that bar's trend"""
+        if state.active_trade:
+            self._update_active_trade(state, candle)
+        if self.trend_engine is not None:
+            self.trend_engine.bar_closed(self, state, start, candle)
         else:
-            index_ha = nifty_index_proc.previous_ha_candle_5min
-            future_ha = nifty_future_proc.previous_ha_candle_5min
-            future_delta = nifty_future_proc.current_5min_candle.delta if nifty_future_proc.current_5min_candle else 0
-            # Use cash flow calculator to get CE/PE metrics instead of individual processors
-            ce_delta = pe_delta = 0  # Not needed for trend calculation with cash flow
-        if not index_ha or not future_ha:
-            trend_data = {
-                'timestamp': candle_to_process.timestamp,
-                'candle_interval': interval,
-                'trend_value': 0,
-                'buy_recommendation': None,
-                'entry_price': None,
-                'target': None,
-                'sl': None,
-                'profit_loss': None
-            }
-            self.db_manager.save_trend_instant(trend_data)
-            logger.info(f"TREND [{interval}] {candle_to_process.timestamp.strftime('%H:%M')}: NEUTRAL (HA not available)")
-            return
-        index_up = index_ha.ha_open < index_ha.ha_close and index_ha.sar_trend == 1
-        index_down = index_ha.ha_open > index_ha.ha_close and index_ha.sar_trend == -1
-        future_up = future_delta > 0 and future_ha.sar_trend == 1 and future_ha.ha_open < future_ha.ha_close
-        future_down = future_delta < 0 and future_ha.sar_trend == -1 and future_ha.ha_open > future_ha.ha_close
-        trend_value = 0
-        if index_up and future_up:
-            trend_value = 1
-        elif index_down and future_down:
-            trend_value = -1
-        if interval == "1min":
-            self.previous_trend_1min = self.present_trend_1min
-            self.present_trend_1min = trend_value
-            previous_trend = self.previous_trend_1min
-            present_trend = self.present_trend_1min
-            active_trade = self.active_trade_1min
-        else:
-            self.previous_trend_5min = self.present_trend_5min
-            self.present_trend_5min = trend_value
-            previous_trend = self.previous_trend_5min
-            present_trend = self.present_trend_5min
-            active_trade = self.active_trade_5min
-        trend_str = "UP" if trend_value == 1 else "DOWN" if trend_value == -1 else "NEUTRAL"
-        current_time = candle_to_process.timestamp.time()
-        log_msg = f"TREND [{interval}] {current_time.strftime('%H:%M')}: {trend_str}"
-        buy_recommendation = None
+            self._update_latest_candle(candle, state.interval, {})
+
+    def _update_active_trade(self, state: TimeframeState, candle: LiveCandle):
+        """Enter a waiting trade at the bar's open, or trail/exit an active one on its close"""
+        interval = state.interval
+        active_trade = state.active_trade
         entry_price = None
         target = None
         sl = None
         profit_loss = None
-        # Buy recommendations will be implemented later with cash flow logic from 60 options
-        if active_trade:
-            if active_trade['status'] == 'waiting_entry':
-                active_trade['entry_price'] = candle_to_process.open
-                active_trade['target'] = active_trade['entry_price'] + 5
-                active_trade['sl'] = active_trade['entry_price'] - 5
-                active_trade['trail_triggered'] = False
-                active_trade['status'] = 'active'
-                entry_price = active_trade['entry_price']
-                target = active_trade['target']
+        log_msg = f"TRADE [{interval}] [{self.symbol}] {candle.timestamp.strftime('%H:%M')}"
+        if active_trade['status'] == 'waiting_entry':
+            active_trade['entry_price'] = candle.open
+            active_trade['target'] = active_trade['entry_price'] + 5
+            active_trade['sl'] = active_trade['entry_price'] - 5
+            active_trade['trail_triggered'] = False
+            active_trade['status'] = 'active'
+            entry_price = active_trade['entry_price']
+            target = active_trade['target']
+            sl = active_trade['sl']
+            log_msg += f" | Entered {active_trade['type']} at {entry_price:.2f} | Target: {target:.2f} | SL: {sl:.2f}"
+        elif active_trade['status'] == 'active':
+            price = candle.close
+            if not active_trade['trail_triggered'] and price >= active_trade['entry_price'] + 4:
+                active_trade['sl'] = active_trade['entry_price'] + 2
+                active_trade['trail_triggered'] = True
                 sl = active_trade['sl']
-                log_msg += f" | Entered {active_trade['type']} at {entry_price:.2f} | Target: {target:.2f} | SL: {sl:.2f}"
-            elif active_trade['status'] == 'active':
-                price = candle_to_process.close
-                if not active_trade['trail_triggered'] and price >= active_trade['entry_price'] + 4:
-                    active_trade['sl'] = active_trade['entry_price'] + 2
-                    active_trade['trail_triggered'] = True
-                    sl = active_trade['sl']
-                    log_msg += f" | Trailing SL Updated to {sl:.2f} for {active_trade['type']}"
-                if price >= active_trade['target']:
-                    profit_loss = 4875
-                    log_msg += f" | Target Hit: Profit {profit_loss} for {active_trade['type']}"
-                    active_trade = None
-                elif price <= active_trade['sl']:
-                    if active_trade['trail_triggered']:
-                        profit_loss = 1950
-                        log_msg += f" | Trailing SL Hit: Profit {profit_loss} for {active_trade['type']}"
-                    else:
-                        profit_loss = -4875
-                        log_msg += f" | SL Hit: Loss {profit_loss} for {active_trade['type']}"
-                    active_trade = None
+                log_msg += f" | Trailing SL Updated to {sl:.2f} for {active_trade['type']}"
+            if price >= active_trade['target']:
+                profit_loss = 4875
+                log_msg += f" | Target Hit: Profit {profit_loss} for {active_trade['type']}"
+                active_trade = None
+            elif price <= active_trade['sl']:
+                if active_trade['trail_triggered']:
+                    profit_loss = 1950
+                    log_msg += f" | Trailing SL Hit: Profit {profit_loss} for {active_trade['type']}"
+                else:
+                    profit_loss = -4875
+                    log_msg += f" | SL Hit: Loss {profit_loss} for {active_trade['type']}"
+                active_trade = None
         logger.info(log_msg)
-        # Generate buy signals based on cash flow for options
-        if cash_flow_calculator and interval == "1min":  # Only generate signals on 1min candles
-            cash_flow_metrics = cash_flow_calculator.get_current_cash_metrics()
-            current_cash = cash_flow_metrics['cash']
-
-            if self.instrument_key == INSTRUMENTS["NIFTY_INDEX"]["key"]:  # Only process buy signals on NIFTY_INDEX
-                if current_cash > 0:  # Cash positive = Buy CE
-                    itm_options = cash_flow_calculator.get_itm_options(candle_to_process.close)
-                    if itm_options['itm_ce']:
-                        buy_recommendation = "BUY_CE"
-                        entry_price = itm_options['itm_ce']['last_price']
-                        target = entry_price + 10  # Fixed target for options
-                        sl = entry_price - 5  # Fixed SL for options
-                        logger.info(f"🎯 BUY SIGNAL [{interval}]: CE {itm_options['itm_ce']['strike']} @ {entry_price:.2f} | Cash: {current_cash:.4f}")
-
-                elif current_cash < 0:  # Cash negative = Buy PE
-                    itm_options = cash_flow_calculator.get_itm_options(candle_to_process.close)
-                    if itm_options['itm_pe']:
-                        buy_recommendation = "BUY_PE"
-                        entry_price = itm_options['itm_pe']['last_price']
-                        target = entry_price + 10  # Fixed target for options
-                        sl = entry_price - 5  # Fixed SL for options
-                        logger.info(f"🎯 BUY SIGNAL [{interval}]: PE {itm_options['itm_pe']['strike']} @ {entry_price:.2f} | Cash: {current_cash:.4f}")
-
         trend_data = {
-            'timestamp': candle_to_process.timestamp,
+            'timestamp': candle.timestamp,
             'candle_interval': interval,
-            'trend_value': trend_value,
-            'buy_recommendation': buy_recommendation,
+            'trend_value': self.trend_engine.trend(interval) if self.trend_engine else 0,
+            'buy_recommendation': None,
             'entry_price': entry_price,
             'target': target,
             'sl': sl,
             'profit_loss': profit_loss
         }
         self.db_manager.save_trend_instant(trend_data)
-        self._update_latest_candle(candle_to_process, interval, trend_data)
-        if interval == "1min":
-            self.active_trade_1min = active_trade
-        else:
-            self.active_trade_5min = active_trade
+        state.active_trade = active_trade
+        self.has_active_trade = any(state.active_trade for state in self.timeframes.values())
 
     def _update_latest_candle(self, candle: LiveCandle, interval: str, trend_data: dict):
         try:
-            instrument_config = next((config for config in INSTRUMENTS.values() if config["key"] == self.instrument_key), None)
-            if not instrument_config:
+            info = self.info
+            if not info:
                 return
-            instrument_name = self.instrument_key.split('|')[1] if '|' in self.instrument_key else self.instrument_key
-            if instrument_config["type"] == "OPTION":
-                option_type = instrument_config.get("option_type", "")
-                strike_price = instrument_config.get("strike_price", 0)
-                instrument_name = f"{instrument_name} {option_type} {strike_price}"
             price_change = candle.close - candle.open
             price_change_pct = (price_change / candle.open * 100) if candle.open > 0 else 0
             vwap = candle.atp if candle.atp > 0 else candle.close
             delta_pct = 0
-            if instrument_config["type"] == "OPTION" and candle.delta != 0:
+            if info.is_option and candle.delta != 0:
                 delta_pct = (candle.delta / candle.volume * 100) if candle.volume > 0 else 0
             latest_candle_data = {
                 'instrument_key': self.instrument_key,
-                'instrument_name': instrument_name,
-                'instrument_type': instrument_config["type"],
-                'strike_price': instrument_config.get("strike_price"),
-                'option_type': instrument_config.get("option_type"),
+                'instrument_name': info.display_name,
+                'instrument_type': info.type,
+                'strike_price': info.strike_price,
+                'option_type': info.option_type,
                 'timestamp': candle.timestamp,
                 'open': candle.open,
                 'high': candle.high,
@@ -1568,12 +2454,750 @@ class LockFreeTickProcessor:
                 'prev_close': getattr(candle, 'prev_close', None) or candle.open,
                 'intraday_high': candle.high,
                 'intraday_low': candle.low,
-                'last_updated': datetime.now(IST)
+                'last_updated': now_ist()
             }
             self.db_manager.save_latest_candle_instant(latest_candle_data)
         except Exception as e:
             logger.error(f"Error updating latest candle: {e}")
 
+# === TREND ENGINE ===
+class TrendEngine:
+    """NIFTY trend and buy recommendation, computed once per bar of each timeframe.
+
+    Fires when the NIFTY index and future bars starting at the same minute have both
+    closed, writes a single ``trend`` row and publishes the result. Every instrument's
+    latest_candles row for a bar is written with the trend of that bar; bars that
+    close before it is known wait in ``pending``. A bar amended by a late tick is
+    evaluated again (bar_amended) and its trend row updated in place.
+    """
+
+    def __init__(self, db_manager: LockFreeDatabaseManager, processors: dict):
+        self.db_manager = db_manager
+        self.index_proc = processors.get(REGISTRY.index_key)
+        self.future_proc = processors.get(REGISTRY.future_key)
+        self.enabled = self.index_proc is not None and self.future_proc is not None
+        self.closed: Dict[str, list] = {}  # interval -> [(start, bar) of the index, (start, bar) of the future]
+        self.published: Dict[str, Tuple[int, dict]] = {}  # interval -> (bar start, trend_data)
+        self.present: Dict[str, int] = {}
+        self.pending: Dict[str, list] = {}  # interval -> [(processor, start, bar)] waiting for their trend
+        self.trends: Dict[str, Dict[int, dict]] = {}  # interval -> {bar start: trend_data} of the last few bars
+        self.evaluations = 0
+
+    def trend(self, interval: str = "1min") -> int:
+        return self.present.get(interval, 0)
+
+    def bar_closed(self, proc: 'LockFreeTickProcessor', state: TimeframeState, start: int, candle: LiveCandle):
+        interval = state.interval
+        if not self.enabled:
+            proc._update_latest_candle(candle, interval, {})
+            return
+        published = self.published.get(interval)
+        if published is not None and start <= published[0]:
+            proc._update_latest_candle(candle, interval, published[1])
+        else:
+            pending = self.pending.setdefault(interval, [])
+            pending.append((proc, start, candle))
+            if pending[0][1] < start - 2 * state.minutes:
+                # The index or future stopped closing bars; don't hold the others back for it
+                self._flush(interval, start - 2 * state.minutes)
+        if proc is self.index_proc or proc is self.future_proc:
+            closed = self.closed.setdefault(interval, [None, None])
+            side = 0 if proc is self.index_proc else 1
+            closed[side] = (start, candle)
+            other = closed[1 - side]
+            if other is not None and other[0] == start:
+                self._evaluate(interval, start, closed[0][1], closed[1][1],
+                               self.index_proc.timeframes[interval].previous_ha,
+                               self.future_proc.timeframes[interval].previous_ha)
+
+    def bar_amended(self, proc: 'LockFreeTickProcessor', state: TimeframeState, entry: ClosedBar, latest: bool):
+        """Evaluate an amended NIFTY bar again; rewrite an amended bar's latest_candles row while it is the latest"""
+        interval = state.interval
+        start = entry.start
+        if not self.enabled:
+            if latest:
+                proc._update_latest_candle(entry.candle, interval, {})
+            return
+        if proc is self.index_proc or proc is self.future_proc:
+            index_bar = self.index_proc.timeframes[interval].closed_bar(start)
+            future_bar = self.future_proc.timeframes[interval].closed_bar(start)
+            if index_bar is not None and future_bar is not None:
+                self._evaluate(interval, start, index_bar.candle, future_bar.candle, index_bar.ha, future_bar.ha,
+                               amend=True)
+        published = self.published.get(interval)
+        # A bar still in pending is written with its amended values when its trend is published
+        if latest and published is not None and start <= published[0]:
+            proc._update_latest_candle(entry.candle, interval, published[1])
+
+    def _evaluate(self, interval: str, start: int, index_bar: LiveCandle, future_bar: LiveCandle,
+                  index_ha: Optional[HeikinAshiCandle], future_ha: Optional[HeikinAshiCandle], amend: bool = False):
+        trends = self.trends.setdefault(interval, {})
+        previous = trends.get(start) if amend else None
+        if previous is not None:
+            # Same bar again after a late tick: the trend may change, the recommendation stays as it was made
+            trend_value = self._trend_value(index_ha, future_ha, future_bar)
+            if trend_value is None or trend_value == previous['trend_value']:
+                return
+            trend_data = dict(previous, trend_value=trend_value, amend=True)
+            trends[start] = trend_data
+            self.db_manager.save_trend_instant(trend_data)
+            published = self.published.get(interval)
+            if published is not None and published[0] == start:
+                self.published[interval] = (start, trend_data)
+                self.present[interval] = trend_value
+            logger.info("TREND [%s] %s amended: %s", interval, index_bar.timestamp.strftime('%H:%M'), trend_value)
+            return
+        self.evaluations += 1
+        trend_value = 0
+        buy_recommendation = None
+        entry_price = None
+        target = None
+        sl = None
+        if not index_ha or not future_ha:
+            logger.info("TREND [%s] %s: NEUTRAL (HA not available)", interval, index_bar.timestamp)
+        else:
+            trend_value = self._trend_value(index_ha, future_ha, future_bar)
+            self.present[interval] = trend_value
+            trend_str = "UP" if trend_value == 1 else "DOWN" if trend_value == -1 else "NEUTRAL"
+            logger.info("TREND [%s] %s: %s", interval, index_bar.timestamp.strftime('%H:%M'), trend_str)
+            # Buy recommendation from the cash flow of the 60 options, on 1min bars only
+            if cash_flow_calculator and interval == "1min":
+                current_cash = cash_flow_calculator.get_current_cash_metrics()['cash']
+                if current_cash > 0:  # Cash positive = Buy CE
+                    itm_options = cash_flow_calculator.get_itm_options(index_bar.close)
+                    if itm_options['itm_ce']:
+                        buy_recommendation = "BUY_CE"
+                        entry_price = itm_options['itm_ce']['last_price']
+                        target = entry_price + 10  # Fixed target for options
+                        sl = entry_price - 5  # Fixed SL for options
+                        logger.info(f"🎯 BUY SIGNAL [{interval}]: CE {itm_options['itm_ce']['strike']} @ {entry_price:.2f} | Cash: {current_cash:.4f}")
+                elif current_cash < 0:  # Cash negative = Buy PE
+                    itm_options = cash_flow_calculator.get_itm_options(index_bar.close)
+                    if itm_options['itm_pe']:
+                        buy_recommendation = "BUY_PE"
+                        entry_price = itm_options['itm_pe']['last_price']
+                        target = entry_price + 10  # Fixed target for options
+                        sl = entry_price - 5  # Fixed SL for options
+                        logger.info(f"🎯 BUY SIGNAL [{interval}]: PE {itm_options['itm_pe']['strike']} @ {entry_price:.2f} | Cash: {current_cash:.4f}")
+        trend_data = {
+            'timestamp': index_bar.timestamp,
+            'candle_interval': interval,
+            'trend_value': trend_value,
+            'buy_recommendation': buy_recommendation,
+            'entry_price': entry_price,
+            'target': target,
+            'sl': sl,
+            'profit_loss': None
+        }
+        self.db_manager.save_trend_instant(trend_data)
+        trends[start] = trend_data
+        while len(trends) > CANDLE_AMEND_MINUTES + 2:
+            del trends[next(iter(trends))]
+        published = self.published.get(interval)
+        if published is None or start >= published[0]:
+            self.published[interval] = (start, trend_data)
+            self._flush(interval, start)
+
+    @staticmethod
+    def _trend_value(index_ha: Optional[HeikinAshiCandle], future_ha: Optional[HeikinAshiCandle],
+                     future_bar: LiveCandle) -> Optional[int]:
+        """1 when NIFTY index and future HA bars both point up, -1 when both down, 0 otherwise (None without HA)"""
+        if not index_ha or not future_ha:
+            return None
+        future_delta = future_bar.delta
+        index_up = index_ha.ha_open < index_ha.ha_close and index_ha.sar_trend == 1
+        index_down = index_ha.ha_open > index_ha.ha_close and index_ha.sar_trend == -1
+        future_up = future_delta > 0 and future_ha.sar_trend == 1 and future_ha.ha_open < future_ha.ha_close
+        future_down = future_delta < 0 and future_ha.sar_trend == -1 and future_ha.ha_open > future_ha.ha_close
+        if index_up and future_up:
+            return 1
+        if index_down and future_down:
+            return -1
+        return 0
+
+    def _flush(self, interval: str, upto: Optional[int]):
+        """Write the pending latest_candles rows of bars starting at or before ``upto`` (None = all)"""
+        pending = self.pending.get(interval)
+        if not pending:
+            return
+        trend_data = self.published[interval][1] if interval in self.published else {}
+        waiting = []
+        for proc, start, candle in pending:
+            if upto is None or start <= upto:
+                proc._update_latest_candle(candle, interval, trend_data)
+            else:
+                waiting.append((proc, start, candle))
+        self.pending[interval] = waiting
+
+    def flush(self):
+        """Write every pending row with the last published trend (market close or end of a replay)"""
+        for interval in list(self.pending):
+            self._flush(interval, None)
+
+    def checkpoint(self) -> dict:
+        return {
+            'closed': {interval: [None if side is None else (side[0], copy.copy(side[1])) for side in sides]
+                       for interval, sides in self.closed.items()},
+            'published': copy.deepcopy(self.published),
+            'present': dict(self.present),
+            'pending': {interval: [(proc.instrument_key, start, copy.copy(candle)) for proc, start, candle in pending]
+                        for interval, pending in self.pending.items()},
+            'trends': copy.deepcopy(self.trends),
+            'evaluations': self.evaluations
+        }
+
+    def restore(self, state: dict, processors: dict):
+        self.closed = state['closed']
+        self.published = state['published']
+        self.present = state['present']
+        self.pending = {interval: [(processors[key], start, candle) for key, start, candle in pending if key in processors]
+                        for interval, pending in state['pending'].items()}
+        self.trends = state['trends']
+        self.evaluations = state['evaluations']
+
+# === COLUMNAR CANDLE ENGINE ===
+# Rows of ColumnarCandleEngine.state, in LiveCandle field order
+(COL_OPEN, COL_HIGH, COL_LOW, COL_CLOSE, COL_VOLUME, COL_ATP, COL_DELTA, COL_MIN_DELTA, COL_MAX_DELTA,
+ COL_BUY_VOLUME, COL_SELL_VOLUME, COL_TICK_COUNT, COL_VTT_OPEN, COL_VTT_CLOSE) = range(14)
+CANDLE_COLUMNS = 14
+# Further rows: the instrument's last applied tick and its tick count
+(COL_PREVIOUS_LTP, COL_PREVIOUS_TICK_VTT, COL_PREVIOUS_VTT, COL_PREVIOUS_MS, COL_PROCESSED) = range(14, 19)
+STATE_ROWS = 19
+_PRICE_COLUMNS = [COL_OPEN, COL_HIGH, COL_LOW, COL_CLOSE, COL_ATP, COL_VTT_OPEN, COL_VTT_CLOSE]
+_COUNT_COLUMNS = [COL_VOLUME, COL_DELTA, COL_MIN_DELTA, COL_MAX_DELTA, COL_BUY_VOLUME, COL_SELL_VOLUME, COL_TICK_COUNT]
+# Rows of ColumnarCandleEngine.ha (previous 1min HA bar) and .sar (FastSAR state); NaN = none yet
+(HA_OPEN, HA_CLOSE) = range(2)
+(SAR_VALUE, SAR_EP, SAR_AF, SAR_TREND) = range(4)
+
+
+def _last_rows(mask: np.ndarray) -> np.ndarray:
+    """Positions in _stacked() for carrying values down the rows: row 0 picks each column's value before,
+    row k + 1 its value in the last of rows 0..k where ``mask`` is set (the value before while there is none)"""
+    frames, width = mask.shape
+    rows = np.zeros((frames + 1, width), dtype=np.int64)
+    np.multiply(mask, np.arange(width, (frames + 1) * width, width)[:, None], out=rows[1:])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    rows += np.arange(width)
+    return rows
+
+
+def _stacked(before: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Rows of ``values`` under a row of their values ``before``, flat for taking _last_rows() positions"""
+    return np.concatenate((before, values.ravel()))
+
+
+class ColumnarCandleEngine:
+    """Open 1min candles of every instrument held in NumPy columns indexed by registry id.
+
+    A frame's tick records update the last-tick rows (enough for current_close and the
+    late-tick check) with a few array operations instead of a process_live_tick() call
+    per tick; the candle columns take the queued frames together in _flush, before a
+    minute rolls over or anything else reads them, or every _PENDING_FRAMES frames.
+    Candles that close (minute rollover, close_before) are finalized together: one
+    read of their columns, Heikin Ashi and SAR of the HA instruments computed over
+    arrays (state mirrored in ``ha``/``sar``), and the candle and HA rows queued as
+    one batch. Each processor then does its trend, latest_candles row and 5min
+    roll-up, so the rows are the same as with the object engine.
+
+    Records of one frame must carry each instrument at most once (true for a feed map).
+    Ticks that sort before the instrument's last applied one (tick_order) are handed to
+    the processor's amend_tick, as in process_live_tick; it rebuilds the bars through
+    open_minute()/resume() and re-syncs the HA mirror through load_heikin_ashi().
+    """
+
+    # Per-instrument arrays saved by checkpoint(); the last axis is the registry id
+    _CHECKPOINT_ARRAYS = ('state', 'minute', 'is_open')
+    # Frames queued at most before the candle columns are brought up to date
+    _PENDING_FRAMES = 64
+
+    def __init__(self, processors: dict, db_manager: LockFreeDatabaseManager):
+        infos = list(REGISTRY)
+        size = len(infos)
+        self.db_manager = db_manager
+        self.key_ids = {info.key: info.id for info in infos}
+        self.procs: List[Optional[LockFreeTickProcessor]] = [None] * size
+        for info in infos:
+            proc = processors.get(info.key)
+            if proc is not None:
+                proc.engine = self
+                self.procs[info.id] = proc
+        is_future = np.array([info.is_future for info in infos], dtype=bool)
+        process_delta = np.array([bool(info.config.get("process_delta", False)) for info in infos], dtype=bool)
+        self.traded = np.array([not info.is_index for info in infos], dtype=bool)
+        self.delta = process_delta
+        self.delta_future = process_delta & is_future
+        # Candle and last-tick columns; integers (and ms) are kept as float64, exact far beyond any day's values
+        self.state = np.zeros((STATE_ROWS, size))
+        self.state[COL_PREVIOUS_LTP] = np.nan  # no tick yet
+        self.state[COL_PREVIOUS_TICK_VTT] = np.nan  # tick carried no vtt
+        self.minute = np.full(size, -1, dtype=np.int64)  # IST minute number of the last candle, -1 = none
+        self.is_open = np.zeros(size, dtype=bool)
+        # 1min Heikin Ashi/SAR of the instruments with process_heikin_ashi, mirrored from their TimeframeState
+        self.heikin_ashi = np.array([proc is not None and bool(proc.config.get("process_heikin_ashi", False))
+                                     for proc in self.procs], dtype=bool)
+        self.has_sar = np.array([proc is not None and proc.base.sar is not None for proc in self.procs], dtype=bool)
+        self.ha = np.full((2, size), np.nan)
+        self.sar = np.full((4, size), np.nan)
+        for instrument_id in np.flatnonzero(self.heikin_ashi).tolist():
+            self.load_heikin_ashi(instrument_id)
+        self.trading_ids = set()
+        self.frame_keys = ()
+        self.frame_ids = np.zeros(0, dtype=np.int64)
+        # Frames applied to the last-tick rows but not yet to the candles, and those rows before the first
+        self.pending = []
+        self.pending_last = None
+
+    def current_close(self, instrument_id: int) -> Optional[float]:
+        # An open candle's close is its last tick's ltp, kept up to date between flushes
+        return float(self.state[COL_PREVIOUS_LTP, instrument_id]) if self.is_open[instrument_id] else None
+
+    def open_minute(self, instrument_id: int) -> Optional[int]:
+        return int(self.minute[instrument_id]) if self.is_open[instrument_id] else None
+
+    def resume(self, instrument_id: int, candle: Optional[LiveCandle], last: tuple):
+        """Take over a candle rebuilt by LockFreeTickProcessor.amend_tick and its last tick"""
+        self._flush()
+        if candle is not None:
+            self.state[:CANDLE_COLUMNS, instrument_id] = [getattr(candle, name) for name in LiveCandle.__slots__[2:]]
+        ltp, tick_vtt, previous_vtt, ltt_ms = last
+        self.state[COL_PREVIOUS_LTP, instrument_id] = ltp
+        self.state[COL_PREVIOUS_TICK_VTT, instrument_id] = np.nan if tick_vtt is None else tick_vtt
+        self.state[COL_PREVIOUS_VTT, instrument_id] = np.nan if previous_vtt is None else previous_vtt
+        self.state[COL_PREVIOUS_MS, instrument_id] = (ltt_ms + IST_OFFSET_MS if self.is_open[instrument_id] else
+                                                      self._closed_bound(self.minute[instrument_id]))
+
+    @staticmethod
+    def _closed_bound(minute):
+        """previous_ms of a closed minute: every tick of it sorts before, none of the next minute does"""
+        return (minute + 1) * MINUTE_MS + 1000 - 0.5
+
+    def load_heikin_ashi(self, instrument_id: int):
+        """Mirror a processor's 1min HA/SAR state (at start, after a restore or an amendment redid it)"""
+        base = self.procs[instrument_id].base
+        previous = base.previous_ha
+        self.ha[:, instrument_id] = (previous.ha_open, previous.ha_close) if previous is not None else np.nan
+        sar = base.sar
+        if sar is not None:
+            self.sar[:, instrument_id] = [np.nan if value is None else value
+                                          for value in (sar.sar, sar.ep, sar.af, sar.trend)]
+
+    def apply(self, records: list):
+        """Apply one frame of (key, ltt_ms, ltp, atp, vtt, volume, prev_close) records.
+
+        Only the last-tick rows are updated at once; the frame is queued for the candle columns,
+        which _flush brings up to date before anything reads them.
+        """
+        if not records:
+            return
+        keys, ltt, ltp, atp, vtt, volume, _ = zip(*records)
+        count = len(keys)
+        # A feed sends its instruments in the same order frame after frame
+        if keys != self.frame_keys:
+            self.frame_keys = keys
+            self.frame_ids = np.fromiter(map(self.key_ids.__getitem__, keys), dtype=np.int64, count=count)
+        ids = self.frame_ids
+        local_ms = np.fromiter(ltt, dtype=np.int64, count=count) + IST_OFFSET_MS
+        ltp = np.fromiter(ltp, dtype=np.float64, count=count)
+        # A missing atp, vtt or volume becomes NaN
+        atp = np.array(atp, dtype=np.float64)
+        vtt = np.array(vtt, dtype=np.float64)
+        volume = np.array(volume, dtype=np.float64)
+
+        if not FEED_SIMULATION:
+            closed = local_ms % DAY_MS >= MARKET_END_MS_OF_DAY
+            if np.count_nonzero(closed):
+                self._market_closed(ids[closed])
+                on_time = ~closed
+                records = [record for record, keep in zip(records, on_time.tolist()) if keep]
+                ids, local_ms, ltp, atp, vtt, volume = (
+                    column[on_time] for column in (ids, local_ms, ltp, atp, vtt, volume))
+                if not len(ids):
+                    return
+
+        # Rows are indexed as views, state[row][ids]: NumPy's 1D fancy indexing keeps the GIL, where
+        # state[row, ids] would hand it to the database writer thread for a moment
+        state = self.state
+        minute = (local_ms - 1000) // MINUTE_MS
+        rolled = minute > self.minute[ids]
+        # Late or out of order: the last tick lies in the current minute, so an earlier minute sorts
+        # before it too; a closed minute's bound (see _finalize) is past all of its ticks
+        previous_ms = state[COL_PREVIOUS_MS][ids]
+        stale = local_ms <= previous_ms
+        if np.count_nonzero(stale):
+            stale &= (local_ms < previous_ms) | (vtt < state[COL_PREVIOUS_TICK_VTT][ids])
+            if np.count_nonzero(stale):
+                late = np.flatnonzero(stale)
+                for instrument_id, row in zip(ids[late].tolist(), late.tolist()):
+                    self.procs[instrument_id].amend_tick(records[row])
+                on_time = ~stale
+                ids, local_ms, minute, ltp, atp, vtt, volume, rolled = (
+                    column[on_time] for column in (ids, local_ms, minute, ltp, atp, vtt, volume, rolled))
+                if not len(ids):
+                    return
+        if np.count_nonzero(rolled):
+            self._flush()
+            finished = ids[rolled & self.is_open[ids]]
+            if len(finished):
+                self._finalize(finished)
+            self._open(ids[rolled], minute[rolled], ltp[rolled], atp[rolled], vtt[rolled])
+
+        if not self.pending:
+            self.pending_last = state[[COL_PREVIOUS_LTP, COL_PREVIOUS_TICK_VTT]]
+        self.pending.append((ids, ltp, atp, vtt, volume))
+        state[COL_PREVIOUS_LTP][ids] = ltp
+        state[COL_PREVIOUS_TICK_VTT][ids] = vtt
+        # Cast first: a casting assignment gives up the GIL as well
+        state[COL_PREVIOUS_MS][ids] = local_ms.astype(np.float64)
+        if len(self.pending) == self._PENDING_FRAMES:
+            self._flush()
+
+        if self.trading_ids:
+            self._manage_active_trades(ids, ltp, local_ms)
+
+    def _open(self, ids: np.ndarray, minute: np.ndarray, ltp: np.ndarray, atp: np.ndarray, vtt: np.ndarray):
+        """Start new candles for ``ids``, whose ticks rolled into a new minute"""
+        atp = np.where((atp == 0) | np.isnan(atp), ltp, atp)  # tick.atp or tick.ltp
+        vtt_open = np.nan_to_num(vtt)
+        self.minute[ids] = minute
+        self.is_open[ids] = True
+        candles = np.zeros((CANDLE_COLUMNS, len(ids)))
+        candles[COL_OPEN:COL_CLOSE + 1] = ltp
+        candles[COL_ATP] = atp
+        candles[COL_VTT_OPEN] = vtt_open
+        candles[COL_VTT_CLOSE] = vtt_open
+        self.state[:CANDLE_COLUMNS, ids] = candles
+        self.state[COL_PREVIOUS_VTT, ids] = vtt_open
+        # The higher-timeframe roll-up stays on the processor; it is touched once per instrument-minute
+        for instrument_id, candle_minute, price, average in zip(ids.tolist(), minute.tolist(), ltp.tolist(), atp.tolist()):
+            self.procs[instrument_id]._open_higher_bars(candle_minute, price, average)
+
+    def _flush(self):
+        """Apply the pending frames to the candle columns, as _update_candle_ultra_fast does one tick at a time.
+
+        Ticks are laid out with a row per frame and a column per instrument; the running values (the
+        previous tick's ltp and vtt, the last fresh vtt, volume, delta) are carried down the rows.
+        A repeated tick (same ltp and vtt as the previous one) only counts as processed: close, high,
+        low and vtt_close already hold its values, the other columns are masked with ``fresh``.
+        """
+        pending = self.pending
+        if not pending:
+            return
+        self.pending = []
+        frames = len(pending)
+        frame_ids, ltp, atp, vtt, volume = (np.concatenate(column) for column in zip(*pending))
+        np.copyto(atp, ltp, where=(atp == 0) | np.isnan(atp))  # tick.atp or tick.ltp
+        seen = np.zeros(len(self.is_open), dtype=bool)
+        seen[frame_ids] = True
+        ids = np.flatnonzero(seen)
+        width = len(ids)
+        at = (np.cumsum(seen) - 1)[frame_ids]
+        at += np.repeat(np.arange(0, frames * width, width), [len(frame[0]) for frame in pending])
+        present = np.zeros(frames * width, dtype=bool)
+        present[at] = True
+        present = present.reshape(frames, width)
+        ticks = np.full((4, frames * width), np.nan)
+        for column, values in zip(ticks, (ltp, atp, vtt, volume)):
+            column[at] = values
+        ltp, atp, vtt, volume = ticks.reshape(4, frames, width)
+        # Frames of every instrument update the state in place
+        columns = self.state if width == len(self.is_open) else self.state[:, ids]
+        last_ltp, last_tick_vtt = self.pending_last[:, ids]
+
+        ticked = _last_rows(present)
+        previous_ltp = _stacked(last_ltp, ltp).take(ticked)
+        columns[COL_CLOSE] = previous_ltp[-1]
+        previous_ltp = previous_ltp[:-1]
+        # Compared bit for bit, so a missing vtt (NaN) equals a missing vtt
+        previous_tick_vtt = _stacked(last_tick_vtt, vtt).take(ticked[:-1])
+        fresh = present & ((ltp != previous_ltp) | (vtt.view(np.int64) != previous_tick_vtt.view(np.int64)))
+        # fmax/fmin skip the NaN of frames without the instrument
+        np.maximum(columns[COL_HIGH], np.fmax.reduce(ltp, axis=0), out=columns[COL_HIGH])
+        np.minimum(columns[COL_LOW], np.fmin.reduce(ltp, axis=0), out=columns[COL_LOW])
+        refreshed = _last_rows(fresh)
+        columns[COL_ATP] = _stacked(columns[COL_ATP], atp).take(refreshed[-1])
+        columns[COL_TICK_COUNT] += np.count_nonzero(fresh, axis=0)
+        columns[COL_PROCESSED] += np.count_nonzero(present, axis=0)
+        vtt_close = _stacked(columns[COL_VTT_CLOSE], vtt).take(_last_rows(vtt == vtt)[1:])
+        columns[COL_VTT_CLOSE] = vtt_close[-1]
+        traded = self.traded[ids]
+        reported = traded & fresh & (volume == volume)
+        columns[COL_VOLUME] = _stacked(columns[COL_VOLUME], volume).take(_last_rows(reported)[-1])
+        no_volume = traded & (columns[COL_VOLUME] == 0)
+        if np.count_nonzero(no_volume):
+            # Each tick after the last reported volume falls back to the vtt increase since the open
+            # until that is non-zero
+            frame = np.arange(frames)[:, None]
+            since = np.max(np.where(reported, frame, 0), axis=0)
+            increase = np.maximum(0.0, np.trunc(vtt_close - columns[COL_VTT_OPEN]))
+            fallback = present & (frame >= since) & (increase > 0)
+            first = np.argmax(fallback, axis=0)
+            np.copyto(columns[COL_VOLUME], np.take_along_axis(increase, first[None], axis=0)[0],
+                      where=no_volume & fallback.any(axis=0))
+
+        # Order-flow delta from the vtt increase since the previous fresh tick
+        previous_vtt = _stacked(columns[COL_PREVIOUS_VTT], vtt).take(refreshed)
+        columns[COL_PREVIOUS_VTT] = previous_vtt[-1]
+        previous_vtt = previous_vtt[:-1]
+        vtt_change = vtt - previous_vtt
+        # A repeated tick has no vtt change, nor has the first tick of an instrument (previous_vtt is its vtt_open)
+        flow = (vtt_change > 0) & (previous_vtt > 0) & self.delta[ids]
+        if np.count_nonzero(flow):
+            quantity = np.trunc(vtt_change)
+            up = flow & (ltp > previous_ltp)
+            down = flow & (ltp < previous_ltp)
+            buy = np.where(up, quantity, 0.0)
+            sell = np.where(down, quantity, 0.0)
+            # Every candle opens with delta = buy_volume - sell_volume = 0 and a split instrument's delta stays
+            # their difference, so one running sum serves both delta styles
+            delta = columns[COL_DELTA] + np.cumsum(buy - sell, axis=0)
+            columns[COL_DELTA] = delta[-1]
+            # Between flows delta holds, and min_delta <= delta <= max_delta before the first
+            np.minimum(columns[COL_MIN_DELTA], delta.min(axis=0), out=columns[COL_MIN_DELTA])
+            np.maximum(columns[COL_MAX_DELTA], delta.max(axis=0), out=columns[COL_MAX_DELTA])
+            # An unchanged price splits a future's volume between buyers and sellers, leaving its delta as it is
+            flat = flow & ~(up | down) & self.delta_future[ids]
+            if np.count_nonzero(flat):
+                half = np.trunc(vtt_change / 2)
+                np.copyto(buy, half, where=flat)
+                np.copyto(sell, quantity - half, where=flat)
+            columns[COL_BUY_VOLUME] += buy.sum(axis=0)
+            columns[COL_SELL_VOLUME] += sell.sum(axis=0)
+        if columns is not self.state:
+            self.state[:, ids] = columns
+
+    def _heikin_ashi(self, ids: np.ndarray, candles: np.ndarray) -> np.ndarray:
+        """HA bars of closing candles and the SAR over them, as _calculate_heikin_ashi_fast and FastSAR.update
+        compute them one at a time; advances the ``ha``/``sar`` mirror.
+
+        Returns rows ha_open, ha_high, ha_low, ha_close, hlc3 and the SAR's value, ep, af, trend
+        (NaN for instruments without process_indicators).
+        """
+        open_, high, low, close = candles[COL_OPEN], candles[COL_HIGH], candles[COL_LOW], candles[COL_CLOSE]
+        previous_open, previous_close = self.ha[:, ids]
+        ha_close = (open_ + high + low + close) * 0.25
+        ha_open = np.where(np.isnan(previous_open), (open_ + close) * 0.5, (previous_open + previous_close) * 0.5)
+        ha_high = np.maximum(np.maximum(high, ha_open), ha_close)
+        ha_low = np.minimum(np.minimum(low, ha_open), ha_close)
+        hlc3 = (ha_high + ha_low + ha_close) / 3.0
+        self.ha[HA_OPEN, ids] = ha_open
+        self.ha[HA_CLOSE, ids] = ha_close
+
+        value, ep, af, trend = self.sar[:, ids]
+        stepped = value + af * (ep - value)
+        up = trend == 1
+        to_down = up & (stepped > ha_low)
+        to_up = ~up & (stepped < ha_high)
+        reversed_ = to_down | to_up
+        extreme = np.where(up, ha_high, ha_low)
+        extended = ~reversed_ & np.where(up, ha_high > ep, ha_low < ep)
+        sar = np.array([
+            np.where(reversed_, ep, stepped),
+            np.where(to_down, ha_low, np.where(to_up, ha_high, np.where(extended, extreme, ep))),
+            np.where(reversed_, SAR_START, np.where(extended, np.minimum(af + SAR_INCREMENT, SAR_MAXIMUM), af)),
+            np.where(to_down, -1.0, np.where(to_up, 1.0, trend))
+        ])
+        # The first bar only starts the SAR at its low/high
+        first = np.isnan(value)
+        sar[SAR_VALUE, first] = ha_low[first]
+        sar[SAR_EP, first] = ha_high[first]
+        sar[SAR_AF, first] = af[first]
+        sar[SAR_TREND, first] = trend[first]
+        with_sar = self.has_sar[ids]
+        sar[:, ~with_sar] = np.nan
+        self.sar[:, ids] = sar
+        return np.vstack((ha_open, ha_high, ha_low, ha_close, hlc3, sar))
+
+    def _finalize(self, ids: np.ndarray):
+        """Close the open candles of ``ids`` together: one read of their columns, HA/SAR over arrays and
+        the candle and HA rows queued as one batch; then each processor's trend, latest row and roll-up"""
+        self._flush()
+        self.is_open[ids] = False
+        candles = self.state[:, ids]
+        self.state[COL_PREVIOUS_MS, ids] = self._closed_bound(self.minute[ids])
+        heikin_ashi = np.flatnonzero(self.heikin_ashi[ids])
+        ha_rows = {}
+        if len(heikin_ashi):
+            ha_rows = dict(zip(heikin_ashi.tolist(), self._heikin_ashi(ids[heikin_ashi], candles[:, heikin_ashi]).T.tolist()))
+        prices = candles[_PRICE_COLUMNS].T.tolist()
+        counts = candles[_COUNT_COLUMNS].astype(np.int64).T.tolist()
+        minutes = self.minute[ids].tolist()
+        processed = self.state[COL_PROCESSED, ids].astype(np.int64).tolist()
+        closed = []
+        bars = []
+        ha_bars = []
+        for position, instrument_id in enumerate(ids.tolist()):
+            proc = self.procs[instrument_id]
+            minute = minutes[position]
+            open_, high, low, close, atp, vtt_open, vtt_close = prices[position]
+            volume, delta, min_delta, max_delta, buy_volume, sell_volume, tick_count = counts[position]
+            candle = LiveCandle(
+                instrument_key=proc.instrument_key, timestamp=minute_datetime(minute),
+                open=open_, high=high, low=low, close=close, volume=volume, atp=atp,
+                delta=delta, min_delta=min_delta, max_delta=max_delta,
+                buy_volume=buy_volume, sell_volume=sell_volume, tick_count=tick_count,
+                vtt_open=vtt_open, vtt_close=vtt_close
+            )
+            proc.current_minute = minute
+            proc.processed_ticks = processed[position]
+            proc._log_candle("1min", candle)
+            bars.append(candle)
+            state = proc.base
+            entry = state.keep(minute, candle)
+            ha = ha_rows.get(position)
+            if ha is not None:
+                if entry is not None:
+                    entry.before = state.snapshot()
+                ha_open, ha_high, ha_low, ha_close, hlc3, sar, ep, af, trend = ha
+                ha_candle = HeikinAshiCandle(
+                    instrument_key=proc.instrument_key, timestamp=candle.timestamp,
+                    ha_open=ha_open, ha_high=ha_high, ha_low=ha_low, ha_close=ha_close,
+                    volume=volume, hlc3=hlc3
+                )
+                if state.sar:
+                    state.sar.sar, state.sar.ep, state.sar.af = sar, ep, af
+                    state.sar.trend = ha_candle.sar_trend = int(trend)
+                if state.indicators:
+                    values = state.indicators.update(ha_high, ha_low, ha_close)
+                    ha_candle.macd = values['macd']
+                    ha_candle.macd_signal = values['macd_signal']
+                proc._log_heikin_ashi("1min", ha_candle)
+                state.previous_ha = ha_candle
+                if entry is not None:
+                    entry.ha = ha_candle
+                ha_bars.append(ha_candle)
+            closed.append((proc, minute, candle))
+        self.db_manager.save_candles_instant(bars)
+        if ha_bars:
+            self.db_manager.save_ha_candles_instant(ha_bars)
+        for proc, minute, candle in closed:
+            try:
+                proc._close_base_bar(minute, candle)
+            except Exception as e:
+                logger.error(f"Error finalizing candle: {e}")
+        self.trading_ids = {instrument_id for instrument_id, proc in enumerate(self.procs)
+                            if proc and proc.has_active_trade}
+
+    def checkpoint(self) -> dict:
+        self._flush()
+        state = {name: getattr(self, name).copy() for name in self._CHECKPOINT_ARRAYS}
+        state['keys'] = sorted(self.key_ids, key=self.key_ids.get)
+        return state
+
+    def restore(self, state: dict):
+        """Copy the saved columns back, matched by instrument key (the registry ids may have moved);
+        the HA mirror is read from the processors, restored before"""
+        self.pending = []
+        pairs = [(old_id, self.key_ids[key]) for old_id, key in enumerate(state['keys']) if key in self.key_ids]
+        if pairs:
+            old_ids, new_ids = (np.array(ids, dtype=np.int64) for ids in zip(*pairs))
+            for name in self._CHECKPOINT_ARRAYS:
+                getattr(self, name)[..., new_ids] = state[name][..., old_ids]
+        for instrument_id in np.flatnonzero(self.heikin_ashi).tolist():
+            self.load_heikin_ashi(instrument_id)
+        self.trading_ids = {instrument_id for instrument_id, proc in enumerate(self.procs)
+                            if proc and proc.has_active_trade}
+
+    def close_before(self, end_minute: int) -> int:
+        """Finalize every open candle of a minute before ``end_minute``"""
+        due = np.flatnonzero(self.is_open & (self.minute < end_minute))
+        if len(due):
+            self._finalize(due)
+        return len(due)
+
+    def finalize_all(self):
+        open_ids = np.flatnonzero(self.is_open)
+        if len(open_ids):
+            self._finalize(open_ids)
+        for instrument_id, ticks in enumerate(self.state[COL_PROCESSED].astype(np.int64).tolist()):
+            if self.procs[instrument_id]:
+                self.procs[instrument_id].processed_ticks = ticks
+
+    def _market_closed(self, ids: np.ndarray):
+        logger.info(f"🏁 Market hours ended at 3:30 PM IST - Finalizing last candles")
+        open_ids = ids[self.is_open[ids]]
+        if len(open_ids):
+            self._finalize(open_ids)
+        for instrument_id in ids.tolist():
+            self.procs[instrument_id].finalize_higher_bars()
+        request_shutdown()
+
+    def _manage_active_trades(self, ids: np.ndarray, ltp: np.ndarray, local_ms: np.ndarray):
+        for instrument_id, price, moment in zip(ids.tolist(), ltp.tolist(), local_ms.tolist()):
+            if instrument_id in self.trading_ids:
+                proc = self.procs[instrument_id]
+                tick = TICK_POOL.acquire(proc.instrument_key, proc.instrument_type, moment - IST_OFFSET_MS, price)
+                proc._manage_active_trades_tick(tick)
+                TICK_POOL.release([tick])
+                if not proc.has_active_trade:
+                    self.trading_ids.discard(instrument_id)
+
+# === CANDLE CLOSE SCHEDULER ===
+class CandleCloseScheduler:
+    """Closes bars shortly after their minute boundary even if the instrument never ticks again.
+
+    Open bars are filed in a timer wheel keyed by the minute id they end at, so a
+    boundary pops one slot instead of every instrument keeping its own timer. A bar
+    ending at minute E is due once the clock is grace_ms past E (plus the 1s shift of
+    candle_minute_id). With a ColumnarCandleEngine the open 1min candles are closed
+    with one array comparison and only higher-timeframe bars go through the wheel.
+    """
+
+    def __init__(self, grace_ms: int = None, engine: Optional[ColumnarCandleEngine] = None):
+        self.grace_ms = CANDLE_CLOSE_GRACE_MS if grace_ms is None else grace_ms
+        self.engine = engine
+        self._slots: Dict[int, list] = {}  # end minute id -> [(processor, state or None for 1min, start)]
+        self._ends: List[int] = []  # heap of the slot keys
+        self.closed_end: Optional[int] = None  # bars ending at or before this minute id are closed
+        self.closed_bars = 0
+
+    def schedule(self, proc: LockFreeTickProcessor, state: Optional[TimeframeState], start: int):
+        end = start + (state.minutes if state is not None else 1)
+        slot = self._slots.get(end)
+        if slot is None:
+            slot = self._slots[end] = []
+            heapq.heappush(self._ends, end)
+        slot.append((proc, state, start))
+
+    def schedule_open_bars(self, processors: dict):
+        """File the bars a restored checkpoint left open; those already due close on the next advance()"""
+        for proc in processors.values():
+            if proc.current_candle is not None:
+                self.schedule(proc, None, proc.current_minute)
+            for state in proc.higher:
+                if state.candle is not None:
+                    self.schedule(proc, state, state.start)
+
+    def due_end(self, epoch_ms: int) -> int:
+        """Latest bar end minute id that is due at ``epoch_ms``"""
+        return (epoch_ms + IST_OFFSET_MS - 1000 - self.grace_ms) // MINUTE_MS
+
+    def seconds_until_next(self, epoch_ms: int) -> float:
+        next_due_ms = (self.due_end(epoch_ms) + 1) * MINUTE_MS - IST_OFFSET_MS + 1000 + self.grace_ms
+        return (next_due_ms - epoch_ms) / 1000
+
+    def advance(self, epoch_ms: int) -> int:
+        """Close every bar due at ``epoch_ms``; an integer compare between boundaries"""
+        end = self.due_end(epoch_ms)
+        if self.closed_end is not None and end <= self.closed_end:
+            return 0
+        self.closed_end = end
+        closed = self.engine.close_before(end) if self.engine is not None else 0
+        ends, slots = self._ends, self._slots
+        while ends and ends[0] <= end:
+            slot = slots.pop(heapq.heappop(ends))
+            # Shortest timeframe first, so each bar is rolled up before its parent closes
+            slot.sort(key=lambda entry: entry[1].minutes if entry[1] is not None else 1)
+            for proc, state, start in slot:
+                if state is None:
+                    if proc.current_candle is not None and proc.current_minute == start:
+                        proc._finalize_current_candle()
+                        closed += 1
+                elif state.candle is not None and state.start == start:
+                    proc._finalize_bar(state)
+                    closed += 1
+        self.closed_bars += closed
+        return closed
+
 # === ENHANCED OPTION TRACKER WITH SPECIFIC P&L LOGIC ===
 class OptionTracker:
     def __init__(self, db_manager):
@@ -1581,6 +3205,16 @@ class OptionTracker:
         self.active_positions = {}  # {option_key: position_data}
         self.quantity = 975  # Fixed quantity as specified
 
+    def checkpoint(self) -> dict:
+        return {'active_positions': copy.deepcopy(self.active_positions)}
+
+    def restore(self, state: dict):
+        self.active_positions = state['active_positions']
+        signal_ids = [position['signal_id'] for position in self.active_positions.values()
+                      if position.get('signal_id') is not None]
+        if signal_ids:
+            self.db_manager.reserve_signal_ids(max(signal_ids) + 1)
+
     def start_tracking(self, signal_data, option_key):
         """Start tracking a bought option with specific P&L rules"""
         # Get current option price as entry price
@@ -1600,7 +3234,7 @@ class OptionTracker:
             'trail_triggered': False,
             'quantity': self.quantity,
             'status': 'ACTIVE',
-            'entry_time': datetime.now(IST)
+            'entry_time': now_ist()
         }
 
         self.active_positions[option_key] = position
@@ -1652,8 +3286,9 @@ class OptionTracker:
             return 0
 
         # Get current candle LTP (NO ATR calculation needed)
-        if hasattr(processor, 'current_candle') and processor.current_candle:
-            return processor.current_candle.close
+        current_price = processor.current_close()
+        if current_price is not None:
+            return current_price
 
         logger.warning(f"⚠️ No current price available for option: {option_key}")
         return 0
@@ -1666,7 +3301,7 @@ class OptionTracker:
         position['status'] = exit_reason
         position['exit_price'] = exit_price
         position['pnl'] = pnl
-        position['exit_time'] = datetime.now(IST)
+        position['exit_time'] = now_ist()
 
         # Calculate holding time
         holding_time = (position['exit_time'] - position['entry_time']).total_seconds() / 60
@@ -1680,34 +3315,8 @@ class OptionTracker:
             'status': exit_reason
         }
 
-        conn = sqlite3.connect(TRADING_DB, timeout=10.0)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO option_tracking (signal_id, timestamp, current_price, pnl, status)
-            VALUES (?, ?, ?, ?, ?)
-        """, (
-            tracking_data['signal_id'],
-            tracking_data['timestamp'],
-            tracking_data['current_price'],
-            tracking_data['pnl'],
-            tracking_data['status']
-        ))
-
-        # Update buy_signals table with final P&L
-        cursor.execute("""
-            UPDATE buy_signals
-            SET status = ?, entry_price = ?, target = ?, sl = ?
-            WHERE id = ?
-        """, (
-            exit_reason,
-            position['entry_price'],
-            position['target'],
-            position['trailing_sl'],
-            position['signal_id']
-        ))
-
-        conn.commit()
-        conn.close()
+        # Queued with the buy_signals update (final status, entry, target, SL) for the database writer thread
+        self.db_manager.save_tracking_instant(tracking_data, position)
 
         logger.info(f"🎯 {exit_reason}: {option_key}")
         logger.info(f"   💰 Entry: ₹{position['entry_price']:.2f} → Exit: ₹{exit_price:.2f}")
@@ -1726,6 +3335,18 @@ class BuySignalGenerator:
         self.last_signal_time = None
         self.signal_cooldown = 60  # 60 seconds between signals
 
+    def checkpoint(self) -> dict:
+        return {'active_signals': copy.deepcopy(self.active_signals), 'previous_trend': self.previous_trend,
+                'last_signal_time': self.last_signal_time, 'next_signal_id': self.db_manager.next_signal_id()}
+
+    def restore(self, state: dict):
+        self.active_signals = state['active_signals']
+        self.previous_trend = state['previous_trend']
+        self.last_signal_time = state['last_signal_time']
+        # The database may not have the latest signals yet (queued rows are lost on a crash)
+        if state.get('next_signal_id') is not None:
+            self.db_manager.reserve_signal_ids(state['next_signal_id'])
+
     def check_and_generate_signals(self, nifty_price, current_trend, interval='1min'):
         """Enhanced signal generation with trend change detection and interval-specific thresholds"""
         cash_metrics = self.cash_flow_calculator.get_current_cash_metrics()
@@ -1740,7 +3361,7 @@ class BuySignalGenerator:
             buy_threshold = 500000  # ±500K for 5-minute signals
 
         # Check for cooldown period
-        current_time = datetime.now(IST)
+        current_time = now_ist()
         if (self.last_signal_time and
             (current_time - self.last_signal_time).total_seconds() < self.signal_cooldown):
             return
@@ -1771,19 +3392,22 @@ class BuySignalGenerator:
                     self._check_neutral_signal_negative_to_neutral(current_cash, min_cash, max_cash, nifty_price)
 
         # BUY SIGNAL LOGIC with dynamic thresholds
+        signal_data = None
         if current_cash > buy_threshold:  # Positive cash = CE signal
             itm_options = self.cash_flow_calculator.get_itm_options(nifty_price)
             if itm_options['itm_ce']:
-                self._generate_ce_signal(itm_options['itm_ce'], current_cash, 'BUY', interval)
+                signal_data = self._generate_ce_signal(itm_options['itm_ce'], current_cash, 'BUY', interval)
 
         elif current_cash < -buy_threshold:  # Negative cash = PE signal
             itm_options = self.cash_flow_calculator.get_itm_options(nifty_price)
             if itm_options['itm_pe']:
-                self._generate_pe_signal(itm_options['itm_pe'], current_cash, 'BUY', interval)
+                signal_data = self._generate_pe_signal(itm_options['itm_pe'], current_cash, 'BUY', interval)
 
         # Update previous trend for next comparison (only for 1-minute)
         if interval == '1min':
             self.previous_trend = current_trend
+        # Signal data of a BUY signal, for the tracker
+        return signal_data
 
     def _check_sell_signal_positive_to_negative(self, current_cash, min_cash, max_cash, nifty_price):
         """Check sell signal when trend changes from positive to negative"""
@@ -1817,10 +3441,10 @@ class BuySignalGenerator:
                     self._generate_ce_signal(itm_options['itm_ce'], current_cash, 'SELL')
                     logger.info(f"🟢 SELL CE SIGNAL: Trend -→+ | Cash: {current_cash:.0f} (near max: {max_cash:.0f})")
 
-    def _generate_ce_signal(self, ce_option, cash, action_type):
+    def _generate_ce_signal(self, ce_option, cash, action_type, interval='1min'):
         """Generate CE signal and return signal data for tracking"""
         signal_data = {
-            'timestamp': datetime.now(IST).isoformat(),
+            'timestamp': now_ist().isoformat(),
             'signal_type': f'{action_type}_CE',
             'option_key': ce_option['instrument_key'],
             'strike': ce_option['strike'],
@@ -1829,42 +3453,21 @@ class BuySignalGenerator:
             'action': action_type
         }
 
-        # Save to database and get ID
-        conn = sqlite3.connect(TRADING_DB, timeout=10.0)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO buy_signals (timestamp, signal_type, option_key, strike, entry_price, target, sl, status, cash_flow)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            signal_data['timestamp'],
-            signal_data['signal_type'],
-            signal_data['option_key'],
-            signal_data['strike'],
-            0,  # Entry price will be set by tracker
-            0,  # Target will be set by tracker
-            0,  # Stop Loss will be set by tracker
-            signal_data['status'],
-            signal_data['cash_flow']
-        ))
-
-        # Get the inserted signal ID
-        signal_data['id'] = cursor.lastrowid
-
-        conn.commit()
-        conn.close()
-
-        self.last_signal_time = datetime.now(IST)
-        logger.info(f"🟢 {action_type} CE SIGNAL: {ce_option['strike']} @ Cash: {cash:.2f}")
+        # Queue for the database writer; the id is allocated up front (entry/target/SL are set by the tracker)
+        signal_data['id'] = self.db_manager.save_signal_instant(signal_data)
+
+        self.last_signal_time = now_ist()
+        logger.info(f"🟢 {action_type} CE SIGNAL ({interval}): {ce_option['strike']} @ Cash: {cash:.2f}")
 
         # Return signal data for tracking (only for BUY signals)
         if action_type == 'BUY':
             return signal_data
         return None
 
-    def _generate_pe_signal(self, pe_option, cash, action_type):
+    def _generate_pe_signal(self, pe_option, cash, action_type, interval='1min'):
         """Generate PE signal and return signal data for tracking"""
         signal_data = {
-            'timestamp': datetime.now(IST).isoformat(),
+            'timestamp': now_ist().isoformat(),
             'signal_type': f'{action_type}_PE',
             'option_key': pe_option['instrument_key'],
             'strike': pe_option['strike'],
@@ -1873,32 +3476,11 @@ class BuySignalGenerator:
             'action': action_type
         }
 
-        # Save to database and get ID
-        conn = sqlite3.connect(TRADING_DB, timeout=10.0)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO buy_signals (timestamp, signal_type, option_key, strike, entry_price, target, sl, status, cash_flow)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            signal_data['timestamp'],
-            signal_data['signal_type'],
-            signal_data['option_key'],
-            signal_data['strike'],
-            0,  # Entry price will be set by tracker
-            0,  # Target will be set by tracker
-            0,  # Stop Loss will be set by tracker
-            signal_data['status'],
-            signal_data['cash_flow']
-        ))
-
-        # Get the inserted signal ID
-        signal_data['id'] = cursor.lastrowid
-
-        conn.commit()
-        conn.close()
-
-        self.last_signal_time = datetime.now(IST)
-        logger.info(f"🔴 {action_type} PE SIGNAL: {pe_option['strike']} @ Cash: {cash:.2f}")
+        # Queue for the database writer; the id is allocated up front (entry/target/SL are set by the tracker)
+        signal_data['id'] = self.db_manager.save_signal_instant(signal_data)
+
+        self.last_signal_time = now_ist()
+        logger.info(f"🔴 {action_type} PE SIGNAL ({interval}): {pe_option['strike']} @ Cash: {cash:.2f}")
 
         # Return signal data for tracking (only for BUY signals)
         if action_type == 'BUY':
@@ -1938,7 +3520,13 @@ class BuySignalGenerator:
 class OptionsTickCashFlowCalculator:
     """Cash flow calculator for options based on VTT changes"""
 
-    def __init__(self, selected_options_df):
+    # Minute and 5min bucket values saved by checkpoint() next to the last_ltp/last_vtt maps
+    _CHECKPOINT_FIELDS = ('cash', 'min_cash', 'max_cash', 'current_minute', 'open', 'high', 'low', 'close',
+                          'cash_5min', 'min_cash_5min', 'max_cash_5min', 'current_5min_start')
+
+    def __init__(self, selected_options_df, db_manager: Optional[LockFreeDatabaseManager] = None):
+        # Minute and 5-minute rows are queued on db_manager; without one (benchmarks) they are not saved
+        self.db_manager = db_manager
         if hasattr(selected_options_df, "iterrows"):
             option_rows = [row.to_dict() for _, row in selected_options_df.iterrows()]
         else:
@@ -1978,18 +3566,42 @@ class OptionsTickCashFlowCalculator:
         self.min_cash_5min = float('inf')
         self.max_cash_5min = float('-inf')
         self.current_5min_start = None
+        # Per-second/per-minute flow by side and strike over rolling windows
+        self.flow_windows = None
+        if CASH_FLOW_WINDOWS_ENABLED and self.options:
+            self.flow_windows = CashFlowWindows(self.options, CASH_FLOW_WINDOW_MINUTES, CASH_FLOW_WINDOW_SECONDS)
+        self._build_strike_index()
         logger.info("Cash Flow Calculator initialized (1-min & 5-min)")
 
-    def process_option_tick(self, instrument_key, ltp, vtt, timestamp):
+    def _build_strike_index(self):
+        """Sorted CE and PE strikes for get_itm_options; the first option listed wins a repeated strike"""
+        index = {'CE': {}, 'PE': {}}
+        for row in self.options.values():
+            by_strike = index.get(row['option_type'])
+            if by_strike is not None:
+                by_strike.setdefault(row['strike'], row)
+        self.ce_strikes = sorted(index['CE'])
+        self.ce_rows = [index['CE'][strike] for strike in self.ce_strikes]
+        self.pe_strikes = sorted(index['PE'])
+        self.pe_rows = [index['PE'][strike] for strike in self.pe_strikes]
+        self.strikes = sorted(set(self.ce_strikes) | set(self.pe_strikes))
+        # (low, high, itm_ce, itm_pe): the answer for any price strictly between two neighbouring strikes
+        self._itm_band = None
+
+    def process_option_tick(self, instrument_key, ltp, vtt, ltt_ms):
         """Process individual option tick and calculate cash flow using VTT changes"""
         if instrument_key not in self.options:
             return
         # Check for minute boundary
-        minute = timestamp.replace(second=0, microsecond=0)
+        minute = (ltt_ms + IST_OFFSET_MS) // MINUTE_MS
         if self.current_minute != minute:
-            if self.current_minute:
+            if self.current_minute is not None:
                 self._save_minute_data()
             self._reset_minute(minute)
+        if vtt is None:
+            # No vtt in the frame (decoded as None): not traded, as a NaN vtt in ColumnarCashFlowCalculator
+            self.last_ltp[instrument_key] = ltp
+            return
         # Get previous values
         prev_ltp = self.last_ltp.get(instrument_key, ltp)
         prev_vtt = self.last_vtt.get(instrument_key, vtt)
@@ -1998,20 +3610,27 @@ class OptionsTickCashFlowCalculator:
         if vtt_change > 0:
             ltp_change = ltp - prev_ltp
             option_type = self.options.get(instrument_key, {}).get('option_type', 'N/A')
+            flow = 0.0
             if option_type == 'CE':
                 if ltp_change > 0:  # CE buy side
                     cash_change = ltp * vtt_change
                     self.cash += cash_change
+                    flow = cash_change
                 elif ltp_change < 0:  # CE sell side
                     cash_change = ltp * vtt_change
                     self.cash -= cash_change
+                    flow = -cash_change
             elif option_type == 'PE':
                 if ltp_change > 0:  # PE buy side
                     cash_change = ltp * vtt_change
                     self.cash -= cash_change
+                    flow = -cash_change
                 elif ltp_change < 0:  # PE sell side
                     cash_change = ltp * vtt_change
                     self.cash += cash_change
+                    flow = cash_change
+            if flow and self.flow_windows is not None:
+                self.flow_windows.add(ltt_ms, self.flow_windows.slots[instrument_key], flow)
             # Update min/max tracking
             if self.cash < self.min_cash:
                 self.min_cash = self.cash
@@ -2021,11 +3640,16 @@ class OptionsTickCashFlowCalculator:
         self.last_ltp[instrument_key] = ltp
         self.last_vtt[instrument_key] = vtt
 
-    def update_nifty_tick(self, timestamp, price):
+    def process_option_batch(self, keys, ltp, vtt, ltt_ms):
+        """Process one frame's option ticks (parallel sequences, frame order)"""
+        for instrument_key, price, volume, moment in zip(keys, ltp, vtt, ltt_ms):
+            self.process_option_tick(instrument_key, price, volume, moment)
+
+    def update_nifty_tick(self, ltt_ms, price):
         """Update NIFTY index OHLC for the minute"""
-        minute = timestamp.replace(second=0, microsecond=0)
+        minute = (ltt_ms + IST_OFFSET_MS) // MINUTE_MS
         if self.current_minute != minute:
-            if self.current_minute:
+            if self.current_minute is not None:
                 self._save_minute_data()
             self._reset_minute(minute)
         if self.open is None:
@@ -2046,9 +3670,9 @@ class OptionsTickCashFlowCalculator:
         self.close = None
 
         # Handle 5-minute bucket reset and aggregation
-        _5min_start = minute.replace(minute=(minute.minute // 5) * 5, second=0, microsecond=0)
+        _5min_start = minute - minute % 5
         if self.current_5min_start != _5min_start:
-            if self.current_5min_start:
+            if self.current_5min_start is not None:
                 self._aggregate_to_5min()  # Aggregate cash before saving
                 self._save_5min_data()
             self._reset_5min(_5min_start)
@@ -2072,52 +3696,44 @@ class OptionsTickCashFlowCalculator:
 
     def _save_5min_data(self):
         """Save 5-minute aggregated cash flow data"""
-        if not self.current_5min_start:
+        if self.current_5min_start is None or self.db_manager is None:
             return
         try:
-            conn = sqlite3.connect(TRADING_DB, timeout=10.0)
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO options_cash_flow (timestamp, interval_type, cash, min_cash, max_cash, total_options) VALUES (?, ?, ?, ?, ?, ?)",
-                (
-                    self.current_5min_start.strftime('%Y-%m-%d %H:%M:%S'),
-                    '5min',
-                    round(self.cash_5min, 4),
-                    round(self.min_cash_5min, 4),
-                    round(self.max_cash_5min, 4),
-                    len(self.options)
-                )
-            )
-            conn.commit()
-            conn.close()
-            logger.debug(f"Saved 5-min cash flow: {self.cash_5min:.4f} at {self.current_5min_start}")
+            self.db_manager.save_cash_flow_instant((
+                minute_datetime(self.current_5min_start).strftime('%Y-%m-%d %H:%M:%S'),
+                '5min',
+                round(self.cash_5min, 4),
+                round(self.min_cash_5min, 4),
+                round(self.max_cash_5min, 4),
+                len(self.options)
+            ))
+            logger.debug(f"Queued 5-min cash flow: {self.cash_5min:.4f} at {minute_datetime(self.current_5min_start)}")
         except Exception as e:
             logger.error(f"Database error in 5-min cash flow save: {e}")
 
     def _save_minute_data(self):
         """Save current minute data to database"""
-        if not self.current_minute or self.open is None:
+        if self.current_minute is None or self.open is None or self.db_manager is None:
             return
         try:
-            # Direct database connection using TRADING_DB path
-            conn = sqlite3.connect(TRADING_DB, timeout=10.0)
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO options_cash_flow (timestamp, interval_type, cash, min_cash, max_cash, total_options) VALUES (?, ?, ?, ?, ?, ?)",
-                (
-                    self.current_minute.strftime('%Y-%m-%d %H:%M:%S'),
-                    '1min',
-                    round(self.cash, 4),
-                    round(self.min_cash, 4),
-                    round(self.max_cash, 4),
-                    len(self.options)
-                )
-            )
-            conn.commit()
-            conn.close()
+            # Queued for the database writer thread
+            self.db_manager.save_cash_flow_instant((
+                minute_datetime(self.current_minute).strftime('%Y-%m-%d %H:%M:%S'),
+                '1min',
+                round(self.cash, 4),
+                round(self.min_cash, 4),
+                round(self.max_cash, 4),
+                len(self.options)
+            ))
         except Exception as e:
             logger.error(f"Database error in cash flow save: {e}")
-            logger.error(f"Cash data: timestamp={self.current_minute}, cash={self.cash}")
+            logger.error(f"Cash data: timestamp={minute_datetime(self.current_minute)}, cash={self.cash}")
+
+    def get_flow_windows(self, by_strike: bool = False) -> dict:
+        """Rolling cash flow sums and bucket min/max per window, by side (and strike); no database access"""
+        if self.flow_windows is None:
+            return {}
+        return self.flow_windows.snapshot(now_epoch_ms(), by_strike)
 
     def get_current_cash_metrics(self):
         """Get current cash flow metrics"""
@@ -2127,34 +3743,975 @@ class OptionsTickCashFlowCalculator:
             'max_cash': self.max_cash if self.max_cash != float('-inf') else 0.0
         }
 
-    def get_itm_options(self, nifty_price):
-        """Get 1st ITM CE and PE based on current NIFTY price"""
-        ce_options = [(key, row) for key, row in self.options.items()
-                     if row['option_type'] == 'CE' and row['strike'] < nifty_price]
-        pe_options = [(key, row) for key, row in self.options.items()
-                     if row['option_type'] == 'PE' and row['strike'] > nifty_price]
+    def checkpoint(self) -> dict:
+        state = {name: getattr(self, name) for name in self._CHECKPOINT_FIELDS}
+        state['last_ltp'] = dict(self.last_ltp)
+        state['last_vtt'] = dict(self.last_vtt)
+        state['flow_windows'] = self.flow_windows.state() if self.flow_windows is not None else None
+        return state
+
+    def restore(self, state: dict):
+        for name in self._CHECKPOINT_FIELDS:
+            setattr(self, name, state[name])
+        # Options no longer selected are dropped
+        self.last_ltp = {key: ltp for key, ltp in state['last_ltp'].items() if key in self.options}
+        self.last_vtt = {key: vtt for key, vtt in state['last_vtt'].items() if key in self.options}
+        if self.flow_windows is not None and state.get('flow_windows') is not None:
+            if not self.flow_windows.restore(state['flow_windows']):
+                logger.warning("Cash flow windows not restored - the selected options changed")
 
+    def get_itm_options(self, nifty_price):
+        """Get 1st ITM CE and PE based on current NIFTY price.
+
+        Bisects the sorted strike index; the answer is cached for the band between the two
+        strikes around the price, so it is only looked up again once the price crosses a strike.
+        """
+        band = self._itm_band
+        if band is not None and band[0] < nifty_price < band[1]:
+            return {'itm_ce': band[2], 'itm_pe': band[3]}
         # 1st ITM CE = highest strike below NIFTY
-        itm_ce = max(ce_options, key=lambda x: x[1]['strike']) if ce_options else None
-
+        position = bisect.bisect_left(self.ce_strikes, nifty_price)
+        itm_ce = self.ce_rows[position - 1] if position else None
         # 1st ITM PE = lowest strike above NIFTY
-        itm_pe = min(pe_options, key=lambda x: x[1]['strike']) if pe_options else None
+        position = bisect.bisect_right(self.pe_strikes, nifty_price)
+        itm_pe = self.pe_rows[position] if position < len(self.pe_rows) else None
+        strikes = self.strikes
+        position = bisect.bisect_left(strikes, nifty_price)
+        low = strikes[position - 1] if position else float('-inf')
+        high = strikes[position] if position < len(strikes) else float('inf')
+        # A price sitting on a strike is a band of its own and is not cached
+        if low < nifty_price < high:
+            self._itm_band = (low, high, itm_ce, itm_pe)
+        return {'itm_ce': itm_ce, 'itm_pe': itm_pe}
+
+class ColumnarCashFlowCalculator(OptionsTickCashFlowCalculator):
+    """OptionsTickCashFlowCalculator with the options mapped to array slots.
+
+    Last ltp/vtt live in NumPy arrays and each option's CE/PE sign is precomputed, so a
+    frame's option ticks are one gather, one signed flow vector and one cumulative sum.
+    Min/max cash are taken over the running cash after every traded tick, and the minute
+    rolls exactly where the per-tick path would roll it, so the saved rows are the same.
+    """
+
+    def __init__(self, selected_options_df, db_manager: Optional[LockFreeDatabaseManager] = None):
+        super().__init__(selected_options_df, db_manager)
+        self.slots = {key: slot for slot, key in enumerate(self.options)}
+        self.direction = np.array([1.0 if row['option_type'] == 'CE' else -1.0 if row['option_type'] == 'PE' else 0.0
+                                   for row in self.options.values()])
+        self.ltp_slots = np.full(len(self.slots), np.nan)  # NaN = no tick yet
+        self.vtt_slots = np.full(len(self.slots), np.nan)
+
+    def process_option_tick(self, instrument_key, ltp, vtt, ltt_ms):
+        self.process_option_batch((instrument_key,), (ltp,), (vtt,), (ltt_ms,))
+
+    def process_option_batch(self, keys, ltp, vtt, ltt_ms):
+        slots = self.slots
+        ids = [slots.get(key, -1) for key in keys]
+        if -1 in ids:
+            known = [i for i, slot in enumerate(ids) if slot >= 0]
+            if not known:
+                return
+            ids = [ids[i] for i in known]
+            ltp = [ltp[i] for i in known]
+            vtt = [vtt[i] for i in known]
+            ltt_ms = [ltt_ms[i] for i in known]
+        first_minute = (min(ltt_ms) + IST_OFFSET_MS) // MINUTE_MS
+        if len(set(ids)) == len(ids) and (max(ltt_ms) + IST_OFFSET_MS) // MINUTE_MS == first_minute:
+            # The usual frame: every option once, all on the same minute
+            self._apply_minute(first_minute, np.array(ids), np.array(ltp, dtype=np.float64),
+                               np.array(vtt, dtype=np.float64), max(ltt_ms))
+            return
+        # Options twice in one batch need the previous tick's ltp/vtt, and ticks still on an older
+        # minute roll the minute like the per-tick path does: apply them in runs of distinct options
+        # on one minute
+        run = []
+        run_slots = set()
+        run_minute = None
+        for i, slot in enumerate(ids):
+            minute = (ltt_ms[i] + IST_OFFSET_MS) // MINUTE_MS
+            if minute != run_minute or slot in run_slots:
+                if run:
+                    self._apply_run(run_minute, run, ids, ltp, vtt, ltt_ms)
+                run = []
+                run_slots = set()
+                run_minute = minute
+            run.append(i)
+            run_slots.add(slot)
+        self._apply_run(run_minute, run, ids, ltp, vtt, ltt_ms)
+
+    def _apply_run(self, minute: int, run: list, ids, ltp, vtt, ltt_ms):
+        self._apply_minute(minute, np.array([ids[i] for i in run]), np.array([ltp[i] for i in run], dtype=np.float64),
+                           np.array([vtt[i] for i in run], dtype=np.float64), max(ltt_ms[i] for i in run))
+
+    def _apply_minute(self, minute: int, ids: np.ndarray, ltp: np.ndarray, vtt: np.ndarray, ltt_ms: int):
+        if self.current_minute != minute:
+            if self.current_minute is not None:
+                self._save_minute_data()
+            self._reset_minute(minute)
+        previous_ltp = self.ltp_slots[ids]
+        previous_vtt = self.vtt_slots[ids]
+        # NaN (first tick of an option, or no vtt) compares False: not traded
+        vtt_change = vtt - previous_vtt
+        traded = vtt_change > 0
+        if traded.any():
+            # CE buy side / PE sell side add, CE sell side / PE buy side subtract, unchanged price adds nothing
+            traded_ltp = ltp[traded]
+            flow = traded_ltp * vtt_change[traded] * (self.direction[ids[traded]] *
+                                                       np.sign(traded_ltp - previous_ltp[traded]))
+            if self.flow_windows is not None:
+                # Option slots of the calculator and the windows are the same (both enumerate self.options)
+                self.flow_windows.add_many(ltt_ms, ids[traded], flow)
+            # Running cash after each traded tick, summed in tick order like the per-tick path
+            flow[0] += self.cash
+            running = np.cumsum(flow)
+            self.cash = float(running[-1])
+            low = float(running.min())
+            high = float(running.max())
+            if low < self.min_cash:
+                self.min_cash = low
+            if high > self.max_cash:
+                self.max_cash = high
+        self.ltp_slots[ids] = ltp
+        self.vtt_slots[ids] = np.where(np.isnan(vtt), previous_vtt, vtt)
+
+    def checkpoint(self) -> dict:
+        # Same layout as the dict-backed calculator, so a checkpoint survives a CASH_FLOW_ENGINE change
+        state = super().checkpoint()
+        state['last_ltp'] = {key: ltp for key, ltp in zip(self.options, self.ltp_slots.tolist()) if ltp == ltp}
+        state['last_vtt'] = {key: vtt for key, vtt in zip(self.options, self.vtt_slots.tolist()) if vtt == vtt}
+        return state
+
+    def restore(self, state: dict):
+        super().restore(state)
+        for values, slots in ((self.last_ltp, self.ltp_slots), (self.last_vtt, self.vtt_slots)):
+            for key, value in values.items():
+                slots[self.slots[key]] = value
+            values.clear()
+
+# === FRAME DISPATCH ===
+class TickReorderWindow:
+    """Holds tick records for ``hold_ms`` of feed time and releases them in tick_order.
+
+    Jitter shorter than the window never reaches the bars. A record that sorts before
+    the last one released for its instrument comes back from push() as late; one equal
+    to it is a duplicate and dropped.
+    """
+
+    def __init__(self, hold_ms: int = None):
+        self.hold_ms = CANDLE_REORDER_MS if hold_ms is None else hold_ms
+        self.held: List[tuple] = []  # (ltt_ms, vtt order, sequence, record)
+        self.released: Dict[str, tuple] = {}  # key -> (ltt_ms, vtt order, record) last released
+        self.newest: Dict[str, tuple] = {}  # key -> (ltt_ms, vtt order) newest pushed
+        self.sequence = 0
+        self.reordered = 0
+        self.duplicates = 0
+
+    def push(self, records: list) -> list:
+        """Hold ``records``; returns those already too late for the window"""
+        late = []
+        released, newest, held = self.released, self.newest, self.held
+        for record in records:
+            key = record[0]
+            ltt_ms, vtt_order = order = tick_order(record)
+            last = released.get(key)
+            if last is not None and order < last[:2]:
+                late.append(record)
+                continue
+            top = newest.get(key)
+            if top is None or order > top:
+                newest[key] = order
+            elif order < top:
+                self.reordered += 1
+            self.sequence += 1
+            held.append((ltt_ms, vtt_order, self.sequence, record))
+        return late
+
+    def release(self, watermark_ms: Optional[int]) -> list:
+        """Records with ltt_ms <= ``watermark_ms`` (all with None), in tick_order"""
+        held = self.held
+        if not held:
+            return []
+        held.sort()
+        cut = len(held) if watermark_ms is None else bisect.bisect_right(held, watermark_ms, key=operator.itemgetter(0))
+        if not cut:
+            return []
+        ready = held[:cut]
+        del held[:cut]
+        released = self.released
+        records = []
+        for ltt_ms, vtt_order, _, record in ready:
+            last = released.get(record[0])
+            if last is not None and last[2] == record:
+                self.duplicates += 1
+                continue
+            released[record[0]] = (ltt_ms, vtt_order, record)
+            records.append(record)
+        return records
+
+    def checkpoint(self) -> dict:
+        return {'held': list(self.held), 'released': dict(self.released), 'newest': dict(self.newest),
+                'sequence': self.sequence, 'reordered': self.reordered, 'duplicates': self.duplicates}
+
+    def restore(self, state: dict):
+        self.held = state['held']
+        self.released = state['released']
+        self.newest = state['newest']
+        self.sequence = state['sequence']
+        self.reordered = state['reordered']
+        self.duplicates = state['duplicates']
+
+
+class TickDispatcher:
+    """Decode-once, dispatch-once fan-out of a frame to every tick consumer.
+
+    Each frame is read into compact tick records that wait in a TickReorderWindow;
+    released records become exactly one LiveTick per instrument and that same object
+    is handed to the candle processor, the cash flow calculator, the signal generator
+    and the option tracker. With a ColumnarCandleEngine the records stay records and
+    the engine applies them in one go.
+    """
+
+    def __init__(self, processors: dict, cash_flow_calculator=None, buy_signal_generator=None, option_tracker=None,
+                 engine: Optional[ColumnarCandleEngine] = None, close_scheduler: Optional[CandleCloseScheduler] = None,
+                 trend_engine: Optional[TrendEngine] = None):
+        self.processors = processors
+        self.engine = engine
+        self.close_scheduler = close_scheduler
+        self.trend_engine = trend_engine
+        self.cash_flow_calculator = cash_flow_calculator
+        self.buy_signal_generator = buy_signal_generator
+        self.option_tracker = option_tracker
+        self.nifty_key = REGISTRY.index_key
+        self.option_keys = REGISTRY.option_keys
+        self.reorder = TickReorderWindow()
+        self.frames = 0
+        self.ticks = 0
+        # Latest trade time received (epoch ms): the reorder window and boundary closes run on it
+        self.feed_ms: Optional[int] = None
+
+    def extract_ticks(self, decoded_data) -> List[LiveTick]:
+        """Single pass over the frame's feed map: one tick per known instrument"""
+        feeds = get_frame_feeds(decoded_data)
+        processors = self.processors
+        ticks = []
+        for key in feeds:
+            proc = processors.get(key)
+            if proc is None:
+                continue
+            tick = proc.extract_instrument_feed(feeds[key])
+            if tick:
+                ticks.append(tick)
+        return ticks
+
+    def extract_records(self, decoded_data) -> list:
+        """Single pass over the frame's feed map: one tick record per known instrument"""
+        feeds = get_frame_feeds(decoded_data)
+        processors = self.processors
+        if isinstance(decoded_data, pb.FeedResponse):
+            records = []
+            for key in feeds:
+                if key in processors:
+                    record = extract_feed_record(key, feeds[key])
+                    if record:
+                        records.append(record)
+            return records
+        ticks = self.extract_ticks(decoded_data)
+        records = [record_from_tick(tick) for tick in ticks]
+        self.release_ticks(ticks)
+        return records
+
+    def extract(self, decoded_data) -> list:
+        return self.extract_records(decoded_data)
+
+    def apply(self, records: list):
+        """Put a frame's records through the reorder window and apply what it releases"""
+        if records:
+            self.ticks += len(records)
+            frame_ms = max(record[1] for record in records)
+            if self.feed_ms is None or frame_ms > self.feed_ms:
+                self.feed_ms = frame_ms
+            processors = self.processors
+            for record in self.reorder.push(records):
+                processors[record[0]].amend_tick(record)
+        if self.feed_ms is None:
+            return
+        if not FEED_SIMULATION and (self.feed_ms + IST_OFFSET_MS) % DAY_MS >= MARKET_END_MS_OF_DAY:
+            # Past the close nothing comes to reorder against; let the close tick through now
+            self.release_held(None)
+        else:
+            self.release_held(self.feed_ms - self.reorder.hold_ms)
+        if self.close_scheduler is not None:
+            # By feed time and after the frame, so a backlog (or the frame itself) never turns
+            # ticks of the previous minute into late ticks
+            self.close_due_candles()
+
+    def release_held(self, watermark_ms: Optional[int]):
+        """Apply the window's records up to ``watermark_ms`` (None = all) in runs of one tick per instrument"""
+        records = self.reorder.release(watermark_ms)
+        if not records:
+            return
+        processors = self.processors
+        amend = CANDLE_LATE_TICKS == 'amend'
+        run = []
+        run_keys = set()
+        run_minute = None
+        for record in records:
+            key = record[0]
+            proc = processors.get(key)
+            if proc is None:
+                continue
+            if amend:
+                proc.recent_ticks.append(record)
+            # A run keeps one cash flow minute, so NIFTY still leads the options of its minute
+            minute = (record[1] + IST_OFFSET_MS) // MINUTE_MS
+            if key in run_keys or minute != run_minute:
+                if run:
+                    self._apply_run(run)
+                run = []
+                run_keys.clear()
+                run_minute = minute
+            run.append(record)
+            run_keys.add(key)
+        if run:
+            self._apply_run(run)
+
+    def _apply_run(self, records: list):
+        if self.engine:
+            self.apply_records(records)
+        else:
+            ticks = self.ticks_from_records(records)
+            self.apply_ticks(ticks)
+            self.release_ticks(ticks)
+
+    def flush(self):
+        """Apply every held record (end of the feed or a replay)"""
+        self.release_held(None)
+
+    def apply_records(self, records: list):
+        """Columnar counterpart of apply_ticks: the whole frame goes to the engine at once"""
+        cash_flow = self.cash_flow_calculator
+        if cash_flow:
+            for record in records:
+                if record[0] == self.nifty_key:
+                    if record[2] > 0:
+                        cash_flow.update_nifty_tick(record[1], record[2])
+                    break
+            option_keys = self.option_keys
+            options = [record for record in records if record[0] in option_keys]
+            if options:
+                keys, ltt_ms, ltp, _, vtt, _, _ = zip(*options)
+                cash_flow.process_option_batch(keys, ltp, vtt, ltt_ms)
+        self.engine.apply(records)
+
+    def apply_ticks(self, ticks: List[LiveTick]):
+        """Feed each tick to its candle processor and, for options, the cash flow calculator"""
+        cash_flow = self.cash_flow_calculator
+        if cash_flow:
+            # NIFTY index drives the cash flow minute OHLC, keep it ahead of the option ticks
+            for tick in ticks:
+                if tick.instrument_key == self.nifty_key:
+                    if tick.ltp > 0:
+                        cash_flow.update_nifty_tick(tick.ltt_ms, tick.ltp)
+                    break
+        processors = self.processors
+        for tick in ticks:
+            processors[tick.instrument_key].process_live_tick(tick)
+        if cash_flow:
+            option_keys = self.option_keys
+            options = [tick for tick in ticks if tick.instrument_key in option_keys]
+            if options:
+                cash_flow.process_option_batch([tick.instrument_key for tick in options], [tick.ltp for tick in options],
+                                               [tick.vtt for tick in options], [tick.ltt_ms for tick in options])
+
+    def close_due_candles(self, epoch_ms: Optional[int] = None) -> int:
+        """Close the bars whose minute ended (plus the grace period) by ``epoch_ms``, default the feed time"""
+        if epoch_ms is None:
+            epoch_ms = self.feed_ms
+        elif self.feed_ms is not None:
+            # Clock-driven close of a quiet feed: apply what the window holds for those minutes first
+            self.release_held(epoch_ms - self.reorder.hold_ms)
+        if self.close_scheduler is None or epoch_ms is None:
+            return 0
+        return self.close_scheduler.advance(epoch_ms)
 
+    def tick_quality(self) -> dict:
+        """Counts of ticks that arrived out of order: put back in order by the reorder window, dropped as
+        duplicates, amended into bars already built, too late to amend"""
+        processors = self.processors.values()
         return {
-            'itm_ce': itm_ce[1] if itm_ce else None,
-            'itm_pe': itm_pe[1] if itm_pe else None
+            'reordered': self.reorder.reordered,
+            'duplicate': self.reorder.duplicates + sum(proc.duplicate_ticks for proc in processors),
+            'amended': sum(proc.amended_ticks for proc in processors),
+            'late': sum(proc.late_ticks for proc in processors)
         }
 
+    def run_signals(self):
+        """Generate buy signals once per frame and start tracking any new position"""
+        if not (self.buy_signal_generator and self.cash_flow_calculator and self.option_tracker):
+            return
+        nifty_processor = self.processors.get(self.nifty_key)
+        current_nifty_price = nifty_processor.current_close() if nifty_processor else None
+        if current_nifty_price is not None:
+            current_trend = self.trend_engine.trend("1min") if self.trend_engine else 0
+
+            # Generate signals (returns signal_data for BUY signals)
+            signal_data = self.buy_signal_generator.check_and_generate_signals(current_nifty_price, current_trend)
+
+            # Start tracking if buy signal was generated
+            if signal_data and isinstance(signal_data, dict):
+                self.option_tracker.start_tracking(signal_data, signal_data['option_key'])
+
+    def run_tracker(self):
+        """Check all active option positions for target/SL hits"""
+        if self.option_tracker:
+            self.option_tracker.check_all_positions(self.processors)
+
+    def ticks_from_records(self, records: list) -> List[LiveTick]:
+        """Rebuild ticks from the compact records a feed shard extracted"""
+        processors = self.processors
+        ticks = []
+        for record in records:
+            proc = processors.get(record[0])
+            if proc is not None:
+                ticks.append(tick_from_record(record, proc.instrument_type))
+        return ticks
+
+    def release_ticks(self, ticks: List[LiveTick]):
+        """Hand the frame's ticks back to the pool once every consumer is done with them"""
+        TICK_POOL.release(ticks)
+
+    def dispatch_frame(self, records: list) -> int:
+        """Run one frame's tick records through every consumer"""
+        self.apply(records)
+        self.run_signals()
+        self.run_tracker()
+        self.frames += 1
+        return len(records)
+
+    def dispatch_records(self, records: list) -> int:
+        """Dispatch the compact records a feed shard extracted"""
+        return self.dispatch_frame(records)
+
+    def dispatch(self, decoded_data) -> int:
+        return self.dispatch_frame(self.extract(decoded_data))
+
+# === INGEST QUEUE ===
+class IngestQueue:
+    """Bounded queue of raw frames between the WebSocket reader and the processing tasks.
+
+    Frames are stamped with a monotonic receive time when queued so the
+    processing side can report how far it is lagging behind the feed.
+    """
+
+    OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+    def __init__(self, maxsize: int = None, overflow_policy: str = None):
+        maxsize = INGEST_QUEUE_SIZE if maxsize is None else maxsize
+        overflow_policy = overflow_policy or INGEST_OVERFLOW_POLICY
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            logger.warning(f"Unknown ingest overflow policy '{overflow_policy}' - using 'block'")
+            overflow_policy = 'block'
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.maxsize = maxsize
+        self.overflow_policy = overflow_policy
+        # Metrics
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self._lag_sum_ms = 0.0
+        self._lag_count = 0
+        # Receive times of the queued frames, oldest first
+        self._recv_times = deque()
+
+    async def put(self, frame, recv_ns: int = None):
+        item = (recv_ns or time.monotonic_ns(), frame)
+        queue = self.queue
+        if queue.full():
+            if self.overflow_policy == 'drop_newest':
+                self.dropped += 1
+                return
+            if self.overflow_policy == 'drop_oldest':
+                queue.get_nowait()
+                queue.task_done()
+                self._recv_times.popleft()
+                self.dropped += 1
+        if self.overflow_policy == 'block':
+            await queue.put(item)
+        else:
+            queue.put_nowait(item)
+        self._recv_times.append(item[0])
+        self.enqueued += 1
+        depth = queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    async def get_batch(self, max_items: int = None) -> list:
+        """Wait for one frame, then take whatever else is already queued up to max_items (default INGEST_BATCH_SIZE)"""
+        max_items = max_items or INGEST_BATCH_SIZE
+        queue = self.queue
+        batch = [await queue.get()]
+        while len(batch) < max_items and not queue.empty():
+            batch.append(queue.get_nowait())
+        recv_times = self._recv_times
+        for _ in batch:
+            recv_times.popleft()
+        return batch
+
+    def has_frames_before(self, recv_ns: int) -> bool:
+        """Whether a frame received (monotonic ns) before ``recv_ns`` is still waiting to be processed"""
+        return bool(self._recv_times) and self._recv_times[0] < recv_ns
+
+    def mark_processed(self, recv_ns: int):
+        lag_ms = (time.monotonic_ns() - recv_ns) / 1e6
+        self.last_lag_ms = lag_ms
+        if lag_ms > self.max_lag_ms:
+            self.max_lag_ms = lag_ms
+        self._lag_sum_ms += lag_ms
+        self._lag_count += 1
+        self.processed += 1
+        self.queue.task_done()
+
+    def metrics(self, reset_window: bool = False) -> dict:
+        """Depth and lag metrics; max/avg values cover the window since the last reset"""
+        data = {
+            'depth': self.queue.qsize(),
+            'capacity': self.maxsize,
+            'overflow_policy': self.overflow_policy,
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'last_lag_ms': round(self.last_lag_ms, 3),
+            'avg_lag_ms': round(self._lag_sum_ms / self._lag_count, 3) if self._lag_count else 0.0,
+            'max_lag_ms': round(self.max_lag_ms, 3)
+        }
+        if reset_window:
+            self.max_depth = self.queue.qsize()
+            self.max_lag_ms = 0.0
+            self._lag_sum_ms = 0.0
+            self._lag_count = 0
+        return data
+
+async def receive_frames(websocket, ingest_queue: IngestQueue) -> bool:
+    """Thin reader: pull frames off the socket and queue them. Returns True at market close."""
+    while not shutdown_event.is_set():
+        if ist_ms_of_day(now_epoch_ms()) >= MARKET_END_MS_OF_DAY and not FEED_SIMULATION:
+            logger.info("🕒 Market close at 3:30 PM IST - Initiating shutdown")
+            shutdown_event.set()
+            return True
+        try:
+            message = await asyncio.wait_for(websocket.recv(), timeout=10.0)
+        except asyncio.TimeoutError:
+            logger.warning("No messages received in 10 seconds - Check token/keys or market data flow")
+            continue
+        except websockets.ConnectionClosed as e:
+            logger.warning(f"WebSocket closed: {e} - Reconnecting")
+            return False
+        if message:
+            recv_ns = time.monotonic_ns()
+            if feed_journal:
+                feed_journal.capture(message, recv_ns)
+            await ingest_queue.put(message, recv_ns)
+    return False
+
+async def process_frames(ingest_queue: IngestQueue, dispatcher: TickDispatcher):
+    """Drain the ingest queue in batches, decoding and dispatching each frame"""
+    while True:
+        batch = await ingest_queue.get_batch()
+        for recv_ns, message in batch:
+            try:
+                if isinstance(message, list):
+                    # Tick records already extracted by a feed shard
+                    dispatcher.dispatch_records(message)
+                    continue
+                decoded_data = decode_v3_message(message)
+                if decoded_data:
+                    dispatcher.dispatch(decoded_data)
+            except Exception as e:
+                logger.error(f"Error processing frame: {e}")
+            finally:
+                ingest_queue.mark_processed(recv_ns)
+        # Give the reader and the WebSocket keepalive a turn between batches
+        await asyncio.sleep(0)
+
+async def close_candles_on_boundaries(dispatcher: TickDispatcher, ingest_queue: IngestQueue):
+    """Wake once per minute boundary (plus grace) and close bars that never got a closing tick.
+
+    Ticks close bars by their own trade times (TickDispatcher.apply); this is the fallback for a
+    quiet feed, so it waits until the frames received before the boundary have been applied.
+    """
+    scheduler = dispatcher.close_scheduler
+    while True:
+        await asyncio.sleep(scheduler.seconds_until_next(now_epoch_ms()))
+        boundary_ns = time.monotonic_ns()
+        while ingest_queue.has_frames_before(boundary_ns):
+            await asyncio.sleep(0.01)
+        try:
+            closed = dispatcher.close_due_candles(now_epoch_ms())
+            if closed:
+                logger.debug("Closed %d bars on the minute boundary", closed)
+        except Exception as e:
+            logger.error(f"Error closing candles on the minute boundary: {e}")
+
+async def report_pipeline_stats(ingest_queue: IngestQueue, dispatcher: TickDispatcher, interval: float = 60.0):
+    """Log throughput, queue depth and lag once per interval and export them to PIPELINE_METRICS_FILE"""
+    processors = dispatcher.processors
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            ingest = ingest_queue.metrics(reset_window=True)
+            total_ticks = sum(p.processed_ticks for p in processors.values())
+            tick_quality = dispatcher.tick_quality()
+            candle_q, ha_q, trend_q, latest_q, trading_q = db_manager.get_queue_sizes()
+            logger.info(f"LOCK-FREE Stats: Messages: {ingest['processed']} | Ticks: {total_ticks} | "
+                        f"Ingest: depth={ingest['depth']} max={ingest['max_depth']} dropped={ingest['dropped']} "
+                        f"lag avg={ingest['avg_lag_ms']:.1f}ms max={ingest['max_lag_ms']:.1f}ms | "
+                        f"Out of order: reordered={tick_quality['reordered']} amended={tick_quality['amended']} "
+                        f"late={tick_quality['late']} | "
+                        f"Queues: C={candle_q}, HA={ha_q}, Trend={trend_q}, Latest={latest_q}, Trading={trading_q}")
+            metrics = {
+                'timestamp': now_ist().isoformat(),
+                'ticks': total_ticks,
+                'tick_quality': tick_quality,
+                'ingest': ingest,
+                'cash_flow_windows': (dispatcher.cash_flow_calculator.get_flow_windows()
+                                      if dispatcher.cash_flow_calculator else {}),
+                'db_queues': {'candle': candle_q, 'ha': ha_q, 'trend': trend_q, 'latest': latest_q, 'trading': trading_q},
+                'logging': {'dropped': LOG_QUEUE_HANDLER.dropped if LOG_QUEUE_HANDLER else 0, 'suppressed': LOG_RATE_LIMITER.suppressed_total}
+            }
+            if feed_journal:
+                metrics['journal'] = feed_journal.stats()
+            tmp_path = PIPELINE_METRICS_FILE.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps(metrics), encoding='utf-8')
+            os.replace(tmp_path, PIPELINE_METRICS_FILE)
+        except Exception as e:
+            logger.error(f"Error reporting pipeline stats: {e}")
+
+# === FEED CONNECTION ===
+def create_feed_journal(prefix: str = "feed") -> Optional[FeedJournalWriter]:
+    if not FEED_CAPTURE_ENABLED:
+        return None
+    try:
+        return FeedJournalWriter(FEED_CAPTURE_DIR, prefix=prefix, compress=FEED_CAPTURE_COMPRESS,
+                                 rotate_mb=FEED_CAPTURE_ROTATE_MB)
+    except Exception as e:
+        logger.error(f"Feed capture disabled - could not open journal in {FEED_CAPTURE_DIR}: {e}")
+        return None
+
+async def wait_for_market_open():
+    if FEED_SIMULATION:
+        return
+    # Watch time: If outside hours, wait and check every minute
+    while not shutdown_event.is_set() and not is_market_hours():
+        now = now_ist()
+        logger.info(f"Outside market hours (IST {now.strftime('%H:%M:%S')}) - Watching for open. Next check in 1 min.")
+        await asyncio.sleep(60)
+        if now.weekday() >= 5:  # Skip weekends
+            logger.info("Weekend - Pausing watch until Monday")
+            await asyncio.sleep(3600)  # Check hourly on weekends
+
+async def run_single_feed(ingest_queue: IngestQueue) -> bool:
+    """One WebSocket connection for the whole universe. Returns True if stopped by market close."""
+    market_closed = False
+    connection_attempts = 0
+    max_attempts = 5
+    retry_delay = 1  # Initial retry delay for exponential backoff
+    while not shutdown_event.is_set() and connection_attempts < max_attempts:
+        await wait_for_market_open()
+        try:
+            connection_attempts += 1
+            logger.info(f"V3 WebSocket connection attempt {connection_attempts}")
+            auth_response = get_market_data_feed_authorize_v3()
+            if not auth_response or 'data' not in auth_response:
+                logger.error("Failed to get V3 WebSocket authorization - Check access token")
+                await asyncio.sleep(5)
+                continue
+            ws_url = auth_response['data']['authorized_redirect_uri']
+            async with connect_feed(ws_url) as websocket:
+                logger.info("V3 WebSocket connected successfully")
+                connection_attempts = 0
+                retry_delay = 1  # Reset backoff
+                await asyncio.sleep(1)
+                subscription_msg = create_v3_subscription_message(INSTRUMENT_KEYS, "full")
+                await websocket.send(subscription_msg)
+                logger.info(f"V3 Subscribed to {len(INSTRUMENT_KEYS)} instruments - Check keys if no data")
+                market_closed = await receive_frames(websocket, ingest_queue)
+        except Exception as e:
+            logger.error(f"Connection error (attempt {connection_attempts}): {e}")
+            if not shutdown_event.is_set():
+                logger.info(f"Reconnecting in {retry_delay} seconds...")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 60)  # Exponential backoff, max 60s
+    return market_closed
+
+# === SHARDED FEED ===
+def partition_instrument_keys(instrument_keys: List[str], shard_count: int) -> List[List[str]]:
+    """Round-robin the universe over shards so the strikes of one chain spread evenly"""
+    shard_count = max(1, min(shard_count, len(instrument_keys)))
+    return [instrument_keys[i::shard_count] for i in range(shard_count)]
+
+def feed_shard_settings() -> dict:
+    """The config a shard worker needs (v3_feed.run_feed_shard), passed to it instead of re-read"""
+    capture = None
+    if FEED_CAPTURE_ENABLED:
+        capture = {'directory': FEED_CAPTURE_DIR, 'compress': FEED_CAPTURE_COMPRESS, 'rotate_mb': FEED_CAPTURE_ROTATE_MB}
+    return {'access_token': ACCESS_TOKEN, 'auth_url': FEED_AUTH_URL, 'log_format': LOG_FORMAT,
+            'log_level': LOG_CONFIG.get('LEVEL', 'INFO'), 'capture': capture}
+
+class FeedShardPool:
+    """Splits the instrument universe across N WebSocket connections, one worker process each.
+
+    Workers do the socket I/O, protobuf parsing and tick extraction and ship
+    compact tick records back; a bridge thread feeds them into the ingest
+    queue so they merge into the same processors, cash flow and writer. Workers
+    run v3_feed.run_feed_shard with the settings they need passed in, so a
+    spawned process opens no log file and reads no config or instrument CSV.
+    """
+
+    def __init__(self, instrument_keys: List[str], shard_count: int):
+        self.context = multiprocessing.get_context('spawn')
+        self.shards = partition_instrument_keys(instrument_keys, shard_count)
+        self.result_queue = self.context.Queue(maxsize=INGEST_QUEUE_SIZE)
+        self.stop_event = self.context.Event()
+        self.settings = feed_shard_settings()
+        self.processes = [None] * len(self.shards)
+        self.bridge_thread = None
+        self.restarts = 0
+
+    def _spawn(self, shard_id: int):
+        process = self.context.Process(
+            target=run_feed_shard,
+            args=(shard_id, self.shards[shard_id], self.result_queue, self.stop_event, self.settings),
+            name=f"feed-shard-{shard_id}",
+            daemon=True
+        )
+        process.start()
+        self.processes[shard_id] = process
+        logger.info(f"Feed shard {shard_id} started (pid {process.pid}, {len(self.shards[shard_id])} instruments)")
+
+    def start(self, loop, ingest_queue: IngestQueue):
+        for shard_id in range(len(self.shards)):
+            self._spawn(shard_id)
+        self.bridge_thread = threading.Thread(target=self._bridge, args=(loop, ingest_queue), daemon=True)
+        self.bridge_thread.start()
+
+    def _bridge(self, loop, ingest_queue: IngestQueue):
+        while not self.stop_event.is_set():
+            try:
+                shard_id, recv_ns, records = self.result_queue.get(timeout=0.5)
+            except Empty:
+                continue
+            try:
+                asyncio.run_coroutine_threadsafe(ingest_queue.put(records, recv_ns), loop).result()
+            except Exception as e:
+                logger.error(f"Error forwarding shard {shard_id} ticks: {e}")
+
+    def restart_dead(self):
+        for shard_id, process in enumerate(self.processes):
+            if process is not None and not process.is_alive() and not self.stop_event.is_set():
+                logger.warning(f"Feed shard {shard_id} exited with code {process.exitcode} - Restarting")
+                self.restarts += 1
+                self._spawn(shard_id)
+
+    def stop(self, timeout: float = 10.0):
+        self.stop_event.set()
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout=timeout)
+                if process.is_alive():
+                    process.terminate()
+        if self.bridge_thread:
+            self.bridge_thread.join(timeout=2)
+
+async def run_sharded_feed(ingest_queue: IngestQueue, shard_count: int) -> bool:
+    """Run the feed over shard_count worker connections. Returns True if stopped by market close."""
+    await wait_for_market_open()
+    if shutdown_event.is_set():
+        return False
+    loop = asyncio.get_running_loop()
+    pool = FeedShardPool(INSTRUMENT_KEYS, shard_count)
+    pool.start(loop, ingest_queue)
+    logger.info(f"V3 feed sharded over {len(pool.shards)} connections for {len(INSTRUMENT_KEYS)} instruments")
+    market_closed = False
+    try:
+        while not shutdown_event.is_set():
+            if ist_ms_of_day(now_epoch_ms()) >= MARKET_END_MS_OF_DAY and not FEED_SIMULATION:
+                logger.info("🕒 Market close at 3:30 PM IST - Initiating shutdown")
+                shutdown_event.set()
+                market_closed = True
+                break
+            pool.restart_dead()
+            try:
+                await asyncio.wait_for(shutdown_event.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await loop.run_in_executor(None, pool.stop)
+    return market_closed
+
+# === PIPELINE ASSEMBLY ===
+def build_tick_pipeline(db, selected_options=None) -> 'TickDispatcher':
+    """Create the processors, cash flow calculator, signal generator and tracker and wire them to a dispatcher"""
+    global processors, cash_flow_calculator, buy_signal_generator, option_tracker
+    # Initialize cash flow calculator with selected options
+    if selected_options is None:
+        selected_options, _ = auto_select_options('extracted_data.csv')
+    if selected_options:
+        calculator_class = ColumnarCashFlowCalculator if CASH_FLOW_ENGINE == 'columnar' else OptionsTickCashFlowCalculator
+        cash_flow_calculator = calculator_class(selected_options, db)
+        # Initialize buy signal generator
+        buy_signal_generator = BuySignalGenerator(db, cash_flow_calculator)
+        # Initialize option tracker
+        option_tracker = OptionTracker(db)
+        logger.info(f"Cash flow calculator initialized with {len(selected_options)} options ({CASH_FLOW_ENGINE} engine)")
+        logger.info("✅ Buy signal generator initialized")
+        logger.info("✅ Option tracker initialized")
+    else:
+        cash_flow_calculator = None
+        buy_signal_generator = None
+        option_tracker = None
+        logger.warning("❌ No options selected - cash flow calculator and signal generator not initialized")
+
+    processors = {}
+    for info in REGISTRY:
+        processors[info.key] = LockFreeTickProcessor(info.key, info.config, db, processors)
+    trend_engine = TrendEngine(db, processors)
+    for proc in processors.values():
+        proc.trend_engine = trend_engine
+    engine = ColumnarCandleEngine(processors, db) if CANDLE_ENGINE == 'columnar' else None
+    close_scheduler = None
+    if CANDLE_CLOSE_ENABLED:
+        close_scheduler = CandleCloseScheduler(CANDLE_CLOSE_GRACE_MS, engine)
+        for proc in processors.values():
+            proc.close_scheduler = close_scheduler
+    logger.info(f"Lock-free processors ready for {len(processors)} instruments ({CANDLE_ENGINE} candle engine, "
+                f"boundary close {'+' + str(CANDLE_CLOSE_GRACE_MS) + 'ms' if close_scheduler else 'off'})")
+    return TickDispatcher(processors, cash_flow_calculator, buy_signal_generator, option_tracker, engine, close_scheduler,
+                          trend_engine)
+
+def finalize_open_candles(processors: dict):
+    """Close out every in-progress candle on every timeframe (market close or end of a replay)"""
+    engine = next((proc.engine for proc in processors.values() if proc.engine is not None), None)
+    if engine:
+        engine.finalize_all()
+    for proc in processors.values():
+        if proc.current_candle:
+            proc._finalize_current_candle()
+        proc.finalize_higher_bars()
+    trend_engine = next((proc.trend_engine for proc in processors.values() if proc.trend_engine is not None), None)
+    if trend_engine:
+        trend_engine.flush()
+
+# === CHECKPOINT ===
+CHECKPOINT_VERSION = 3
+
+def build_checkpoint(dispatcher: TickDispatcher) -> dict:
+    """Snapshot of every processor, the trend/candle engines and the cash flow, signal and tracker state.
+
+    Built on the event loop between frames, so it is consistent; everything mutable is copied,
+    so pickling and writing it can happen in a worker thread.
+    """
+    def consumer_state(consumer):
+        return consumer.checkpoint() if consumer is not None else None
+
+    return {
+        'version': CHECKPOINT_VERSION,
+        'session': now_ist().date().isoformat(),
+        'saved_ms': now_epoch_ms(),
+        'candle_engine': CANDLE_ENGINE,
+        'timeframes': list(TIMEFRAMES),
+        'processors': {key: proc.checkpoint() for key, proc in dispatcher.processors.items()},
+        'reorder': dispatcher.reorder.checkpoint(),
+        'feed_ms': dispatcher.feed_ms,
+        'engine': consumer_state(dispatcher.engine),
+        'trend_engine': consumer_state(dispatcher.trend_engine),
+        'cash_flow': consumer_state(dispatcher.cash_flow_calculator),
+        'signals': consumer_state(dispatcher.buy_signal_generator),
+        'tracker': consumer_state(dispatcher.option_tracker)
+    }
+
+def write_checkpoint(snapshot: dict, path: Path = None) -> int:
+    """Pickle a snapshot to ``path`` (default CHECKPOINT_FILE) atomically (temp file + rename); returns its size"""
+    path = path or CHECKPOINT_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+def restore_checkpoint(dispatcher: TickDispatcher, path: Path = None) -> bool:
+    """Resume from the last checkpoint (default CHECKPOINT_FILE) if it was written earlier in today's session"""
+    path = path or CHECKPOINT_FILE
+    if not path.exists():
+        return False
+    started = time.perf_counter()
+    try:
+        snapshot = pickle.loads(path.read_bytes())
+    except Exception as e:
+        logger.warning(f"Checkpoint {path} unreadable - starting fresh: {e}")
+        return False
+    today = now_ist().date().isoformat()
+    if snapshot.get('version') != CHECKPOINT_VERSION or snapshot.get('session') != today:
+        logger.info(f"Checkpoint of session {snapshot.get('session')} ignored - starting fresh for {today}")
+        return False
+    if snapshot['candle_engine'] != CANDLE_ENGINE or snapshot['timeframes'] != list(TIMEFRAMES):
+        logger.warning("Checkpoint ignored - candle engine or timeframes changed since it was written")
+        return False
+    processors = dispatcher.processors
+    restored = 0
+    for key, state in snapshot['processors'].items():
+        proc = processors.get(key)
+        if proc is not None:
+            proc.restore(state)
+            restored += 1
+    dispatcher.reorder.restore(snapshot['reorder'])
+    dispatcher.feed_ms = snapshot['feed_ms']
+    # After the processors: the engine re-reads their active trades
+    if dispatcher.engine is not None and snapshot['engine'] is not None:
+        dispatcher.engine.restore(snapshot['engine'])
+    if dispatcher.trend_engine is not None and snapshot['trend_engine'] is not None:
+        dispatcher.trend_engine.restore(snapshot['trend_engine'], processors)
+    for consumer, name in ((dispatcher.cash_flow_calculator, 'cash_flow'), (dispatcher.buy_signal_generator, 'signals'),
+                           (dispatcher.option_tracker, 'tracker')):
+        if consumer is not None and snapshot[name] is not None:
+            consumer.restore(snapshot[name])
+    if dispatcher.close_scheduler is not None:
+        dispatcher.close_scheduler.schedule_open_bars(processors)
+    age_s = (now_epoch_ms() - snapshot['saved_ms']) / 1000
+    logger.info(f"♻️ Restored checkpoint written {age_s:.1f}s ago: {restored}/{len(processors)} processors "
+                f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+    return True
+
+async def checkpoint_pipeline(dispatcher: TickDispatcher, interval: float = None):
+    """Snapshot the pipeline every interval; pickling and the file write run in a worker thread"""
+    interval = interval or CHECKPOINT_INTERVAL_S
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            snapshot = build_checkpoint(dispatcher)
+            size = await asyncio.to_thread(write_checkpoint, snapshot)
+            logger.debug("Checkpoint written: %d bytes", size)
+        except Exception as e:
+            logger.error(f"Error writing checkpoint: {e}")
+
 # === MAIN WEBSOCKET CONNECTION MANAGER ===
 async def websocket_v3_connection_manager():
-    global db_manager, processors, cash_flow_calculator, buy_signal_generator
+    global db_manager, feed_journal
     db_manager = LockFreeDatabaseManager()
 
     # ENHANCED TOKEN VALIDATION - Wait for daily token update before starting pipeline
     daily_token_updated = False
-    today = datetime.now(IST).date()
+    today = now_ist().date()
 
-    while not shutdown_event.is_set():
+    if FEED_SIMULATION:
+        daily_token_updated = True
+        logger.info(f"🧪 Simulation mode - feed from {FEED_AUTH_URL}, token and market-hours checks skipped")
+
+    while not shutdown_event.is_set() and not daily_token_updated:
         config = load_config()
         ACCESS_TOKEN = config.get('ACCESS_TOKEN', '')
         token_update_date = config.get('TOKEN_UPDATE_DATE', '')
@@ -2167,7 +4724,7 @@ async def websocket_v3_connection_manager():
             logger.info(f"✅ Daily token validated for {today}")
             break
         else:
-            current_time = datetime.now(IST).time()
+            current_time = now_ist().time()
             if current_time >= dt_time(9, 15):  # After market open
                 logger.warning(f"⚠️ Market opened but token not updated for {today}")
                 logger.info("💡 Update token at: https://trendvision2004.com/admin/login")
@@ -2179,169 +4736,55 @@ async def websocket_v3_connection_manager():
         logger.error("❌ Daily token not updated - Pipeline stopped")
         return
 
-    # Initialize cash flow calculator with selected options
-    selected_options, _ = auto_select_options('extracted_data.csv')
-    if selected_options:
-        cash_flow_calculator = OptionsTickCashFlowCalculator(selected_options)
-        # Initialize buy signal generator
-        buy_signal_generator = BuySignalGenerator(db_manager, cash_flow_calculator)
-        # Initialize option tracker
-        option_tracker = OptionTracker(db_manager)
-        logger.info(f"Cash flow calculator initialized with {len(selected_options)} options")
-        logger.info("✅ Buy signal generator initialized")
-        logger.info("✅ Option tracker initialized")
+    dispatcher = build_tick_pipeline(db_manager)
+    if CHECKPOINT_ENABLED:
+        restore_checkpoint(dispatcher)
+    ingest_queue = IngestQueue()
+    background_tasks = [asyncio.create_task(process_frames(ingest_queue, dispatcher)) for _ in range(INGEST_WORKERS)]
+    background_tasks.append(asyncio.create_task(report_pipeline_stats(ingest_queue, dispatcher)))
+    if dispatcher.close_scheduler:
+        background_tasks.append(asyncio.create_task(close_candles_on_boundaries(dispatcher, ingest_queue)))
+    if CHECKPOINT_ENABLED:
+        background_tasks.append(asyncio.create_task(checkpoint_pipeline(dispatcher)))
+    logger.info(f"Ingest queue ready: size={ingest_queue.maxsize} policy={ingest_queue.overflow_policy} workers={INGEST_WORKERS}")
+    if FEED_SHARDS > 1:
+        # Each shard worker journals its own connection
+        market_closed = await run_sharded_feed(ingest_queue, FEED_SHARDS)
     else:
-        cash_flow_calculator = None
-        buy_signal_generator = None
-        option_tracker = None
-        logger.warning("❌ No options selected - cash flow calculator and signal generator not initialized")
-
-    processors = {}
-    for name, config in INSTRUMENTS.items():
-        processors[config["key"]] = LockFreeTickProcessor(config["key"], config, db_manager, processors)
-    logger.info(f"Lock-free processors ready for {len(processors)} instruments")
-    connection_attempts = 0
-    max_attempts = 5
-    retry_delay = 1  # Initial retry delay for exponential backoff
-    while not shutdown_event.is_set() and connection_attempts < max_attempts:
-        # Watch time: If outside hours, wait and check every minute
-        while not shutdown_event.is_set() and not is_market_hours():
-            now = datetime.now(IST)
-            logger.info(f"Outside market hours (IST {now.strftime('%H:%M:%S')}) - Watching for open. Next check in 1 min.")
-            await asyncio.sleep(60)
-            if now.weekday() >= 5:  # Skip weekends
-                logger.info("Weekend - Pausing watch until Monday")
-                await asyncio.sleep(3600)  # Check hourly on weekends
+        feed_journal = create_feed_journal()
+        market_closed = await run_single_feed(ingest_queue)
+    # Let the processing tasks finish whatever is still queued before stopping them
+    try:
+        await asyncio.wait_for(ingest_queue.queue.join(), timeout=30.0)
+    except asyncio.TimeoutError:
+        logger.warning(f"Ingest queue not drained on shutdown - {ingest_queue.queue.qsize()} frames left")
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    if market_closed:
+        dispatcher.flush()
+        finalize_open_candles(processors)
+    elif CHECKPOINT_ENABLED:
+        # Stopped mid-session (restart, SIGTERM): the next start resumes from here
         try:
-            connection_attempts += 1
-            logger.info(f"V3 WebSocket connection attempt {connection_attempts}")
-            auth_response = get_market_data_feed_authorize_v3()
-            if not auth_response or 'data' not in auth_response:
-                logger.error("Failed to get V3 WebSocket authorization - Check access token")
-                await asyncio.sleep(5)
-                continue
-            ws_url = auth_response['data']['authorized_redirect_uri']
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            async with websockets.connect(
-                ws_url,
-                ssl=ssl_context,
-                ping_interval=20,
-                ping_timeout=10,
-                close_timeout=10,
-                max_queue=None,
-                max_size=None,
-                compression=None
-            ) as websocket:
-                logger.info("V3 WebSocket connected successfully")
-                connection_attempts = 0
-                retry_delay = 1  # Reset backoff
-                await asyncio.sleep(1)
-                subscription_msg = create_v3_subscription_message(INSTRUMENT_KEYS, "full")
-                await websocket.send(subscription_msg)
-                logger.info(f"V3 Subscribed to {len(INSTRUMENT_KEYS)} instruments - Check keys if no data")
-                message_count = 0
-                last_stats_time = time.time()
-                while not shutdown_event.is_set():
-                    now = datetime.now(IST).time()
-                    logger.debug(f"Current IST time: {now.strftime('%H:%M:%S')} | Market open: {is_market_hours()}")
-                    if now >= MARKET_END_TIME:
-                        logger.info("🕒 Market close at 3:30 PM IST - Initiating shutdown")
-                        shutdown_event.set()
-                        for proc in processors.values():
-                            if proc.current_candle:
-                                proc._finalize_current_candle()
-                            if proc.current_5min_candle:
-                                proc._finalize_5min_candle()
-                        break
-                    try:
-                        message = await asyncio.wait_for(websocket.recv(), timeout=10.0)
-                        if not message:
-                            continue
-                        decoded_data = decode_v3_message(message)
-                        if not decoded_data:
-                            continue
-                        if 'feeds' in decoded_data:
-                            # Process NIFTY index tick for OHLC and cash flow calculator
-                            if INSTRUMENTS["NIFTY_INDEX"]["key"] in decoded_data['feeds']:
-                                nifty_feed = decoded_data['feeds'][INSTRUMENTS["NIFTY_INDEX"]["key"]]
-                                nifty_tick = None
-                                if 'fullFeed' in nifty_feed:
-                                    feed = nifty_feed['fullFeed']
-                                    if 'marketFF' in feed or 'indexFF' in feed:
-                                        ltpc = feed.get('indexFF', {}).get('ltpc') or feed.get('marketFF', {}).get('ltpc')
-                                        if ltpc:
-                                            timestamp = processors[INSTRUMENTS["NIFTY_INDEX"]["key"]].decode_timestamp(ltpc.get('ltt'))
-                                            ltp = float(ltpc.get('ltp', 0))
-                                            if timestamp and ltp > 0:
-                                                if cash_flow_calculator:
-                                                    cash_flow_calculator.update_nifty_tick(timestamp, ltp)
-
-                            # Process all feeds including options for cash flow calculator
-                            for key in decoded_data['feeds']:
-                                if key in processors:
-                                    processors[key].process_tick(decoded_data)
-
-                                    # If this is an option, also process through cash flow calculator
-                                    if cash_flow_calculator:
-                                        instrument_config = next((config for config in INSTRUMENTS.values() if config["key"] == key), None)
-                                        if instrument_config and instrument_config["type"] == "OPTION":
-                                            feed_data = decoded_data['feeds'][key]
-                                            tick = processors[key].extract_tick_data_v3(decoded_data)
-                                            if tick:
-                                                cash_flow_calculator.process_option_tick(
-                                                    key, tick.ltp, tick.vtt, tick.timestamp
-                                                )
-
-                        # Generate buy signals and start option tracking
-                        if buy_signal_generator and cash_flow_calculator and option_tracker:
-                            nifty_processor = processors.get(INSTRUMENTS["NIFTY_INDEX"]["key"])
-                            if nifty_processor and hasattr(nifty_processor, 'current_candle') and nifty_processor.current_candle:
-                                current_nifty_price = nifty_processor.current_candle.close
-                                current_trend = nifty_processor.present_trend_1min
-
-                                # Generate signals (returns signal_data for BUY signals)
-                                signal_data = buy_signal_generator.check_and_generate_signals(current_nifty_price, current_trend)
-
-                                # Start tracking if buy signal was generated
-                                if signal_data and isinstance(signal_data, dict):
-                                    option_tracker.start_tracking(signal_data, signal_data['option_key'])
-
-                        # Check all active option positions for target/SL hits
-                        if option_tracker:
-                            option_tracker.check_all_positions(processors)
-                        message_count += 1
-                        current_time = time.time()
-                        if current_time - last_stats_time > 60:
-                            total_ticks = sum(p.processed_ticks for p in processors.values())
-                            candle_q, ha_q, trend_q, latest_q = db_manager.get_queue_sizes()
-                            logger.info(f"LOCK-FREE Stats: Messages: {message_count} | Ticks: {total_ticks} | Queues: C={candle_q}, HA={ha_q}, Trend={trend_q}, Latest={latest_q}")
-                            last_stats_time = current_time
-                    except asyncio.TimeoutError:
-                        logger.warning("No messages received in 10 seconds - Check token/keys or market data flow")
-                    except websockets.ConnectionClosed as e:
-                        logger.warning(f"WebSocket closed: {e} - Reconnecting")
-                        break
-                    except Exception as e:
-                        logger.error(f"Error in receive loop: {e}")
+            write_checkpoint(build_checkpoint(dispatcher))
         except Exception as e:
-            logger.error(f"Connection error (attempt {connection_attempts}): {e}")
-            if not shutdown_event.is_set():
-                logger.info(f"Reconnecting in {retry_delay} seconds...")
-                await asyncio.sleep(retry_delay)
-                retry_delay = min(retry_delay * 2, 60)  # Exponential backoff, max 60s
+            logger.error(f"Error writing checkpoint on shutdown: {e}")
     if processors:
         total_ticks = sum(p.processed_ticks for p in processors.values())
-        total_1m = sum(p.completed_candles for p in processors.values())
-        total_5m = sum(p.completed_5min_candles for p in processors.values())
-        logger.info(f"LOCK-FREE Final Stats: Ticks: {total_ticks} | 1m: {total_1m} | 5m: {total_5m}")
+        bars = " | ".join(f"{minutes}m: {sum(p.timeframes[interval_label(minutes)].completed for p in processors.values())}"
+                          for minutes in TIMEFRAMES)
+        logger.info(f"LOCK-FREE Final Stats: Ticks: {total_ticks} | {bars} | Out of order: {dispatcher.tick_quality()}")
+    if feed_journal:
+        feed_journal.close()
+        logger.info(f"Feed journal closed: {feed_journal.stats()}")
+        feed_journal = None
     db_manager.shutdown()
 
 def is_market_hours():
-    now = datetime.now(IST)
+    now = now_ist()
     is_open = MARKET_START_TIME <= now.time() < MARKET_END_TIME and now.weekday() < 5
-    logger.debug(f"Market hours check: {is_open} (IST {now.strftime('%H:%M:%S')})")
+    logger.debug("Market hours check: %s (IST %s)", is_open, now)
     return is_open
 
 # === MAIN ENTRY POINT ===
@@ -2359,6 +4802,7 @@ async def main_async():
     await websocket_v3_connection_manager()
 
 def main():
+    init_pipeline()
     logger.info("🏆 UPSTOX LOCK-FREE TRADING SYSTEM V3 - CASH FLOW DRIVEN")
     logger.info("=" * 80)
     logger.info("🎯 Key Features:")
@@ -2371,8 +4815,8 @@ def main():
 
     # Show instrument summary
     instrument_summary = {}
-    for name, config in INSTRUMENTS.items():
-        instrument_type = config["type"]
+    for info in REGISTRY:
+        instrument_type = info.type
         if instrument_type not in instrument_summary:
             instrument_summary[instrument_type] = 0
         instrument_summary[instrument_type] += 1
@@ -2393,3 +4837,6 @@ def main():
     finally:
         logger.info("✅ System terminated cleanly")
         logger.info(f"💾 Database: {TRADING_DB}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Replay a recorded feed journal (see feed_journal.py) through the live processing path:
+decode -> LockFreeTickProcessor -> cash flow -> buy signals -> option tracker.
+
+Time inside the pipeline comes from the recorded frames, so two replays of the
+same journal produce the same candles and signals. Output goes to a scratch
+database, never the live one.
+
+    python replay_feed.py feed_journal/                    # as fast as possible
+    python replay_feed.py feed_journal/ --speed 1          # real time
+    python replay_feed.py feed_journal/ --speed 20 --start 10:00 --end 11:30
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+STAGES = ('decode', 'extract', 'process', 'signals', 'tracker')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay recorded feed frames through pipeline1")
+    parser.add_argument("journal", help="Journal directory or a single .fjl file")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="Replay speed multiplier (1 = real time, 0 = as fast as possible)")
+    parser.add_argument("--db", default=None, help="Scratch database path (default: database/replay_<timestamp>.db)")
+    parser.add_argument("--start", default=None, help="Start at this IST time of day (HH:MM)")
+    parser.add_argument("--end", default=None, help="Stop at this IST time of day (HH:MM)")
+    parser.add_argument("--report", default=None, help="Write the throughput report as JSON to this path")
+    parser.add_argument("--engine", choices=("object", "columnar"), default=None,
+                        help="Candle engine (default: CANDLE_ENGINE from config)")
+    parser.add_argument("--cash-flow-engine", choices=("object", "columnar"), default=None,
+                        help="Cash flow engine (default: CASH_FLOW_ENGINE from config)")
+    parser.add_argument("--candle-store", choices=("daily", "bars"), default=None,
+                        help="Candle tables (default: CANDLE_STORE from config)")
+    return parser.parse_args()
+
+
+def time_of_day_ms(session_day, hhmm, tz):
+    hours, minutes = (int(part) for part in hhmm.split(":"))
+    moment = datetime.combine(session_day, datetime.min.time(), tz) + timedelta(hours=hours, minutes=minutes)
+    return int(moment.timestamp() * 1000)
+
+
+def main():
+    args = parse_args()
+    db_path = args.db or f"database/replay_{time.strftime('%Y%m%d_%H%M%S')}.db"
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    # pipeline1 reads TRADING_DB at import time
+    os.environ["TRADING_DB"] = db_path
+
+    import pipeline1
+    from feed_journal import FeedJournalReader
+    pipeline1.init_pipeline()
+
+    reader = FeedJournalReader(args.journal)
+    first = next(reader.records(), None)
+    if first is None:
+        print("Journal is empty")
+        return 1
+    session_day = datetime.fromtimestamp(first[1] / 1e9, pipeline1.IST).date()
+    start_ms = time_of_day_ms(session_day, args.start, pipeline1.IST) if args.start else None
+    end_ms = time_of_day_ms(session_day, args.end, pipeline1.IST) if args.end else None
+
+    clock = pipeline1.ReplayClock()
+    clock.set_epoch_ns(first[1])
+    pipeline1.set_clock(clock)
+    if args.engine:
+        pipeline1.CANDLE_ENGINE = args.engine
+    if args.cash_flow_engine:
+        pipeline1.CASH_FLOW_ENGINE = args.cash_flow_engine
+    if args.candle_store:
+        pipeline1.CANDLE_STORE = args.candle_store
+    pipeline1.db_manager = db_manager = pipeline1.LockFreeDatabaseManager()
+    dispatcher = pipeline1.build_tick_pipeline(db_manager)
+
+    stage_ns = dict.fromkeys(STAGES, 0)
+    frames = 0
+    ticks = 0
+    errors = 0
+    first_mono = None
+    started = time.perf_counter()
+    perf_ns = time.perf_counter_ns
+
+    try:
+        for mono_ns, wall_ns, frame in reader.records(start_ms, end_ms):
+            if args.speed > 0:
+                if first_mono is None:
+                    first_mono = mono_ns
+                ahead = (mono_ns - first_mono) / 1e9 / args.speed - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+            clock.set_epoch_ns(wall_ns)
+
+            marks = [perf_ns()]
+            frame_records = []
+            try:
+                decoded = pipeline1.decode_v3_message(frame)
+                marks.append(perf_ns())
+                frame_records = dispatcher.extract(decoded) if decoded else []
+                marks.append(perf_ns())
+                if frame_records:
+                    dispatcher.apply(frame_records)
+                marks.append(perf_ns())
+                dispatcher.run_signals()
+                marks.append(perf_ns())
+                dispatcher.run_tracker()
+                marks.append(perf_ns())
+            except Exception as e:
+                # Same as process_frames: a failing frame is logged and the replay moves on
+                errors += 1
+                marks.append(perf_ns())
+                pipeline1.logger.error(f"Error processing frame: {e}")
+            for stage, begin, end in zip(STAGES, marks, marks[1:]):
+                stage_ns[stage] += end - begin
+            frames += 1
+            ticks += len(frame_records)
+    except KeyboardInterrupt:
+        print("Replay interrupted - finalizing what was replayed so far")
+
+    dispatcher.flush()
+    pipeline1.finalize_open_candles(pipeline1.processors)
+    elapsed = time.perf_counter() - started
+    db_manager.shutdown()
+
+    busy_ns = sum(stage_ns.values()) or 1
+    report = {
+        'journal': str(args.journal),
+        'database': db_path,
+        'speed': args.speed or 'max',
+        'engine': pipeline1.CANDLE_ENGINE,
+        'cash_flow_engine': pipeline1.CASH_FLOW_ENGINE,
+        'candle_store': pipeline1.CANDLE_STORE,
+        'frames': frames,
+        'frame_errors': errors,
+        'ticks': ticks,
+        'tick_quality': dispatcher.tick_quality(),
+        'elapsed_s': round(elapsed, 3),
+        'ticks_per_sec': round(ticks / elapsed, 1) if elapsed > 0 else 0,
+        'frames_per_sec': round(frames / elapsed, 1) if elapsed > 0 else 0,
+        'candles': {
+            interval: sum(p.timeframes[interval].completed for p in pipeline1.processors.values())
+            for interval in map(pipeline1.interval_label, pipeline1.TIMEFRAMES)
+        },
+        'stages': {
+            stage: {
+                'total_ms': round(ns / 1e6, 2),
+                'share_pct': round(ns * 100 / busy_ns, 1),
+                'per_tick_us': round(ns / 1e3 / ticks, 3) if ticks else 0
+            }
+            for stage, ns in stage_ns.items()
+        }
+    }
+
+    print(f"Replayed {frames} frames / {ticks} ticks in {elapsed:.2f}s "
+          f"({report['ticks_per_sec']:.0f} ticks/s) -> {db_path}")
+    candles = " ".join(f"{interval}={count}" for interval, count in report['candles'].items())
+    quality = " ".join(f"{name}={count}" for name, count in report['tick_quality'].items())
+    print(f"Candles: {candles} | Out of order: {quality} | Frame errors: {errors}")
+    for stage, data in report['stages'].items():
+        print(f"  {stage:<8} {data['total_ms']:>10.1f} ms  {data['share_pct']:>5.1f}%  {data['per_tick_us']:>8.2f} us/tick")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
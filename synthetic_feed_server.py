@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Upstox V3 market data feed, for load testing pipeline1
+without a network or a token.
+
+Serves the authorize endpoint over HTTP and a WebSocket that streams
+MarketDataFeedV3 FeedResponse frames for whatever instruments the client
+subscribes to, generated from a per-instrument random walk.
+
+    python synthetic_feed_server.py --ticks-per-sec 20000 --burstiness 0.2
+
+Point the pipeline at it in config/config.json:
+
+    "FEED_AUTH_URL": "http://127.0.0.1:8766/v3/feed/market-data-feed/authorize",
+    "FEED_SIMULATION": true
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import websockets
+
+import MarketDataFeedV3_pb2 as pb
+
+logger = logging.getLogger("SyntheticFeed")
+
+TICK_SIZE = 0.05
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Synthetic Upstox V3 feed server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--ws-port", type=int, default=8765, help="WebSocket feed port")
+    parser.add_argument("--http-port", type=int, default=8766, help="Authorize endpoint port")
+    parser.add_argument("--instruments", type=int, default=0,
+                        help="Pad every subscription with synthetic keys up to this many instruments")
+    parser.add_argument("--ticks-per-sec", type=float, default=1000,
+                        help="Average instrument ticks per second per connection")
+    parser.add_argument("--fill", type=float, default=0.5,
+                        help="Fraction of subscribed instruments carried in each frame")
+    parser.add_argument("--burstiness", type=float, default=0.0,
+                        help="Probability that a given second is a burst second")
+    parser.add_argument("--burst-factor", type=float, default=10.0, help="Rate multiplier during a burst second")
+    parser.add_argument("--disconnect-every", type=float, default=0,
+                        help="Mean seconds between forced disconnects (0 = never)")
+    parser.add_argument("--auth-fail-rate", type=float, default=0.0,
+                        help="Fraction of authorize calls answered with HTTP 500")
+    parser.add_argument("--volatility", type=float, default=0.0004, help="Per-tick relative price volatility")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+class InstrumentWalk:
+    """Random-walk price, volume and minute OHLC for one instrument"""
+
+    def __init__(self, key: str, rnd: random.Random, volatility: float):
+        self.key = key
+        self.is_index = key.startswith("NSE_INDEX")
+        if self.is_index:
+            start = 25000.0
+        elif "FUT" in key.upper() or key == "NSE_FO|53001":
+            start = 25100.0
+        else:
+            start = rnd.uniform(40, 400)
+        self.rnd = rnd
+        self.volatility = volatility
+        self.prev_close = start
+        self.ltp = start
+        self.vtt = 0
+        self.turnover = 0.0
+        self.minute = None
+        self.ohlc = None
+
+    def step(self, now_ms: int):
+        rnd = self.rnd
+        move = rnd.gauss(0, self.volatility) * self.ltp
+        self.ltp = max(TICK_SIZE, round((self.ltp + move) / TICK_SIZE) * TICK_SIZE)
+        ltq = 0
+        if not self.is_index:
+            ltq = 75 * rnd.randint(1, 20)
+            self.vtt += ltq
+            self.turnover += ltq * self.ltp
+        minute = now_ms // 60000
+        if minute != self.minute:
+            self.minute = minute
+            self.ohlc = [self.ltp, self.ltp, self.ltp, self.ltp, 0]
+        ohlc = self.ohlc
+        ohlc[1] = max(ohlc[1], self.ltp)
+        ohlc[2] = min(ohlc[2], self.ltp)
+        ohlc[3] = self.ltp
+        ohlc[4] += ltq
+        return ltq
+
+    def fill_feed(self, feed, now_ms: int, ltq: int):
+        full = feed.fullFeed.indexFF if self.is_index else feed.fullFeed.marketFF
+        full.ltpc.ltp = self.ltp
+        full.ltpc.ltt = now_ms
+        full.ltpc.cp = self.prev_close
+        bar = full.marketOHLC.ohlc.add()
+        bar.interval = "I1"
+        bar.open, bar.high, bar.low, bar.close, bar.vol = self.ohlc
+        bar.ts = self.minute * 60000
+        if not self.is_index:
+            full.ltpc.ltq = ltq
+            full.vtt = self.vtt
+            full.atp = self.turnover / self.vtt if self.vtt else self.ltp
+
+
+class SyntheticFeed:
+    def __init__(self, args):
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.connections = 0
+        self.frames_sent = 0
+        self.ticks_sent = 0
+
+    def market_info_frame(self) -> bytes:
+        response = pb.FeedResponse(type=pb.market_info, currentTs=int(time.time() * 1000))
+        for segment in ("NSE_EQ", "NSE_FO", "NSE_INDEX"):
+            response.marketInfo.segmentStatus[segment] = pb.NORMAL_OPEN
+        return response.SerializeToString()
+
+    def build_frame(self, walks, now_ms: int) -> bytes:
+        response = pb.FeedResponse(type=pb.live_feed, currentTs=now_ms)
+        count = max(1, round(len(walks) * self.args.fill))
+        for walk in (walks if count >= len(walks) else self.rnd.sample(walks, count)):
+            ltq = walk.step(now_ms)
+            walk.fill_feed(response.feeds[walk.key], now_ms, ltq)
+        self.ticks_sent += count
+        return response.SerializeToString()
+
+    async def handler(self, websocket, path=None):
+        args = self.args
+        self.connections += 1
+        connection_id = self.connections
+        try:
+            request = json.loads(await websocket.recv())
+            keys = list(request.get("data", {}).get("instrumentKeys", []))
+        except (ValueError, websockets.ConnectionClosed):
+            return
+        keys += [f"NSE_FO|SYN{i}" for i in range(max(0, args.instruments - len(keys)))]
+        walks = [InstrumentWalk(key, self.rnd, args.volatility) for key in keys]
+        per_frame = max(1, round(len(walks) * args.fill))
+        frames_per_sec = max(1.0, args.ticks_per_sec / per_frame)
+        disconnect_at = None
+        if args.disconnect_every > 0:
+            disconnect_at = time.monotonic() + self.rnd.expovariate(1 / args.disconnect_every)
+        logger.info(f"[conn {connection_id}] {len(walks)} instruments at {frames_per_sec:.0f} frames/s")
+
+        try:
+            await websocket.send(self.market_info_frame())
+            second = None
+            rate = frames_per_sec
+            next_send = time.monotonic()
+            while True:
+                now = time.monotonic()
+                if disconnect_at and now >= disconnect_at:
+                    logger.info(f"[conn {connection_id}] Injecting disconnect")
+                    await websocket.close(code=1011, reason="synthetic fault")
+                    return
+                if int(now) != second:
+                    second = int(now)
+                    burst = args.burstiness > 0 and self.rnd.random() < args.burstiness
+                    rate = frames_per_sec * (args.burst_factor if burst else 1.0)
+                await websocket.send(self.build_frame(walks, int(time.time() * 1000)))
+                self.frames_sent += 1
+                next_send += 1.0 / rate
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif delay < -1.0:
+                    # Can't keep up - don't try to catch up on a backlog of more than a second
+                    next_send = time.monotonic()
+                    await asyncio.sleep(0)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            logger.info(f"[conn {connection_id}] closed")
+
+    async def report(self, interval: float = 10.0):
+        last_frames, last_ticks = 0, 0
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(f"Sent {(self.frames_sent - last_frames) / interval:.0f} frames/s, "
+                        f"{(self.ticks_sent - last_ticks) / interval:.0f} ticks/s")
+            last_frames, last_ticks = self.frames_sent, self.ticks_sent
+
+
+def start_authorize_server(args) -> ThreadingHTTPServer:
+    ws_url = f"ws://{args.host}:{args.ws_port}/market-data-feed"
+    fail_rnd = random.Random(args.seed)
+
+    class AuthorizeHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if fail_rnd.random() < args.auth_fail_rate:
+                self.send_error(500, "synthetic authorize failure")
+                return
+            body = json.dumps({
+                "status": "success",
+                "data": {"authorized_redirect_uri": ws_url, "authorizedRedirectUri": ws_url}
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    server = ThreadingHTTPServer((args.host, args.http_port), AuthorizeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Authorize endpoint: http://{args.host}:{args.http_port}/v3/feed/market-data-feed/authorize")
+    return server
+
+
+async def serve(args):
+    feed = SyntheticFeed(args)
+    http_server = start_authorize_server(args)
+    try:
+        async with websockets.serve(feed.handler, args.host, args.ws_port, max_size=None, compression=None):
+            logger.info(f"Feed WebSocket: ws://{args.host}:{args.ws_port}")
+            await feed.report()
+    finally:
+        http_server.shutdown()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        pass
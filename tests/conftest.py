@@ -0,0 +1,116 @@
+"""Shared fixtures: pipeline1 configured from a dict with a NIFTY index + future universe (no config file or CSV)"""
+import itertools
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pipeline1
+
+NIFTY_INDEX_KEY = "NSE_INDEX|Nifty 50"
+NIFTY_FUTURE_KEY = "NSE_FO|53001"
+SESSION_START_MS = 1736135101000  # 2025-01-06 09:15:01 IST
+ENGINES = ('object', 'columnar')
+
+INSTRUMENTS = {
+    "NIFTY_INDEX": {
+        "key": NIFTY_INDEX_KEY,
+        "type": "INDEX",
+        "has_volume": False,
+        "process_delta": False,
+        "process_heikin_ashi": True,
+        "process_indicators": True,
+        "trading_enabled": False,
+        "table_suffix": "nifty_index"
+    },
+    "NIFTY_FUTURE": {
+        "key": NIFTY_FUTURE_KEY,
+        "type": "FUTURE",
+        "has_volume": True,
+        "process_delta": True,
+        "process_heikin_ashi": True,
+        "process_indicators": True,
+        "trading_enabled": True,
+        "table_suffix": "future"
+    }
+}
+
+
+def database_rows(path) -> dict:
+    """Every table's rows without autoincrement ids and wall-clock stamps, sorted, for comparing two runs"""
+    conn = sqlite3.connect(path)
+    try:
+        rows = {}
+        for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name != 'sqlite_sequence'"):
+            columns = [column[1] for column in conn.execute(f"PRAGMA table_info({table})")
+                       if column[1] not in ('id', 'created_at', 'last_updated', 'updated_at')]
+            rows[table] = sorted(conn.execute(f"SELECT {', '.join(columns)} FROM {table}").fetchall(), key=repr)
+        return rows
+    finally:
+        conn.close()
+
+
+def session_records(count: int = 1200, seed: int = 1) -> list:
+    """In-order (key, ltt_ms, ltp, atp, vtt, volume, prev_close) records of the index and future, ~6 minutes"""
+    rnd = random.Random(seed)
+    index_price, future_price, vtt = 23500.0, 23600.0, 100000.0
+    records = []
+    ltt_ms = SESSION_START_MS
+    for _ in range(count):
+        ltt_ms += rnd.randint(100, 500)
+        index_price = round(index_price + rnd.choice((-1, 1)) * rnd.randint(0, 8) * 0.05, 2)
+        future_price = round(future_price + rnd.choice((-1, 1)) * rnd.randint(0, 8) * 0.05, 2)
+        vtt += rnd.randint(0, 300)
+        records.append((NIFTY_INDEX_KEY, ltt_ms, index_price, index_price, None, None, 23450.0))
+        records.append((NIFTY_FUTURE_KEY, ltt_ms + rnd.randint(0, 50), future_price, future_price - 1, vtt, int(vtt),
+                        23550.0))
+    return records
+
+
+def daily_table(rows: dict, prefix: str) -> list:
+    """Rows of the one per-day table named ``<prefix>_<yyyymmdd>`` (the day is the wall-clock date)"""
+    names = [name for name in rows if name.rsplit('_', 1)[0] == prefix]
+    assert len(names) == 1, f"expected one {prefix}_* table, found {names}"
+    return rows[names[0]]
+
+
+def feed_frame(records: list, current_ms: int) -> bytes:
+    """A serialized V3 FeedResponse carrying tick records: marketFF with vtt, indexFF without"""
+    response = pipeline1.pb.FeedResponse(type=pipeline1.pb.live_feed, currentTs=current_ms)
+    for key, ltt_ms, ltp, atp, vtt, volume, prev_close in records:
+        full_feed = response.feeds[key].fullFeed
+        market = full_feed.indexFF if vtt is None else full_feed.marketFF
+        market.ltpc.ltp = ltp
+        market.ltpc.ltt = ltt_ms
+        market.ltpc.cp = prev_close
+        if vtt is not None:
+            market.atp = atp
+            market.vtt = int(vtt)
+            ohlc = market.marketOHLC.ohlc.add()
+            ohlc.interval = "I1"
+            ohlc.vol = volume or 0
+    return response.SerializeToString()
+
+
+@pytest.fixture
+def make_pipeline(tmp_path, monkeypatch):
+    """build(**settings) -> (dispatcher, db) on a fresh database in tmp_path; settings go to pipeline1.configure"""
+    databases = []
+    counter = itertools.count()
+
+    def build(**settings):
+        monkeypatch.setattr(pipeline1, 'TRADING_DB', str(tmp_path / f"trading{next(counter)}.db"))
+        pipeline1.configure({'CHECKPOINT': {'ENABLED': False}, **settings})
+        pipeline1.load_instruments(INSTRUMENTS)
+        db = pipeline1.LockFreeDatabaseManager()
+        databases.append(db)
+        return pipeline1.build_tick_pipeline(db, []), db
+
+    yield build
+    for db in databases:
+        db.shutdown()
+    pipeline1.configure({})
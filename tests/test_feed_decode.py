@@ -0,0 +1,48 @@
+"""Typed protobuf decoding gives the same tick records as the MessageToDict path"""
+import pipeline1
+from conftest import NIFTY_FUTURE_KEY, NIFTY_INDEX_KEY, SESSION_START_MS, feed_frame, session_records
+
+
+def decoded_records(dispatcher, frame: bytes, mode: str) -> list:
+    decoded = pipeline1.decode_v3_message(frame, mode)
+    assert isinstance(decoded, pipeline1.pb.FeedResponse if mode == 'typed' else dict)
+    return sorted(dispatcher.extract_records(decoded))
+
+
+def test_typed_records_match_message_to_dict(make_pipeline):
+    dispatcher, _ = make_pipeline()
+    records = session_records(200)
+    for index in range(0, len(records), 2):
+        frame = feed_frame(records[index:index + 2], records[index][1])
+        typed = decoded_records(dispatcher, frame, 'typed')
+        assert typed == decoded_records(dispatcher, frame, 'dict')
+        assert typed == sorted(records[index:index + 2])
+
+
+def test_zero_valued_fields_read_as_absent_in_both_modes(make_pipeline):
+    dispatcher, _ = make_pipeline()
+    response = pipeline1.pb.FeedResponse(type=pipeline1.pb.live_feed, currentTs=SESSION_START_MS)
+    # No atp, no vtt and no I1 bar on the future; an ltpc-only index feed; an unknown instrument
+    market = response.feeds[NIFTY_FUTURE_KEY].fullFeed.marketFF
+    market.ltpc.ltp = 23600.5
+    market.ltpc.ltt = SESSION_START_MS
+    market.ltpc.cp = 23550.0
+    ltpc = response.feeds[NIFTY_INDEX_KEY].ltpc
+    ltpc.ltp = 23500.25
+    ltpc.ltt = SESSION_START_MS + 10
+    ltpc.cp = 23450.0
+    response.feeds["NSE_FO|99999"].ltpc.ltt = SESSION_START_MS
+    frame = response.SerializeToString()
+
+    typed = decoded_records(dispatcher, frame, 'typed')
+    assert typed == decoded_records(dispatcher, frame, 'dict')
+    assert typed == [(NIFTY_FUTURE_KEY, SESSION_START_MS, 23600.5, 23600.5, None, None, 23550.0),
+                     (NIFTY_INDEX_KEY, SESSION_START_MS + 10, 23500.25, 23500.25, None, None, 23450.0)]
+
+
+def test_feed_without_trade_time_is_skipped(make_pipeline):
+    dispatcher, _ = make_pipeline()
+    response = pipeline1.pb.FeedResponse(type=pipeline1.pb.live_feed, currentTs=SESSION_START_MS)
+    response.feeds[NIFTY_INDEX_KEY].fullFeed.indexFF.ltpc.ltp = 23500.0
+    frame = response.SerializeToString()
+    assert decoded_records(dispatcher, frame, 'typed') == decoded_records(dispatcher, frame, 'dict') == []
@@ -0,0 +1,111 @@
+"""Rolling cash flow windows against sums and min/max recomputed from every bucket, across silent gaps"""
+import random
+
+import numpy as np
+import pytest
+
+from flow_windows import SERIES, SIDE_CE, SIDE_OTHER, SIDE_PE, CashFlowWindows, RollingFlow
+
+SIDES = np.array([SIDE_CE, SIDE_PE, SIDE_CE, SIDE_PE, SIDE_OTHER], dtype=np.int64)
+STRIKE_IDS = np.array([0, 0, 1, 1, 1], dtype=np.int64)
+STRIKES = [23500.0, 23550.0]
+WINDOWS = (1, 3, 10)
+
+
+def flow_ticks(seed: int = 3) -> list:
+    """(ts_ms, slot, flow) every 0-700ms, with a 6s and a 25s silence (shorter and longer than 10 buckets)"""
+    rnd = random.Random(seed)
+    ticks, ts_ms = [], 1_000_000
+    for number in range(600):
+        ts_ms += 25_000 if number == 400 else 6_000 if number == 200 else rnd.randint(0, 700)
+        ticks.append((ts_ms, rnd.randrange(len(SIDES)), round(rnd.uniform(-5000, 5000), 2)))
+    return ticks
+
+
+class Reference:
+    """Every bucket's (total, ce, pe) flow and per-slot flow; silent buckets are zero"""
+
+    def __init__(self, bucket_ms: int):
+        self.bucket_ms = bucket_ms
+        self.first = None
+        self.totals = {}
+        self.slots = {}
+
+    def add(self, ts_ms: int, slot: int, flow: float):
+        bucket = ts_ms // self.bucket_ms
+        self.first = bucket if self.first is None else self.first
+        totals = self.totals.setdefault(bucket, [0.0, 0.0, 0.0])
+        totals[0] += flow
+        if SIDES[slot] != SIDE_OTHER:
+            totals[1 + SIDES[slot]] += flow
+        self.slots.setdefault(bucket, np.zeros(len(SIDES)))[slot] += flow
+
+    def window(self, open_bucket: int, size: int) -> dict:
+        buckets = range(max(self.first, open_bucket - size + 1), open_bucket + 1)
+        values = [self.totals.get(bucket, [0.0, 0.0, 0.0]) for bucket in buckets]
+        flow = sum((self.slots.get(bucket, np.zeros(len(SIDES))) for bucket in buckets), np.zeros(len(SIDES)))
+        series = {name: [value[column] for value in values] for column, name in enumerate(SERIES)}
+        result = {name: sum(column) for name, column in series.items()}
+        result['min'] = {name: min(column) for name, column in series.items()}
+        result['max'] = {name: max(column) for name, column in series.items()}
+        result['by_strike'] = dict(zip(STRIKES, np.bincount(STRIKE_IDS, weights=flow, minlength=2).tolist()))
+        return result
+
+
+def assert_window(actual: dict, expected: dict):
+    for name, value in expected.items():
+        assert actual[name] == pytest.approx(value, abs=1e-6), name
+
+
+def test_second_windows_match_every_bucket_recomputed():
+    flows = RollingFlow(SIDES, STRIKE_IDS, STRIKES, 1_000, WINDOWS)
+    reference = Reference(1_000)
+    for number, (ts_ms, slot, flow) in enumerate(flow_ticks()):
+        flows.add(ts_ms, slot, flow)
+        reference.add(ts_ms, slot, flow)
+        if number % 7 == 0 or number in (200, 201, 400, 401):
+            for size in WINDOWS:
+                assert_window(flows.window(size, by_strike=True), reference.window(flows.open_bucket, size))
+
+
+def test_windows_slide_through_silence_without_flow():
+    flows = RollingFlow(SIDES, STRIKE_IDS, STRIKES, 1_000, WINDOWS)
+    reference = Reference(1_000)
+    for ts_ms, slot, flow in flow_ticks()[:50]:
+        flows.add(ts_ms, slot, flow)
+        reference.add(ts_ms, slot, flow)
+    last_ms = flow_ticks()[49][0]
+    for silence_ms in (2_000, 4_000, 9_000, 30_000):
+        flows.advance(last_ms + silence_ms)
+        for size in WINDOWS:
+            assert_window(flows.window(size, by_strike=True), reference.window(flows.open_bucket, size))
+    # Long after the last flow every window is empty, with zero as its min and max
+    window = flows.window(10)
+    assert window['total'] == window['min']['total'] == window['max']['total'] == 0
+
+
+def test_minute_windows_include_the_open_second():
+    options = {f"NSE_FO|{slot}": {'option_type': option_type, 'strike': STRIKES[STRIKE_IDS[slot]]}
+               for slot, option_type in enumerate(('CE', 'PE', 'CE', 'PE', 'FUT'))}
+    windows = CashFlowWindows(options, minute_windows=[1, 3], second_windows=[10])
+    reference = Reference(60_000)
+    for ts_ms, slot, flow in flow_ticks():
+        windows.add(ts_ms, slot, flow)
+        reference.add(ts_ms, slot, flow)
+    snapshot = windows.snapshot(by_strike=True)
+    for size in (1, 3):
+        assert_window(snapshot['minutes']['windows'][size], reference.window(snapshot['minutes']['bucket'], size))
+
+
+def test_state_round_trip_carries_on_identically():
+    ticks = flow_ticks()
+    flows = RollingFlow(SIDES, STRIKE_IDS, STRIKES, 1_000, WINDOWS)
+    for ts_ms, slot, flow in ticks[:300]:
+        flows.add(ts_ms, slot, flow)
+    restored = RollingFlow(SIDES, STRIKE_IDS, STRIKES, 1_000, WINDOWS)
+    restored.restore(flows.state())
+    for ts_ms, slot, flow in ticks[300:]:
+        flows.add(ts_ms, slot, flow)
+        restored.add(ts_ms, slot, flow)
+    for size in WINDOWS:
+        assert restored.window(size, by_strike=True) == flows.window(size, by_strike=True)
@@ -0,0 +1,79 @@
+"""warm_up() over arrays of past bars leaves every indicator where bar-by-bar update() would"""
+import numpy as np
+import pytest
+
+from indicators import ATR, EMA, MACD, RSI, IndicatorSet, SuperTrend, ema_series
+
+
+def random_bars(count: int, seed: int = 5) -> tuple:
+    """(high, low, close) arrays of a random walk"""
+    rnd = np.random.default_rng(seed)
+    close = 23500 + np.cumsum(rnd.normal(0, 4, count))
+    high = close + rnd.uniform(0, 6, count)
+    low = close - rnd.uniform(0, 6, count)
+    return high, low, close
+
+
+def updated(indicator, *columns):
+    for values in zip(*(column.tolist() for column in columns)):
+        indicator.update(*values)
+    return indicator
+
+
+def assert_same_state(warmed: dict, stepped: dict):
+    assert warmed.keys() == stepped.keys()
+    for name, value in stepped.items():
+        if isinstance(value, dict):
+            assert_same_state(warmed[name], value)
+        elif isinstance(value, float):
+            assert warmed[name] == pytest.approx(value, rel=1e-9, abs=1e-9), name
+        else:
+            assert warmed[name] == value, name
+
+
+def test_ema_series_matches_the_recurrence_across_blocks():
+    values = random_bars(200)[2]
+    expected, previous = [], 23000.0
+    for value in values.tolist():
+        previous += 0.1 * (value - previous)
+        expected.append(previous)
+    assert ema_series(values, 0.1, 23000.0) == pytest.approx(expected, rel=1e-12)
+
+
+# 1 bar, a partial block, and several blocks of _BLOCK bars
+@pytest.mark.parametrize('count', (1, 50, 300))
+@pytest.mark.parametrize('make', (lambda: EMA(20), lambda: MACD(12, 26, 9), lambda: RSI(14)))
+def test_close_indicators(make, count):
+    close = random_bars(count)[2]
+    warmed = make()
+    warmed.warm_up(close)
+    assert_same_state(warmed.state(), updated(make(), close).state())
+
+
+@pytest.mark.parametrize('count', (1, 50, 300))
+@pytest.mark.parametrize('make', (lambda: ATR(14), lambda: SuperTrend(10, 3.0)))
+def test_bar_indicators(make, count):
+    high, low, close = random_bars(count)
+    warmed = make()
+    warmed.warm_up(high, low, close)
+    assert_same_state(warmed.state(), updated(make(), high, low, close).state())
+
+
+def test_warm_up_in_chunks_then_update_matches_updates_throughout():
+    high, low, close = random_bars(400)
+    warmed = IndicatorSet()
+    for start, end in ((0, 90), (90, 250), (250, 380)):
+        warmed.warm_up(high[start:end], low[start:end], close[start:end])
+    stepped = updated(IndicatorSet(), high[:380], low[:380], close[:380])
+    assert_same_state(warmed.state(), stepped.state())
+    # Carrying on bar by bar after the warm-up
+    for values in zip(high[380:].tolist(), low[380:].tolist(), close[380:].tolist()):
+        assert warmed.update(*values) == pytest.approx(stepped.update(*values), rel=1e-9)
+
+
+def test_state_round_trip_carries_on_identically():
+    high, low, close = random_bars(120)
+    indicators = updated(IndicatorSet(), high[:100], low[:100], close[:100])
+    restored = IndicatorSet.from_state(indicators.state())
+    for values in zip(high[100:].tolist(), low[100:].tolist(), close[100:].tolist()):
+        assert restored.update(*values) == indicators.update(*values)
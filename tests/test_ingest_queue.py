@@ -0,0 +1,67 @@
+"""IngestQueue overflow policies, batching and the receive-time bookkeeping behind the lag metrics"""
+import asyncio
+
+import pipeline1
+
+
+def fill(policy: str, frames: int, maxsize: int = 3) -> tuple:
+    """Put ``frames`` frames into a queue of ``maxsize``; returns (queue, the frames it kept)"""
+    async def run():
+        queue = pipeline1.IngestQueue(maxsize, policy)
+        for number in range(frames):
+            await queue.put(f"frame{number}", recv_ns=number + 1)
+        return queue, [frame for _, frame in await queue.get_batch(maxsize)]
+    return asyncio.run(run())
+
+
+def test_drop_newest_keeps_the_first_frames():
+    queue, frames = fill('drop_newest', 5)
+    assert frames == ['frame0', 'frame1', 'frame2']
+    assert queue.dropped == 2 and queue.enqueued == 3 and queue.max_depth == 3
+
+
+def test_drop_oldest_keeps_the_latest_frames():
+    queue, frames = fill('drop_oldest', 5)
+    assert frames == ['frame2', 'frame3', 'frame4']
+    assert queue.dropped == 2 and queue.enqueued == 5 and queue.max_depth == 3
+    # The dropped frames' receive times went with them
+    assert not queue.has_frames_before(10)
+
+
+def test_block_waits_for_room_and_loses_nothing():
+    async def run():
+        queue = pipeline1.IngestQueue(2, 'block')
+        await queue.put("frame0", recv_ns=1)
+        await queue.put("frame1", recv_ns=2)
+        blocked = asyncio.create_task(queue.put("frame2", recv_ns=3))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+        first = await queue.get_batch(1)
+        await blocked
+        return queue, first + await queue.get_batch(5)
+    queue, batch = asyncio.run(run())
+    assert [frame for _, frame in batch] == ['frame0', 'frame1', 'frame2']
+    assert queue.dropped == 0 and queue.enqueued == 3
+
+
+def test_unknown_policy_falls_back_to_block():
+    assert pipeline1.IngestQueue(4, 'drop_everything').overflow_policy == 'block'
+
+
+def test_get_batch_takes_only_what_is_queued_and_tracks_lag():
+    async def run():
+        queue = pipeline1.IngestQueue(10, 'block')
+        for number in range(4):
+            await queue.put(f"frame{number}", recv_ns=100 + number)
+        batch = await queue.get_batch(3)
+        assert queue.has_frames_before(104) and not queue.has_frames_before(103)
+        for recv_ns, _ in batch:
+            queue.mark_processed(recv_ns)
+        return queue, batch
+    queue, batch = asyncio.run(run())
+    assert [recv_ns for recv_ns, _ in batch] == [100, 101, 102]
+    metrics = queue.metrics(reset_window=True)
+    assert metrics['depth'] == 1 and metrics['processed'] == 3 and metrics['max_depth'] == 4
+    assert metrics['max_lag_ms'] >= metrics['avg_lag_ms'] > 0
+    assert queue.metrics()['max_depth'] == 1
+
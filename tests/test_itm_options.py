@@ -0,0 +1,94 @@
+"""get_itm_options over several hundred strikes agrees with a scan of every option, as the price crosses strikes"""
+import random
+
+import pytest
+
+import pipeline1
+
+CALCULATORS = (pipeline1.OptionsTickCashFlowCalculator, pipeline1.ColumnarCashFlowCalculator)
+
+
+def option_chain(seed: int = 11) -> list:
+    """CE and PE rows for 300 strikes 50 apart, some strikes only on one side and one strike listed twice"""
+    rnd = random.Random(seed)
+    rows = []
+    for number in range(300):
+        strike = 17000 + 50 * number
+        missing = rnd.choice(('CE', 'PE')) if strike != 20000 and rnd.random() < 0.2 else None
+        for option_type in ('CE', 'PE'):
+            if option_type == missing:
+                continue
+            rows.append({'instrument_key': f"NSE_FO|{option_type}{strike}", 'option_type': option_type,
+                         'strike': strike, 'last_price': 100.0})
+    rows.append({'instrument_key': "NSE_FO|CE20000b", 'option_type': 'CE', 'strike': 20000, 'last_price': 100.0})
+    return rows
+
+
+def scanned(options: dict, price: float) -> dict:
+    """1st ITM CE: highest strike below the price; 1st ITM PE: lowest strike above it; first listed wins a tie"""
+    itm_ce = itm_pe = None
+    for row in options.values():
+        strike = row['strike']
+        if row['option_type'] == 'CE' and strike < price and (itm_ce is None or strike > itm_ce['strike']):
+            itm_ce = row
+        if row['option_type'] == 'PE' and strike > price and (itm_pe is None or strike < itm_pe['strike']):
+            itm_pe = row
+    return {'itm_ce': itm_ce, 'itm_pe': itm_pe}
+
+
+def prices(seed: int = 12) -> list:
+    """A walk that crosses many strikes back and forth, prices on strikes, and prices outside the chain"""
+    rnd = random.Random(seed)
+    price, walk = 24000.0, []
+    for _ in range(3000):
+        price += rnd.choice((-1, 1)) * rnd.uniform(0, 40)
+        walk.append(round(price, 2))
+    return walk + [20000.0, 20000.0, 20049.99, 20050.0, 20050.01, 16000.0, 17000.0, 31950.0, 40000.0]
+
+
+@pytest.mark.parametrize('calculator_class', CALCULATORS)
+def test_matches_a_scan_of_every_option(calculator_class):
+    calculator = calculator_class(option_chain())
+    assert len(calculator.strikes) == 300
+    for price in prices():
+        assert calculator.get_itm_options(price) == scanned(calculator.options, price), price
+        band = calculator._itm_band
+        # The cached band is the one around the last price off a strike
+        if price not in calculator.strikes:
+            assert band[0] < price < band[1]
+
+
+def test_cached_band_is_reused_until_the_price_crosses_a_strike(monkeypatch):
+    calculator = pipeline1.OptionsTickCashFlowCalculator(option_chain())
+    lookups = []
+    bisect_left = pipeline1.bisect.bisect_left
+
+    def counted(strikes, price, *args, **kwargs):
+        lookups.append(price)
+        return bisect_left(strikes, price, *args, **kwargs)
+    monkeypatch.setattr(pipeline1.bisect, 'bisect_left', counted)
+    first = calculator.get_itm_options(20010.0)
+    assert calculator._itm_band[:2] == (20000, 20050) and len(lookups) == 2
+    # Anywhere inside the band the cached rows come back without a lookup
+    for price in (20000.01, 20030.0, 20049.99):
+        assert calculator.get_itm_options(price) == first
+    assert len(lookups) == 2
+    # Crossing a strike, or sitting on one, looks the rows up again
+    for price in (20050.01, 20050.0):
+        assert calculator.get_itm_options(price) == scanned(calculator.options, price)
+    assert lookups[2:] == [20050.01, 20050.01, 20050.0, 20050.0]
+
+
+def test_rebuilding_the_strike_index_drops_the_cached_band():
+    calculator = pipeline1.OptionsTickCashFlowCalculator(option_chain())
+    assert calculator.get_itm_options(20010.0)['itm_ce']['strike'] == 20000
+    # A strike listed inside the cached band only counts once the index is rebuilt
+    for option_type in ('CE', 'PE'):
+        calculator.options[f"NSE_FO|{option_type}20025"] = {'instrument_key': f"NSE_FO|{option_type}20025",
+                                                             'option_type': option_type, 'strike': 20025.0}
+    assert calculator.get_itm_options(20030.0)['itm_ce']['strike'] == 20000
+    calculator._build_strike_index()
+    assert calculator._itm_band is None
+    for price in (20010.0, 20025.0, 20030.0):
+        assert calculator.get_itm_options(price) == scanned(calculator.options, price), price
+    assert calculator.get_itm_options(20030.0)['itm_ce']['strike'] == 20025.0
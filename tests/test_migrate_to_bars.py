@@ -0,0 +1,105 @@
+"""migrate_to_bars.py imports the per-day candle tables into bars/ha_bars and leaves views that read the same"""
+import sqlite3
+import sys
+
+import pytest
+
+import candle_store
+import migrate_to_bars
+import pipeline1
+from conftest import session_records
+
+
+def write_session(make_pipeline, store: str) -> str:
+    """Database path of a short session written with CANDLE_STORE ``store``"""
+    dispatcher, db = make_pipeline(CANDLE_STORE=store, TIMEFRAMES=[1, 5])
+    for record in session_records():
+        dispatcher.dispatch_records([record])
+    dispatcher.flush()
+    pipeline1.finalize_open_candles(dispatcher.processors)
+    db.shutdown()
+    return db.live_db_path
+
+
+def migrate(monkeypatch, path: str, *options) -> int:
+    monkeypatch.setattr(sys, 'argv', ['migrate_to_bars.py', '--db', path, *options])
+    return migrate_to_bars.main()
+
+
+def daily_objects(path: str, kind: str) -> dict:
+    """Per-day candle tables or views -> their rows (instrument_key, timestamp and the value columns), sorted"""
+    conn = sqlite3.connect(path)
+    try:
+        objects = {}
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = ?", (kind,)):
+            match = migrate_to_bars.DAILY_TABLE.match(name)
+            if not match:
+                continue
+            family, _ = candle_store.split_data_type(match.group(1))
+            columns = candle_store.STORE_TABLES[family][1]
+            objects[name] = sorted(conn.execute(f"SELECT instrument_key, timestamp, {', '.join(columns)} FROM {name}"))
+        return objects
+    finally:
+        conn.close()
+
+
+def store_rows(path: str) -> dict:
+    conn = sqlite3.connect(path)
+    try:
+        return {table: sorted(conn.execute(f"SELECT i.instrument_key, b.* FROM {table} b "
+                                           f"JOIN instruments i ON i.instrument_id = b.instrument_id"))
+                for table in ('bars', 'ha_bars')}
+    finally:
+        conn.close()
+
+
+def without_ids(rows: dict) -> dict:
+    """Bar rows keyed by instrument key instead of the (database-specific) instrument id"""
+    return {table: sorted(row[:1] + row[2:] for row in table_rows) for table, table_rows in rows.items()}
+
+
+def undated(objects: dict) -> dict:
+    """Per-day tables or views keyed by their name without the day"""
+    return {name.rsplit('_', 1)[0]: rows for name, rows in objects.items()}
+
+
+@pytest.mark.parametrize('replace', (False, True))
+def test_import_matches_the_daily_tables(make_pipeline, monkeypatch, replace):
+    path = write_session(make_pipeline, 'daily')
+    tables = daily_objects(path, 'table')
+    assert len(tables) == 8  # candles/heikin_ashi x 1min/5min x index/future
+
+    assert migrate(monkeypatch, path, *(('--replace',) if replace else ())) == 0
+    rows = store_rows(path)
+    assert len(rows['bars']) == sum(len(table) for name, table in tables.items() if name.startswith('candles'))
+    assert len(rows['ha_bars']) == sum(len(table) for name, table in tables.items() if name.startswith('heikin'))
+    if replace:
+        # Every table is now a view of the same name that reads the same rows
+        assert daily_objects(path, 'table') == {}
+        assert daily_objects(path, 'view') == tables
+    else:
+        assert daily_objects(path, 'table') == tables
+        # Re-running replaces the imported rows instead of adding to them
+        assert migrate(monkeypatch, path) == 0
+        assert store_rows(path) == rows
+
+
+def test_migrated_bars_match_a_session_written_to_bars(make_pipeline, monkeypatch):
+    migrated = write_session(make_pipeline, 'daily')
+    assert migrate(monkeypatch, migrated, '--replace') == 0
+    written = write_session(make_pipeline, 'bars')
+    assert without_ids(store_rows(migrated)) == without_ids(store_rows(written))
+    # Views are named by the day the daily table was written and by the bars' day, respectively
+    assert undated(daily_objects(migrated, 'view')) == undated(daily_objects(written, 'view'))
+
+
+def test_dry_run_changes_nothing(make_pipeline, monkeypatch):
+    path = write_session(make_pipeline, 'daily')
+    tables = daily_objects(path, 'table')
+    assert migrate(monkeypatch, path, '--dry-run') == 0
+    assert daily_objects(path, 'table') == tables
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT count(*) FROM sqlite_master WHERE name = 'bars'").fetchone() == (0,)
+    finally:
+        conn.close()
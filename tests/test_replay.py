@@ -0,0 +1,51 @@
+"""Replaying a recorded journal through the live path is deterministic: same journal, same rows"""
+import pytest
+
+import feed_journal
+import pipeline1
+from conftest import ENGINES, database_rows, daily_table, feed_frame, session_records
+from feed_journal import FeedJournalReader, FeedJournalWriter
+
+
+def record_journal(directory, monkeypatch, records: list):
+    """A journal of one frame per pair of records, received 100-300ms after its last trade time"""
+    stamps = [records[index + 1][1] + 100 + index % 200 for index in range(0, len(records), 2)]
+    wall_times = iter(stamp * 1_000_000 for stamp in stamps)
+    with monkeypatch.context() as patch:
+        patch.setattr(feed_journal.time, 'time_ns', lambda: next(wall_times))
+        writer = FeedJournalWriter(directory, compress=False)
+        for number, stamp in enumerate(stamps):
+            writer.capture(feed_frame(records[2 * number:2 * number + 2], stamp), number + 1)
+        writer.close()
+
+
+def replay_journal(make_pipeline, monkeypatch, directory, engine: str):
+    """replay_feed.py's loop: the clock follows the frames' receive times"""
+    dispatcher, db = make_pipeline(CANDLE_ENGINE=engine, TIMEFRAMES=[1, 5])
+    clock = pipeline1.ReplayClock()
+    monkeypatch.setattr(pipeline1, 'CLOCK', clock)
+    for _, wall_ns, frame in FeedJournalReader(directory).records():
+        clock.set_epoch_ns(wall_ns)
+        records = dispatcher.extract(pipeline1.decode_v3_message(frame))
+        if records:
+            dispatcher.apply(records)
+    dispatcher.flush()
+    pipeline1.finalize_open_candles(dispatcher.processors)
+    db.shutdown()
+    return dispatcher.tick_quality(), database_rows(db.live_db_path)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_replays_of_a_journal_are_identical(make_pipeline, monkeypatch, tmp_path, engine):
+    record_journal(tmp_path / "journal", monkeypatch, session_records())
+    first = replay_journal(make_pipeline, monkeypatch, tmp_path / "journal", engine)
+    second = replay_journal(make_pipeline, monkeypatch, tmp_path / "journal", engine)
+    assert first == second
+    _, rows = first
+    assert len(daily_table(rows, 'candles_future')) >= 5 and daily_table(rows, 'candles5_future')
+
+
+def test_engines_replay_a_journal_to_the_same_rows(make_pipeline, monkeypatch, tmp_path):
+    record_journal(tmp_path / "journal", monkeypatch, session_records())
+    replays = [replay_journal(make_pipeline, monkeypatch, tmp_path / "journal", engine) for engine in ENGINES]
+    assert replays[0] == replays[1]
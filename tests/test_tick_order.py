@@ -0,0 +1,60 @@
+"""Shuffled, duplicate and late ticks give the same bars and derived rows as the in-order feed"""
+import random
+
+import pytest
+
+import pipeline1
+from conftest import ENGINES, NIFTY_INDEX_KEY, SESSION_START_MS, database_rows, session_records
+
+
+def delivered(records: list, seed: int, late_share: float = 0.0) -> list:
+    """Arrival order with up to 200ms of jitter, ~5% duplicates and ``late_share`` of ticks up to 50s late"""
+    rnd = random.Random(seed)
+    arrivals = []
+    for record in records:
+        delay = rnd.randint(1000, 50000) if rnd.random() < late_share else rnd.randint(0, 200)
+        arrivals.append((record[1] + delay, record))
+        if rnd.random() < 0.05:
+            arrivals.append((record[1] + rnd.choice((rnd.randint(0, 200), rnd.randint(1000, 30000))), record))
+    arrivals.sort(key=lambda arrival: arrival[0])
+    return [record for _, record in arrivals]
+
+
+def replay(make_pipeline, engine: str, records: list, **settings):
+    dispatcher, db = make_pipeline(CANDLE_ENGINE=engine, TIMEFRAMES=[1, 5], **settings)
+    for record in records:
+        dispatcher.dispatch_records([record])
+    dispatcher.flush()
+    pipeline1.finalize_open_candles(dispatcher.processors)
+    db.shutdown()
+    return dispatcher.tick_quality(), database_rows(db.live_db_path)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_jitter_within_window_is_reordered(make_pipeline, engine):
+    records = session_records()
+    _, expected = replay(make_pipeline, engine, records)
+    quality, rows = replay(make_pipeline, engine, delivered(records, seed=2))
+    assert quality['reordered'] > 0 and quality['duplicate'] > 0
+    assert quality['amended'] == 0 and quality['late'] == 0
+    assert rows == expected
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_late_ticks_amend_closed_bars_and_derived_rows(make_pipeline, engine):
+    records = session_records()
+    _, expected = replay(make_pipeline, engine, records)
+    quality, rows = replay(make_pipeline, engine, delivered(records, seed=3, late_share=0.02))
+    assert quality['amended'] > 0 and quality['late'] == 0
+    # 1min and 5min candles, Heikin Ashi, trend and latest_candles all as if nothing had been late
+    assert rows == expected
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_tick_older_than_amend_minutes_is_only_counted(make_pipeline, engine):
+    records = session_records()
+    _, expected = replay(make_pipeline, engine, records)
+    stale = (NIFTY_INDEX_KEY, SESSION_START_MS + 90_000, 1.0, 1.0, None, None, 23450.0)  # 09:16:31, bar closed long ago
+    quality, rows = replay(make_pipeline, engine, records + [stale], CANDLE_CLOSE={'AMEND_MINUTES': 2})
+    assert quality['late'] == 1 and quality['amended'] == 0
+    assert rows == expected
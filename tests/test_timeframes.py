@@ -0,0 +1,61 @@
+"""Higher timeframe bars are the rollup of the 1min bars under them, for both candle engines"""
+from datetime import datetime
+
+import pytest
+
+import pipeline1
+from conftest import ENGINES, database_rows, daily_table, session_records
+
+COLUMNS = ('instrument_key', 'timestamp', 'open', 'high', 'low', 'close', 'volume', 'atp', 'delta', 'min_delta',
+           'max_delta', 'buy_volume', 'sell_volume', 'tick_count', 'vtt_open', 'vtt_close')
+
+
+def bars(rows: dict, prefix: str) -> list:
+    return [dict(zip(COLUMNS, row)) for row in sorted(daily_table(rows, prefix), key=lambda row: row[1])]
+
+
+def rollup(parts: list) -> dict:
+    """A bar built from its 1min bars: OHLC, sums, extremes and the volume-weighted ATP"""
+    volume = sum(bar['volume'] for bar in parts)
+    traded = [bar for bar in parts if bar['volume'] > 0]
+    return {
+        'open': parts[0]['open'], 'high': max(bar['high'] for bar in parts), 'low': min(bar['low'] for bar in parts),
+        'close': parts[-1]['close'], 'volume': volume,
+        'atp': pytest.approx(sum(bar['atp'] * bar['volume'] for bar in traded) / volume if volume
+                             else parts[-1]['close']),
+        'delta': sum(bar['delta'] for bar in parts), 'min_delta': min(bar['min_delta'] for bar in parts),
+        'max_delta': max(bar['max_delta'] for bar in parts), 'buy_volume': sum(bar['buy_volume'] for bar in parts),
+        'sell_volume': sum(bar['sell_volume'] for bar in parts), 'tick_count': sum(bar['tick_count'] for bar in parts),
+        'vtt_open': parts[0]['vtt_open'], 'vtt_close': parts[-1]['vtt_close']
+    }
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_higher_timeframes_roll_up_the_minute_bars(make_pipeline, engine):
+    dispatcher, db = make_pipeline(CANDLE_ENGINE=engine, TIMEFRAMES=[1, 5, 15])
+    for record in session_records(3000):
+        dispatcher.dispatch_records([record])
+    dispatcher.flush()
+    pipeline1.finalize_open_candles(dispatcher.processors)
+    db.shutdown()
+    rows = database_rows(db.live_db_path)
+
+    for suffix in ('nifty_index', 'future'):
+        minute_bars = bars(rows, f'candles_{suffix}')
+        for minutes in (5, 15):
+            higher = bars(rows, f'candles{minutes}_{suffix}')
+            groups = {}
+            for bar in minute_bars:
+                start = datetime.fromisoformat(bar['timestamp'])
+                groups.setdefault(start.replace(minute=start.minute - start.minute % minutes), []).append(bar)
+            assert [datetime.fromisoformat(bar['timestamp']) for bar in higher] == sorted(groups)
+            for bar in higher:
+                expected = rollup(groups[datetime.fromisoformat(bar['timestamp'])])
+                assert {name: bar[name] for name in expected} == expected
+            # Every closed bar of every timeframe gets its Heikin Ashi row
+            assert len(daily_table(rows, f'heikin_ashi{minutes}_{suffix}')) == len(higher)
+        assert len(daily_table(rows, f'heikin_ashi_{suffix}')) == len(minute_bars) >= 15
+
+
+def test_timeframes_are_sorted_with_one_minute_and_divide_the_day():
+    assert pipeline1.load_timeframes([15, 5, 5, 7]) == [1, 5, 15]
@@ -0,0 +1,212 @@
+"""
+Upstox V3 market data feed client: authorize, connect, subscribe, decode frames and
+read typed feeds into compact tick records.
+
+Shared by pipeline1 and its feed shard worker processes. A worker is spawned with
+``run_feed_shard`` as its target and gets everything it needs in ``settings``, so it
+only needs this module and feed_journal (no log file, config read or instrument load).
+
+    settings = {'access_token': ..., 'auth_url': UPSTOX_V3_AUTH_URL, 'log_format': ..., 'log_level': 'INFO',
+                'capture': {'directory': 'feed_journal', 'compress': True, 'rotate_mb': 256}}  # capture: None = off
+"""
+
+import asyncio
+import json
+import logging
+import ssl
+import time
+from typing import List, Optional
+
+import requests
+import websockets
+from google.protobuf.json_format import MessageToDict
+
+import MarketDataFeedV3_pb2 as pb
+from feed_journal import FeedJournalWriter
+
+logger = logging.getLogger("UpstoxTradingV3")
+
+UPSTOX_V3_AUTH_URL = "https://api.upstox.com/v3/feed/market-data-feed/authorize"
+
+
+def authorize_feed(access_token: str, auth_url: str = UPSTOX_V3_AUTH_URL) -> Optional[dict]:
+    try:
+        headers = {'Accept': 'application/json', 'Authorization': f'Bearer {access_token}'}
+        response = requests.get(auth_url, headers=headers, timeout=10.0)
+        if response.status_code == 200:
+            logger.info("Retrieved V3 WebSocket URL successfully")
+            return response.json()
+        else:
+            logger.error(f"Failed to get V3 WebSocket URL: {response.status_code}")
+            return None
+    except Exception as e:
+        logger.error(f"Error getting V3 WebSocket URL: {e}")
+        return None
+
+
+def connect_feed(ws_url: str):
+    ssl_context = None
+    if ws_url.startswith('wss://'):
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+    return websockets.connect(
+        ws_url,
+        ssl=ssl_context,
+        ping_interval=20,
+        ping_timeout=10,
+        close_timeout=10,
+        max_queue=None,
+        max_size=None,
+        compression=None
+    )
+
+
+def create_v3_subscription_message(instrument_keys: List[str], mode: str = "full"):
+    try:
+        data = {
+            "guid": "upstox-v3-lockfree-system",
+            "method": "sub",
+            "data": {"mode": mode, "instrumentKeys": instrument_keys}
+        }
+        return json.dumps(data).encode('utf-8')
+    except Exception as e:
+        logger.error(f"Error creating V3 subscription message: {e}")
+        return b""
+
+
+def decode_frame(data, mode: str = "typed"):
+    """Decode a raw feed frame.
+
+    In "typed" mode protobuf frames are parsed once and the ``pb.FeedResponse``
+    itself is returned; in "dict" mode the frame is converted with MessageToDict.
+    JSON frames always come back as dicts.
+    """
+    try:
+        if isinstance(data, bytes):
+            try:
+                response = pb.FeedResponse()
+                response.ParseFromString(data)
+                if mode == "typed":
+                    return response
+                return MessageToDict(response)
+            except Exception as e:
+                logger.debug(f"Protobuf decode failed: {e}")
+                try:
+                    return json.loads(data.decode('utf-8'))
+                except Exception as e:
+                    logger.debug(f"JSON decode failed: {e}")
+                    pass
+        else:
+            try:
+                return json.loads(data)
+            except Exception as e:
+                logger.debug(f"JSON decode failed: {e}")
+                pass
+        return None
+    except Exception as e:
+        logger.error(f"Error decoding message: {e}")
+        return None
+
+
+def extract_feed_record(instrument_key: str, feed) -> Optional[tuple]:
+    """Read a typed ``pb.Feed`` into a compact tick record (no MessageToDict, no string round-trips).
+
+    Record layout: (instrument_key, ltt_ms, ltp, atp, vtt, volume, prev_close).
+    Mirrors the dict path: zero-valued proto3 fields are treated as absent.
+    """
+    union = feed.WhichOneof('FeedUnion')
+    if union == 'fullFeed':
+        full_feed = feed.fullFeed
+        full_union = full_feed.WhichOneof('FullFeedUnion')
+        if full_union == 'marketFF':
+            market_ff = full_feed.marketFF
+            ltpc = market_ff.ltpc
+            if not ltpc.ltt:
+                return None
+            ltp = ltpc.ltp
+            volume = None
+            for ohlc in market_ff.marketOHLC.ohlc:
+                if ohlc.interval == 'I1':
+                    volume = ohlc.vol
+                    break
+            vtt = market_ff.vtt
+            return (instrument_key, ltpc.ltt, ltp, market_ff.atp or ltp, float(vtt) if vtt else None, volume, ltpc.cp)
+        if full_union == 'indexFF':
+            ltpc = full_feed.indexFF.ltpc
+            if not ltpc.ltt:
+                return None
+            return (instrument_key, ltpc.ltt, ltpc.ltp, ltpc.ltp, None, None, ltpc.cp)
+        return None
+    if union == 'ltpc':
+        ltpc = feed.ltpc
+        if not ltpc.ltt:
+            return None
+        return (instrument_key, ltpc.ltt, ltpc.ltp, ltpc.ltp, None, None, ltpc.cp)
+    return None
+
+
+# === SHARD WORKER ===
+def run_feed_shard(shard_id: int, instrument_keys: List[str], result_queue, stop_event, settings: dict):
+    """Worker process entry point: owns one WebSocket connection for a slice of the universe"""
+    # Workers log to stderr; only the main process writes the log file
+    logging.basicConfig(level=settings.get('log_level', 'INFO'), format=settings['log_format'])
+    journal = None
+    capture = settings.get('capture')
+    if capture:
+        try:
+            journal = FeedJournalWriter(capture['directory'], prefix=f"shard{shard_id}", compress=capture['compress'],
+                                        rotate_mb=capture['rotate_mb'])
+        except Exception as e:
+            logger.error(f"[shard {shard_id}] Feed capture disabled - could not open journal: {e}")
+    try:
+        asyncio.run(_feed_shard_loop(shard_id, instrument_keys, result_queue, stop_event, settings, journal))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if journal:
+            journal.close()
+
+
+async def _feed_shard_loop(shard_id: int, instrument_keys: List[str], result_queue, stop_event, settings: dict,
+                           journal=None):
+    wanted = frozenset(instrument_keys)
+    retry_delay = 1
+    while not stop_event.is_set():
+        try:
+            auth_response = authorize_feed(settings['access_token'], settings['auth_url'])
+            if not auth_response or 'data' not in auth_response:
+                logger.error(f"[shard {shard_id}] Failed to get V3 WebSocket authorization")
+                await asyncio.sleep(5)
+                continue
+            async with connect_feed(auth_response['data']['authorized_redirect_uri']) as websocket:
+                await websocket.send(create_v3_subscription_message(instrument_keys, "full"))
+                logger.info(f"[shard {shard_id}] Subscribed to {len(instrument_keys)} instruments")
+                retry_delay = 1
+                while not stop_event.is_set():
+                    try:
+                        message = await asyncio.wait_for(websocket.recv(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        continue
+                    recv_ns = time.monotonic_ns()
+                    if journal:
+                        journal.capture(message, recv_ns)
+                    decoded_data = decode_frame(message, "typed")
+                    if not isinstance(decoded_data, pb.FeedResponse):
+                        continue
+                    feeds = decoded_data.feeds
+                    records = []
+                    for key in feeds:
+                        if key in wanted:
+                            record = extract_feed_record(key, feeds[key])
+                            if record:
+                                records.append(record)
+                    if records:
+                        result_queue.put((shard_id, recv_ns, records))
+        except websockets.ConnectionClosed as e:
+            logger.warning(f"[shard {shard_id}] WebSocket closed: {e} - Reconnecting")
+        except Exception as e:
+            logger.error(f"[shard {shard_id}] Connection error: {e}")
+        if not stop_event.is_set():
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, 60)